@@ -0,0 +1,110 @@
+"""Benchmark the warp, display-render and decode/encode hot paths on synthetic images.
+
+Usage:
+    python benchmarks/bench_hot_paths.py [--sizes 1 12 24 48] [--repeats 5] [--cases warp_cropped ...]
+                                         [--output bench.json] [--compare old_bench.json]
+
+Every case is timed separately on an 8-bit BGR image of each size with a random convex quad
+(fixed seeds, so runs are comparable). The JSON report holds p50/p95/mean/min per case, the
+traced peak memory of one extra run, the process max RSS and the commit it was run on;
+--compare prints the p50 change against an earlier report.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from common import (compare_reports, measure, print_result, random_convex_quad, synthetic_image,
+                    write_report)
+
+from perspective_core import engine
+from perspective_core.image_io import read_image, write_image
+from perspective_core.render import HIGH_QUALITY_RESAMPLE, PREVIEW_RESAMPLE, DisplayPyramid, visible_box
+
+CANVAS_SIZE = (1000, 700)
+PAN_RENDER_MARGIN = 0.25  # as in the correction app
+REFERENCE_CM = (21.0, 29.7)  # an A4 sheet as the calibration reference
+
+
+def displayed_size_for(image_size, zoom):
+    # Same fit-to-canvas rule as PerspectiveCorrectionApp.display_cv_image
+    canvas_width, canvas_height = CANVAS_SIZE
+    width, height = image_size
+    if width / height > canvas_width / canvas_height:
+        base_width, base_height = canvas_width, int(canvas_width * height / width)
+    else:
+        base_width, base_height = int(canvas_height * width / height), canvas_height
+    return max(1, int(base_width * zoom)), max(1, int(base_height * zoom))
+
+
+def render_case(pyramid, zoom, resample):
+    displayed_size = displayed_size_for(pyramid.size, zoom)
+    top_left = ((CANVAS_SIZE[0] - displayed_size[0]) / 2, (CANVAS_SIZE[1] - displayed_size[1]) / 2)
+    box = visible_box(displayed_size, top_left, CANVAS_SIZE, PAN_RENDER_MARGIN)
+    return lambda: pyramid.render(displayed_size, box, resample)
+
+
+def build_cases(image, quad, tmp_dir):
+    size = engine.image_size(image)
+    cases = {
+        # process_image_cropped
+        "warp_cropped": lambda: engine.apply_geometry(image, engine.cropped_geometry(quad)),
+        # process_image_full_transform, both branches of full_transform_fit_to_frame_var
+        "warp_full": lambda: engine.apply_geometry(image, engine.full_geometry(quad, size, False)),
+        "warp_full_fit": lambda: engine.apply_geometry(image, engine.full_geometry(quad, size, True)),
+        # do_perspective
+        "warp_calibrated": lambda: engine.apply_geometry(
+            image, engine.calibrated_geometry(quad, *REFERENCE_CM, size)[0]),
+        # display_cv_image: pyramid built once per image, then one viewport render per event
+        "display_pyramid_build": lambda: DisplayPyramid(image),
+    }
+
+    pyramid = DisplayPyramid(image)
+    for zoom in (1, 10):
+        cases[f"display_render_fast_zoom{zoom}"] = render_case(pyramid, zoom, PREVIEW_RESAMPLE)
+        cases[f"display_render_hq_zoom{zoom}"] = render_case(pyramid, zoom, HIGH_QUALITY_RESAMPLE)
+
+    for ext in (".jpg", ".png"):
+        path = os.path.join(tmp_dir, f"bench{ext}")
+        write_image(path, image)
+        name = ext.lstrip(".").replace("jpg", "jpeg")
+        cases[f"decode_{name}"] = lambda path=path: read_image(path)
+        cases[f"encode_{name}"] = lambda path=path: write_image(path, image)
+    return cases
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 12, 24, 48], help="image sizes in MP")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--cases", nargs="+", help="only run these cases (default: all)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare p50 against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for megapixels in args.sizes:
+            image = synthetic_image(megapixels)
+            quad = random_convex_quad(image.shape[1], image.shape[0], seed=int(megapixels))
+            for name, func in build_cases(image, quad, tmp_dir).items():
+                if args.cases and name not in args.cases:
+                    continue
+                result = {"case": name, "megapixels": megapixels,
+                          "image_size": list(engine.image_size(image))}
+                result.update(measure(func, args.repeats))
+                results.append(result)
+                print_result(result)
+            del image
+
+    write_report(args.output, args, results)
+    if args.compare:
+        compare_reports(args.compare, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Benchmark saving a rectified image per format and encoder setting.
+
+Usage:
+    python benchmarks/bench_save.py [--sizes 12 48] [--repeats 3] [--png-levels 1 3 6 9] [--workers N]
+                                    [--cases png_l1_stream ...] [--output bench.json] [--compare old.json]
+
+For every size, PNG is saved at each --png-level three ways: in memory through
+image_io.write_image (the old save_image path), streamed on one thread and streamed on
+--workers threads (skipped with --workers 1). The stream cases pass stream=True to
+encode.save_image, which would otherwise only stream a one-thread save from
+encode.STREAM_MIN_PIXELS on. JPEG is saved at two qualities, baseline, progressive and
+optimized, and TIFF with each compression. Next to timing and traced peak memory (see
+common.measure) every result records the file size.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from common import compare_reports, measure, print_result, synthetic_image, write_report
+
+from perspective_core import encode
+from perspective_core.image_io import write_image
+
+
+def build_cases(image, tmp_dir, png_levels, workers):
+    cases = {}
+    for level in png_levels:
+        path = os.path.join(tmp_dir, f"png_l{level}.png")
+        params = encode.encoder_params(".png", encode.SaveOptions(png_compression=level))
+        cases[f"png_l{level}_inmemory"] = (path, lambda path=path, params=params: write_image(path, image, params))
+        streams = [("stream", 1)] + ([(f"stream_x{workers}", workers)] if workers > 1 else [])
+        for name, count in streams:
+            options = encode.SaveOptions(png_compression=level, png_workers=count)
+            cases[f"png_l{level}_{name}"] = (path, lambda path=path, options=options: encode.save_image(
+                path, image, options, stream=True))
+
+    for quality in (80, 95):
+        for name, options in (("baseline", {}), ("progressive", {"jpeg_progressive": True}),
+                              ("optimize", {"jpeg_optimize": True})):
+            path = os.path.join(tmp_dir, f"jpeg_q{quality}_{name}.jpg")
+            options = encode.SaveOptions(jpeg_quality=quality, **options)
+            cases[f"jpeg_q{quality}_{name}"] = (path, lambda path=path, options=options: encode.save_image(
+                path, image, options))
+
+    for compression in encode.TIFF_COMPRESSIONS:
+        path = os.path.join(tmp_dir, f"tiff_{compression}.tiff")
+        options = encode.SaveOptions(tiff_compression=compression)
+        cases[f"tiff_{compression}"] = (path, lambda path=path, options=options: encode.save_image(
+            path, image, options))
+    return cases
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[12, 48], help="image sizes in MP")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--png-levels", type=int, nargs="+", default=[1, 3, 6, 9])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="threads for the parallel PNG cases (default: all cores)")
+    parser.add_argument("--cases", nargs="+", help="only run these cases (default: all)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare p50 against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for megapixels in args.sizes:
+            image = synthetic_image(megapixels)
+            for name, (path, func) in build_cases(image, tmp_dir, args.png_levels, args.workers).items():
+                if args.cases and name not in args.cases:
+                    continue
+                result = {"case": name, "megapixels": megapixels, "image_size": [image.shape[1], image.shape[0]]}
+                result.update(measure(func, args.repeats))
+                result["file_mb"] = os.path.getsize(path) / 2 ** 20
+                results.append(result)
+                print_result(result)
+            del image
+
+    write_report(args.output, args, results)
+    if args.compare:
+        compare_reports(args.compare, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Shared pieces of the benchmark scripts: synthetic inputs, timing and the JSON report."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+import PIL
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def synthetic_image(megapixels, seed=0):
+    """Photo-like 8-bit BGR image of about `megapixels` MP with a 4:3 aspect.
+
+    Smooth structure plus mild noise, so codecs see realistic rather than worst-case data.
+    """
+    rng = np.random.default_rng(seed)
+    height = int(round(np.sqrt(megapixels * 1e6 * 3 / 4)))
+    width = int(round(height * 4 / 3))
+    coarse = rng.integers(0, 256, (max(height // 64, 2), max(width // 64, 2), 3), dtype=np.uint8)
+    image = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-6, 7, (height, width, 3), dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def _is_convex(quad):
+    edges = np.roll(quad, -1, axis=0) - quad
+    cross = edges[:, 0] * np.roll(edges, -1, axis=0)[:, 1] - edges[:, 1] * np.roll(edges, -1, axis=0)[:, 0]
+    return bool(np.all(cross > 0) or np.all(cross < 0))
+
+
+def random_convex_quad(width, height, seed=0, jitter=0.2):
+    """Random convex quad in TL, TR, BR, BL order, like four clicks on a document in a photo."""
+    rng = np.random.default_rng(seed)
+    base = np.float32([[0.2, 0.2], [0.8, 0.2], [0.8, 0.8], [0.2, 0.8]])
+    while True:
+        quad = (base + rng.uniform(-jitter, jitter, base.shape)).clip(0.0, 1.0) * [width - 1, height - 1]
+        if _is_convex(quad):
+            return quad.astype(np.float32)
+
+
+def measure(func, repeats, warmup=1):
+    """Time func() `repeats` times after `warmup` calls, then once more under tracemalloc.
+
+    numpy (and so OpenCV's Python bindings) report their buffers to tracemalloc, so the
+    traced peak covers the images a case allocates. It is measured in a separate call so
+    the tracing overhead does not skew the timings.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = np.array(timings)
+    return {
+        "repeats": repeats,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "mean_ms": float(timings.mean()),
+        "min_ms": float(timings.min()),
+        "peak_traced_mb": peak / 2 ** 20,
+    }
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "pillow": PIL.__version__,
+    }
+
+
+def write_report(path, args, results):
+    report = {"environment": environment(), "args": vars(args), "results": results, "max_rss_mb": max_rss_mb()}
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare_reports(baseline_path, results):
+    """Print p50 of every case against the same case in an earlier report."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["megapixels"]): r for r in json.load(f)["results"]}
+    for result in results:
+        old = baseline.get((result["case"], result["megapixels"]))
+        if old is None:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"] if old["p50_ms"] > 0 else float("inf")
+        print(f"{result['case']:<28} {result['megapixels']:>4} MP  p50 {old['p50_ms']:9.1f} -> "
+              f"{result['p50_ms']:9.1f} ms  (x{ratio:.2f})")
+
+
+def print_result(result):
+    print(f"{result['case']:<28} {result['megapixels']:>4} MP  p50 {result['p50_ms']:9.1f} ms  "
+          f"p95 {result['p95_ms']:9.1f} ms  peak {result['peak_traced_mb']:8.1f} MB", flush=True)
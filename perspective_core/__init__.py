@@ -0,0 +1,48 @@
+"""GUI-free perspective-correction core shared by the two Tk apps."""
+from .engine import (
+    DEFAULT_MAX_DIM_PX,
+    DEFAULT_PIXELS_PER_CM,
+    MODE_CROPPED,
+    MODE_FULL,
+    MODE_FULL_FIT,
+    MODES,
+    DegenerateQuadError,
+    WarpGeometry,
+    apply_geometry,
+    calibrated_geometry,
+    cropped_geometry,
+    full_geometry,
+    geometry_for_mode,
+    limit_output_size,
+    normalize_quad,
+    order_points,
+    quad_size,
+    warp_calibrated,
+    warp_cropped,
+    warp_for_mode,
+    warp_full,
+)
+
+__all__ = [
+    "DEFAULT_MAX_DIM_PX",
+    "DEFAULT_PIXELS_PER_CM",
+    "MODE_CROPPED",
+    "MODE_FULL",
+    "MODE_FULL_FIT",
+    "MODES",
+    "DegenerateQuadError",
+    "WarpGeometry",
+    "apply_geometry",
+    "calibrated_geometry",
+    "cropped_geometry",
+    "full_geometry",
+    "geometry_for_mode",
+    "limit_output_size",
+    "normalize_quad",
+    "order_points",
+    "quad_size",
+    "warp_calibrated",
+    "warp_cropped",
+    "warp_for_mode",
+    "warp_full",
+]
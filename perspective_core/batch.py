@@ -0,0 +1,328 @@
+"""Rectify many images from a manifest of corner points, without the GUI.
+
+Usage:
+    python -m perspective_core.batch manifest.json [--output-dir out] [--report report.json]
+                                     [--workers N] [--max-in-flight M] [--ordered]
+                                     [--tile-size T] [--max-output-mp MP] [--plan-cache-mb MB]
+                                     [--min-confidence C]
+
+The manifest is either JSON or CSV. JSON holds a list of rows (or {"images": [...]}):
+
+    [{"path": "scan_001.jpg", "points": [[x, y], [x, y], [x, y], [x, y]],
+      "mode": "cropped", "output": "scan_001_corrected.png"}, ...]
+
+CSV needs a header with path, x1, y1, x2, y2, x3, y3, x4, y4 and optionally mode and output.
+Points are in source pixels, in the app's marking order: top-left, top-right, bottom-right,
+bottom-left. mode is cropped (default), full or full-fit, matching "יישור קטע נבחר" and
+"עוות תמונה מלאה" with and without "התאם למסגרת מקורית". Relative paths are resolved
+against the manifest's directory; rows without an output are written to --output-dir
+(or next to the input) as <name>_corrected.png.
+
+Rows without points (or with empty x1..y4 in CSV) have their corners found by
+detect.detect_quad; images detected with less than --min-confidence are reported as
+failed, to be marked by hand in the app.
+
+With --workers > 1 every image is decoded, warped and encoded inside a worker process
+and only the small timing record travels back, so memory grows with the number of
+workers rather than the number of images. --max-in-flight caps how many jobs are
+submitted ahead of the workers.
+
+With --tile-size the output is warped in tiles and, for PNG outputs, streamed into the file
+one band of tiles at a time, so a "full" warp with strong perspective never needs the whole
+output in memory. --max-output-mp scales any larger output down to that many megapixels.
+
+Rows that repeat the same points on same-sized images (a fixed camera) reuse a cached
+remap grid from the second such image on (plans.WarpPlanCache, --plan-cache-mb per process).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+
+from . import detect, engine, tiled
+from .image_io import read_image, write_image
+from .plans import DEFAULT_PLAN_CACHE_BYTES, WarpPlanCache
+
+Job = namedtuple("Job", ["path", "points", "mode", "output"])
+
+INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "lanczos4": cv2.INTER_LANCZOS4,
+}
+
+# One plan cache per process (the main one, or each pool worker), created on first use
+_plan_cache = None
+
+
+def default_output_path(path, output_dir=None):
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir or os.path.dirname(path), f"{base_name}_corrected.png")
+
+
+def _rows_from_json(manifest_path):
+    with open(manifest_path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("images", [])
+    return data
+
+
+def _rows_from_csv(manifest_path):
+    rows = []
+    with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+        for record in csv.DictReader(f):
+            points = None
+            if record.get("x1"):
+                points = [[float(record[f"x{i}"]), float(record[f"y{i}"])] for i in range(1, 5)]
+            rows.append({"path": record["path"], "points": points,
+                         "mode": record.get("mode") or None, "output": record.get("output") or None})
+    return rows
+
+
+def load_manifest(manifest_path, default_mode=engine.MODE_CROPPED, output_dir=None):
+    if os.path.splitext(manifest_path)[1].lower() == ".csv":
+        rows = _rows_from_csv(manifest_path)
+    else:
+        rows = _rows_from_json(manifest_path)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    for row_number, row in enumerate(rows, start=1):
+        mode = row.get("mode") or default_mode
+        if mode not in engine.MODES:
+            raise ValueError(f"Manifest row {row_number}: unknown mode {mode!r}")
+        points = row.get("points")
+        if points is not None and len(points) != 4:
+            raise ValueError(f"Manifest row {row_number}: expected 4 points")
+
+        path = os.path.join(base_dir, row["path"])
+        output = row.get("output")
+        output = os.path.join(base_dir, output) if output else default_output_path(path, output_dir)
+        if points is not None:
+            points = [tuple(map(float, p)) for p in points]
+        jobs.append(Job(path, points, mode, output))
+    return jobs
+
+
+def _get_plan_cache(max_bytes):
+    global _plan_cache
+    if not max_bytes:
+        return None
+    if _plan_cache is None or _plan_cache.max_bytes != max_bytes:
+        _plan_cache = WarpPlanCache(max_bytes)
+    return _plan_cache
+
+
+def process_job(job, interpolation=cv2.INTER_LANCZOS4, tile_size=None, max_output_mp=None,
+                plan_cache_bytes=DEFAULT_PLAN_CACHE_BYTES, min_confidence=detect.DEFAULT_MIN_CONFIDENCE):
+    """Decode, warp and encode one job. Never raises; failures are reported in the result.
+
+    A job without points is auto-detected; its detection confidence and points are reported.
+
+    With tile_size the warp and the encode are interleaved band by band (tiled.write_warped),
+    so only their combined time is reported, as warp_ms, and encode_ms is None.
+    """
+    result = {"path": job.path, "output": job.output, "mode": job.mode, "ok": False, "error": None}
+    start = time.perf_counter()
+    try:
+        image = read_image(job.path)
+        decoded = time.perf_counter()
+        points = job.points
+        if points is None:
+            detection = detect.detect_quad(image)
+            confidence = detection.confidence if detection is not None else 0.0
+            result["confidence"] = confidence
+            if confidence < min_confidence:
+                raise ValueError(f"no quad detected with confidence >= {min_confidence} (best {confidence:.2f})")
+            points = detection.points.tolist()
+            result["points"] = points
+            detected = time.perf_counter()
+            result["detect_ms"] = (detected - decoded) * 1000
+            decoded = detected
+        geometry = engine.geometry_for_mode(points, job.mode, engine.image_size(image))
+        geometry, output_scale = engine.limit_output_size(geometry, max_output_mp)
+        if tile_size:
+            tiled.write_warped(job.output, image, geometry, interpolation, tile_size)
+            warped_at = encoded = time.perf_counter()
+            encode_ms = None
+        else:
+            plan_cache = _get_plan_cache(plan_cache_bytes)
+            if plan_cache is not None:
+                warped = plan_cache.warp(image, geometry, interpolation)
+            else:
+                warped = engine.apply_geometry(image, geometry, interpolation)
+            warped_at = time.perf_counter()
+            write_image(job.output, warped)
+            encoded = time.perf_counter()
+            encode_ms = (encoded - warped_at) * 1000
+
+        result.update(ok=True,
+                      input_size=list(engine.image_size(image)),
+                      output_size=list(geometry.size),
+                      output_scale=output_scale,
+                      decode_ms=(decoded - start) * 1000,
+                      warp_ms=(warped_at - decoded) * 1000,
+                      encode_ms=encode_ms)
+    except Exception as e:
+        result["error"] = str(e)
+    result["total_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def summarize(results, elapsed_s):
+    succeeded = sum(1 for r in results if r["ok"])
+    return {
+        "images": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_s": elapsed_s,
+        "images_per_s": succeeded / elapsed_s if elapsed_s > 0 else 0.0,
+    }
+
+
+def run_batch(jobs, interpolation=cv2.INTER_LANCZOS4, on_result=None, tile_size=None, max_output_mp=None,
+              plan_cache_bytes=DEFAULT_PLAN_CACHE_BYTES, min_confidence=detect.DEFAULT_MIN_CONFIDENCE):
+    """Process jobs one after another. Returns (results, summary)."""
+    results = []
+    start = time.perf_counter()
+    for job in jobs:
+        result = process_job(job, interpolation, tile_size, max_output_mp, plan_cache_bytes, min_confidence)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return results, summarize(results, time.perf_counter() - start)
+
+
+def _init_worker():
+    # One OpenCV thread per process; the pool already keeps every core busy.
+    cv2.setNumThreads(1)
+
+
+def run_parallel(jobs, workers=None, max_in_flight=None, ordered=False,
+                 interpolation=cv2.INTER_LANCZOS4, on_result=None, tile_size=None, max_output_mp=None,
+                 plan_cache_bytes=DEFAULT_PLAN_CACHE_BYTES, min_confidence=detect.DEFAULT_MIN_CONFIDENCE):
+    """Process jobs on a pool of worker processes. Returns (results, summary).
+
+    At most max_in_flight jobs (default 2 per worker) are submitted at a time. on_result is
+    called as results complete, or in manifest order when ordered is set; the returned
+    results are always in manifest order.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or 2 * workers, 1)
+
+    results = [None] * len(jobs)
+    next_to_report = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = {}
+        job_iter = iter(enumerate(jobs))
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    index, job = next(job_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(process_job, job, interpolation, tile_size, max_output_mp,
+                                    plan_cache_bytes, min_confidence)] = index
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                if on_result is not None and not ordered:
+                    on_result(results[index])
+
+            if on_result is not None and ordered:
+                while next_to_report < len(results) and results[next_to_report] is not None:
+                    on_result(results[next_to_report])
+                    next_to_report += 1
+
+    return results, summarize(results, time.perf_counter() - start)
+
+
+def format_result(result):
+    name = os.path.basename(result["path"])
+    if not result["ok"]:
+        return f"FAIL {name}: {result['error']}"
+    if result["encode_ms"] is None:
+        steps = f"warp+encode {result['warp_ms']:.1f} ms"
+    else:
+        steps = f"warp {result['warp_ms']:.1f} ms, encode {result['encode_ms']:.1f} ms"
+    return (f"ok   {name} -> {os.path.basename(result['output'])} "
+            f"[decode {result['decode_ms']:.1f} ms, {steps}, total {result['total_ms']:.1f} ms]")
+
+
+def positive_int(value):
+    """argparse type for counts and sizes that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m perspective_core.batch",
+                                     description="Rectify a batch of images from a manifest of corner points.")
+    parser.add_argument("manifest", help="JSON or CSV manifest")
+    parser.add_argument("--output-dir", help="directory for rows without an explicit output")
+    parser.add_argument("--mode", choices=engine.MODES, default=engine.MODE_CROPPED,
+                        help="mode for rows that do not set one (default: %(default)s)")
+    parser.add_argument("--interpolation", choices=sorted(INTERPOLATIONS), default="lanczos4")
+    parser.add_argument("--workers", type=positive_int, default=1,
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument("--max-in-flight", type=positive_int,
+                        help="jobs submitted ahead of the workers (default: 2 per worker)")
+    parser.add_argument("--ordered", action="store_true",
+                        help="print results in manifest order instead of as they complete")
+    parser.add_argument("--tile-size", type=positive_int,
+                        help="warp in tiles of this size and stream PNG outputs band by band")
+    parser.add_argument("--max-output-mp", type=float,
+                        help="scale outputs larger than this many megapixels down to it")
+    parser.add_argument("--plan-cache-mb", type=float, default=DEFAULT_PLAN_CACHE_BYTES / 2 ** 20,
+                        help="remap grids cached per process for repeated points; 0 disables "
+                             "(default: %(default)s)")
+    parser.add_argument("--min-confidence", type=float, default=detect.DEFAULT_MIN_CONFIDENCE,
+                        help="rows without points fail below this detection confidence (default: %(default)s)")
+    parser.add_argument("--report", help="write per-image timings and the summary to this JSON file")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    jobs = load_manifest(args.manifest, args.mode, args.output_dir)
+    # Explicit outputs may point into directories that do not exist yet, like --output-dir
+    for output_dir in sorted({os.path.dirname(job.output) for job in jobs}):
+        os.makedirs(output_dir, exist_ok=True)
+
+    on_result = None if args.quiet else lambda r: print(format_result(r), flush=True)
+    interpolation = INTERPOLATIONS[args.interpolation]
+    plan_cache_bytes = int(args.plan_cache_mb * 2 ** 20)
+    if args.workers == 1:
+        results, summary = run_batch(jobs, interpolation, on_result, args.tile_size, args.max_output_mp,
+                                     plan_cache_bytes, args.min_confidence)
+    else:
+        results, summary = run_parallel(jobs, args.workers, args.max_in_flight, args.ordered,
+                                        interpolation, on_result, args.tile_size, args.max_output_mp,
+                                        plan_cache_bytes, args.min_confidence)
+
+    print(f"{summary['succeeded']}/{summary['images']} images in {summary['elapsed_s']:.2f} s "
+          f"({summary['images_per_s']:.2f} images/s)")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2, ensure_ascii=False)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Named calibration profiles: reuse one reference calibration on every photo of a fixed rig.
+
+A profile records what do_perspective in the measuring app derives from the four reference
+clicks: the points, the reference size in cm, the source image size, the homography to the
+rectified plane, its output size and px/cm. Profiles are stored together in one small JSON
+file (a few hundred bytes each) and keyed by name:
+
+    {"version": 1, "profiles": [{"name": "copy stand", "points": [...], "width_cm": 21.0, ...}]}
+
+Applying a profile skips point picking entirely. Photos from the same rig share the
+geometry, so the plans.WarpPlan prepared for it turns every further warp into a single remap.
+A photo of another resolution (the same camera set to a smaller size) reuses the profile
+through fit_profile, which rescales the homography instead of recalibrating.
+"""
+import json
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from . import engine, resolution
+
+PROFILES_VERSION = 1
+
+# points: TL, TR, BR, BL reference corners in source pixels; matrix: source px -> rectified px
+CalibrationProfile = namedtuple("CalibrationProfile", [
+    "name", "points", "width_cm", "height_cm", "source_size", "matrix", "output_size", "pixels_per_cm"])
+
+
+def create_profile(name, points, width_cm, height_cm, source_size, policy=resolution.DEFAULT_POLICY):
+    """Calibrate like do_perspective, at the output scale policy (a resolution.ResolutionPolicy) picks."""
+    geometry, pixels_per_cm, _ = resolution.resolve(policy, points, width_cm, height_cm, source_size)
+    return CalibrationProfile(name, engine.normalize_quad(points).tolist(), float(width_cm), float(height_cm),
+                              tuple(int(v) for v in source_size), np.asarray(geometry.matrix, dtype=np.float64),
+                              tuple(geometry.size), pixels_per_cm)
+
+
+def profile_geometry(profile):
+    """The WarpGeometry of the profile's rectified image (as engine.calibrated_geometry builds it)."""
+    return engine.WarpGeometry(profile.matrix, profile.output_size, cv2.BORDER_REPLICATE, 0)
+
+
+def fit_profile(profile, source_size):
+    """profile for photos of source_size: points and homography rescaled, output size and px/cm kept."""
+    source_size = tuple(int(v) for v in source_size)
+    if source_size == tuple(profile.source_size):
+        return profile
+    sx = source_size[0] / profile.source_size[0]
+    sy = source_size[1] / profile.source_size[1]
+    unscale = np.array([[1 / sx, 0, 0], [0, 1 / sy, 0], [0, 0, 1]], dtype=np.float64)
+    points = [[x * sx, y * sy] for x, y in profile.points]
+    return profile._replace(points=points, source_size=source_size, matrix=profile.matrix @ unscale)
+
+
+def prepare_plan(profile, plan_cache, interpolation=cv2.INTER_LANCZOS4):
+    """Build the profile's warp plan ahead of the first warp; None if it exceeds the cache budget."""
+    return plan_cache.prepare(profile_geometry(profile), interpolation)
+
+
+def _to_dict(profile):
+    data = profile._asdict()
+    data["points"] = [[float(x), float(y)] for x, y in profile.points]
+    data["source_size"] = list(profile.source_size)
+    data["matrix"] = np.asarray(profile.matrix, dtype=np.float64).tolist()
+    data["output_size"] = list(profile.output_size)
+    return data
+
+
+def _from_dict(data):
+    try:
+        return CalibrationProfile(
+            str(data["name"]), [[float(x), float(y)] for x, y in data["points"]], float(data["width_cm"]),
+            float(data["height_cm"]), tuple(int(v) for v in data["source_size"]),
+            np.asarray(data["matrix"], dtype=np.float64).reshape(3, 3), tuple(int(v) for v in data["output_size"]),
+            float(data["pixels_per_cm"]))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid calibration profile {data.get('name', '')!r}: {e}") from e
+
+
+def load_profiles(path):
+    """{name: CalibrationProfile} from a profiles file, in file order; {} if the file does not exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version", PROFILES_VERSION) > PROFILES_VERSION:
+        raise ValueError(f"{path}: profiles file version {data['version']} is newer than supported")
+    profiles = (_from_dict(entry) for entry in data.get("profiles", []))
+    return {profile.name: profile for profile in profiles}
+
+
+def save_profiles(path, profiles):
+    data = {"version": PROFILES_VERSION, "profiles": [_to_dict(p) for p in profiles.values()]}
+    # Written next to the target and renamed, so a failed save never truncates existing profiles.
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+def save_profile(path, profile):
+    """Add profile to the file at path, replacing a profile of the same name."""
+    profiles = load_profiles(path)
+    profiles.pop(profile.name, None)
+    profiles[profile.name] = profile
+    save_profiles(path, profiles)
+
+
+def load_profile(path, name=None):
+    """One profile from path: the one called name, or the last one saved if name is None."""
+    profiles = load_profiles(path)
+    if not profiles:
+        raise ValueError(f"{path}: no calibration profiles")
+    if name is None:
+        return list(profiles.values())[-1]
+    if name not in profiles:
+        raise ValueError(f"{path}: no calibration profile named {name!r}")
+    return profiles[name]
@@ -0,0 +1,85 @@
+"""Find a document-like quadrilateral in an image, instead of four manual clicks.
+
+detect_quad works on a copy downscaled to DETECT_MAX_SIDE: Canny edges, closed with a small
+dilation, then the largest contours simplified with approxPolyDP. Every convex four-corner
+candidate is scored by how much of its outline lies on edges and how much of the frame it
+covers; the best one is mapped back to full resolution and its corners refined with
+refine.refine_points on small full-resolution patches. Callers fall back to manual clicks when
+the confidence is under DEFAULT_MIN_CONFIDENCE.
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from .engine import order_points
+from .refine import refine_points, window_for_scale
+
+DETECT_MAX_SIDE = 800
+DEFAULT_MIN_CONFIDENCE = 0.6
+# Quads covering less than this fraction of the frame are ignored; the area score saturates at
+# FULL_AREA_FRACTION (a sheet filling a quarter of the photo is as likely as one filling it all).
+MIN_AREA_FRACTION = 0.05
+FULL_AREA_FRACTION = 0.25
+MAX_CANDIDATES = 10
+EDGE_SAMPLES_PER_SIDE = 64
+
+# points: TL, TR, BR, BL float32 in full-resolution pixels; confidence in [0, 1]
+QuadDetection = namedtuple("QuadDetection", ["points", "confidence"])
+
+
+def _edge_support(edges, quad):
+    """Fraction of points sampled along the quad's sides that fall on an edge pixel."""
+    t = np.linspace(0.0, 1.0, EDGE_SAMPLES_PER_SIDE, endpoint=False)[:, None]
+    samples = np.concatenate([quad[i] + t * (quad[(i + 1) % 4] - quad[i]) for i in range(4)])
+    xs = np.clip(np.rint(samples[:, 0]).astype(int), 0, edges.shape[1] - 1)
+    ys = np.clip(np.rint(samples[:, 1]).astype(int), 0, edges.shape[0] - 1)
+    return float(np.count_nonzero(edges[ys, xs])) / len(samples)
+
+
+def _edges(gray):
+    # Thresholds follow the image's median brightness, so dim and bright photos both work.
+    median = float(np.median(gray))
+    lower = int(max(0, 0.66 * median))
+    upper = int(min(255, max(1.33 * median, lower + 1)))
+    edges = cv2.Canny(gray, lower, upper)
+    return cv2.dilate(edges, np.ones((3, 3), np.uint8))
+
+
+def detect_quad(image, max_side=DETECT_MAX_SIDE, refine=True):
+    """The most document-like quad in image as a QuadDetection, or None if there is no candidate."""
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / max(width, height))
+    small = image
+    if scale < 1.0:
+        small = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = _edges(gray)
+
+    frame_area = float(gray.shape[0] * gray.shape[1])
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    contours = sorted(contours, key=cv2.contourArea, reverse=True)[:MAX_CANDIDATES]
+
+    best = None
+    for contour in contours:
+        perimeter = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        area_fraction = cv2.contourArea(approx) / frame_area
+        if area_fraction < MIN_AREA_FRACTION:
+            continue
+        quad = order_points(approx.reshape(4, 2))
+        confidence = _edge_support(edges, quad) * min(1.0, area_fraction / FULL_AREA_FRACTION)
+        if best is None or confidence > best.confidence:
+            best = QuadDetection(quad, confidence)
+
+    if best is None:
+        return None
+    points = (best.points + 0.5) / scale - 0.5  # pixel centres of the small image in full-resolution pixels
+    if refine:
+        # One pixel of the small image spans 1 / scale full-resolution pixels.
+        points = refine_points(image, points, window_for_scale(1 / scale))
+    return QuadDetection(order_points(points), best.confidence)
@@ -0,0 +1,111 @@
+"""Save images with explicit encoder settings, streaming large PNGs and reporting progress.
+
+image_io.write_image encodes the whole image into memory with cv2.imencode and then writes
+the buffer. save_image picks per format:
+
+    PNG   large images (or any image when several cores are available) go through
+          tiled.PngStreamWriter: row bands are filtered and deflated on png_workers threads
+          and written as they are compressed, so the encoded file is never held in memory;
+          stream=True / False forces either path
+    JPEG  quality, progressive and optimized Huffman tables
+    TIFF  compression (none, lzw, deflate, packbits) with the horizontal predictor, and rows
+          per strip (OpenCV writes strips only; tiled TIFF is not available through it)
+
+The file is written under a temporary name and renamed when complete, so a cancelled or
+failed save never leaves a truncated image behind. save_image takes on_progress and
+is_cancelled like the warps, so it can run on a jobs.JobRunner thread.
+"""
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from .engine import WarpCancelled
+from .image_io import encode_extension, write_image
+from .tiled import PngStreamWriter
+
+SaveOptions = namedtuple("SaveOptions", ["png_compression", "png_workers", "jpeg_quality", "jpeg_progressive",
+                                         "jpeg_optimize", "tiff_compression", "tiff_rows_per_strip"],
+                         defaults=[1, None, 95, False, False, "lzw", None])
+# OpenCV's own defaults for PNG and JPEG
+DEFAULT_SAVE_OPTIONS = SaveOptions()
+
+TIFF_COMPRESSIONS = {
+    "none": cv2.IMWRITE_TIFF_COMPRESSION_NONE,
+    "lzw": cv2.IMWRITE_TIFF_COMPRESSION_LZW,
+    "deflate": cv2.IMWRITE_TIFF_COMPRESSION_ADOBE_DEFLATE,
+    "packbits": cv2.IMWRITE_TIFF_COMPRESSION_PACKBITS,
+}
+# PNGs of at least this many pixels are always streamed, even on one core
+STREAM_MIN_PIXELS = 16_000_000
+STREAM_BAND_ROWS = 256
+
+
+def png_workers(options):
+    return options.png_workers or os.cpu_count() or 1
+
+
+def encoder_params(ext, options=DEFAULT_SAVE_OPTIONS):
+    """cv2.imencode parameters for ext ('.png', '.jpg', ...) under options."""
+    if ext == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, options.png_compression]
+    if ext in (".jpg", ".jpeg", ".jfif"):
+        return [cv2.IMWRITE_JPEG_QUALITY, options.jpeg_quality,
+                cv2.IMWRITE_JPEG_PROGRESSIVE, int(options.jpeg_progressive),
+                cv2.IMWRITE_JPEG_OPTIMIZE, int(options.jpeg_optimize)]
+    if ext == ".tiff":
+        compression = TIFF_COMPRESSIONS[options.tiff_compression]
+        params = [cv2.IMWRITE_TIFF_COMPRESSION, compression]
+        if compression in (cv2.IMWRITE_TIFF_COMPRESSION_LZW, cv2.IMWRITE_TIFF_COMPRESSION_ADOBE_DEFLATE):
+            params += [cv2.IMWRITE_TIFF_PREDICTOR, cv2.IMWRITE_TIFF_PREDICTOR_HORIZONTAL]
+        if options.tiff_rows_per_strip:
+            params += [cv2.IMWRITE_TIFF_ROWSPERSTRIP, options.tiff_rows_per_strip]
+        return params
+    return []
+
+
+def streams_png(image, options=DEFAULT_SAVE_OPTIONS, stream=None):
+    """Whether save_image writes image through the streaming (and possibly parallel) PNG writer.
+
+    stream=None decides by size and workers; True or False force it, as far as the writer
+    supports the image (8-bit, 1, 3 or 4 channels).
+    """
+    if image.dtype != np.uint8 or (image.ndim == 3 and image.shape[2] not in (1, 3, 4)):
+        return False
+    if stream is not None:
+        return bool(stream)
+    return png_workers(options) > 1 or image.shape[0] * image.shape[1] >= STREAM_MIN_PIXELS
+
+
+def _write_png_stream(path, image, options, on_progress, is_cancelled):
+    height, width = image.shape[:2]
+    channels = image.shape[2] if image.ndim == 3 else 1
+    with PngStreamWriter(path, width, height, channels, options.png_compression, png_workers(options)) as writer:
+        for y0 in range(0, height, STREAM_BAND_ROWS):
+            if is_cancelled is not None and is_cancelled():
+                raise WarpCancelled()
+            writer.write_rows(image[y0:y0 + STREAM_BAND_ROWS])
+            if on_progress is not None:
+                on_progress(min(y0 + STREAM_BAND_ROWS, height) / height)
+
+
+def save_image(path, image, options=DEFAULT_SAVE_OPTIONS, on_progress=None, is_cancelled=None, stream=None):
+    """Encode image to path (format from its extension, unknown ones as PNG) with options.
+
+    stream chooses the PNG path (see streams_png); the default picks it by size and workers.
+    """
+    ext = encode_extension(path)
+    temp_path = f"{path}.part"
+    try:
+        if ext == ".png" and streams_png(image, options, stream):
+            _write_png_stream(temp_path, image, options, on_progress, is_cancelled)
+        else:
+            write_image(temp_path, image, encoder_params(ext, options), ext=ext)
+            if on_progress is not None:
+                on_progress(1.0)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
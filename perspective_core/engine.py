@@ -0,0 +1,318 @@
+"""Headless perspective-correction geometry and warps shared by both apps.
+
+Everything here works on plain numpy arrays (BGR images, (x, y) points) and
+never touches Tk, so it can run in worker processes, batch jobs and benchmarks.
+Image sizes are (width, height), matching OpenCV's dsize convention.
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from . import quads
+
+MODE_CROPPED = "cropped"
+MODE_FULL = "full"
+MODE_FULL_FIT = "full-fit"
+MODES = (MODE_CROPPED, MODE_FULL, MODE_FULL_FIT)
+
+DEFAULT_PIXELS_PER_CM = 75.0
+DEFAULT_MAX_DIM_PX = 1500.0
+
+# A single warp: homography, output size (w, h) and how pixels outside the source are filled.
+WarpGeometry = namedtuple("WarpGeometry", ["matrix", "size", "border_mode", "border_value"])
+
+
+class DegenerateQuadError(ValueError):
+    """The selected quad has no usable width or height."""
+
+
+class WarpCancelled(Exception):
+    """Raised by apply_geometry_in_strips when its is_cancelled callback returns True."""
+
+
+def image_size(image):
+    h, w = image.shape[:2]
+    return w, h
+
+
+def image_corners(width, height):
+    return np.float32([
+        [0, 0],
+        [width - 1, 0],
+        [width - 1, height - 1],
+        [0, height - 1]
+    ]).reshape(-1, 1, 2)
+
+
+def _as_quad(points):
+    src = np.float32(points)
+    if src.shape != (4, 2):
+        raise ValueError("נדרשות בדיוק 4 נקודות.")
+    return src
+
+
+def order_points(pts):
+    """TL, TR, BR, BL (float32) of a (4, 2) quad, or of every quad in an (N, 4, 2) batch.
+
+    Corners are sorted by angle around the centroid (quads.order_quads), so each corner is
+    used exactly once however the quad is rotated. The old x+y / y-x rule could pick the same
+    point twice for quads near 45 degrees and silently produce a degenerate homography.
+    """
+    pts = np.asarray(pts, dtype=np.float64)
+    ordered = quads.order_quads(pts).astype(np.float32)
+    return ordered if pts.ndim == 3 else ordered[0]
+
+
+def normalize_quad(points):
+    """The four clicked points as a clockwise TL, TR, BR, BL quad; DegenerateQuadError if there is none.
+
+    Points already clicked in that order are kept as they are, so the user's choice of the
+    top-left corner survives on rotated documents; any other order is sorted by angle. Points
+    that still do not form a convex quad (three on a line, repeated points) are rejected here,
+    before any warp is computed.
+    """
+    src = _as_quad(points)
+    if quads.valid_quads(src)[0]:
+        return src
+    src = order_points(src)
+    if not quads.valid_quads(src)[0]:
+        raise DegenerateQuadError("ארבע הנקודות אינן יוצרות מרובע קמור (נקודות חופפות או שלוש נקודות על קו אחד).")
+    return src
+
+
+def quad_size(points):
+    """Output (width, height) of a TL, TR, BR, BL quad: the longer of each pair of opposite edges."""
+    src = _as_quad(points)
+    width_top = np.linalg.norm(src[0] - src[1])
+    width_bottom = np.linalg.norm(src[3] - src[2])
+    height_left = np.linalg.norm(src[0] - src[3])
+    height_right = np.linalg.norm(src[1] - src[2])
+    return max(int(width_top), int(width_bottom)), max(int(height_left), int(height_right))
+
+
+def cropped_geometry(points):
+    """Straighten the quad itself into a width x height rectangle ("יישור קטע נבחר")."""
+    src = normalize_quad(points)
+    width, height = quad_size(src)
+    if width <= 0 or height <= 0:
+        raise DegenerateQuadError("לא ניתן לחשב מידות חוקיות.")
+
+    dst = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    return WarpGeometry(matrix, (width, height), cv2.BORDER_CONSTANT, 0)
+
+
+def full_geometry(points, source_size, fit_to_frame=True):
+    """Warp the whole image so the quad becomes an upright rectangle around its own centre.
+
+    With fit_to_frame the output keeps the source size (edges replicated); otherwise the
+    output grows to the bounding box of the warped image and the margins are black.
+    """
+    src = normalize_quad(points)
+    original_width, original_height = source_size
+    rect_width, rect_height = quad_size(src)
+    if rect_width <= 0 or rect_height <= 0:
+        raise DegenerateQuadError("לא ניתן לחשב מידות חוקיות עבור המרובע הנבחר.")
+
+    center_x = np.mean(src[:, 0])
+    center_y = np.mean(src[:, 1])
+    half_w = rect_width / 2
+    half_h = rect_height / 2
+    dst = np.float32([
+        [center_x - half_w, center_y - half_h],
+        [center_x + half_w, center_y - half_h],
+        [center_x + half_w, center_y + half_h],
+        [center_x - half_w, center_y + half_h]
+    ])
+
+    M1 = cv2.getPerspectiveTransform(src, dst)
+    if M1 is None:
+        raise ValueError("לא ניתן לחשב את טרנספורמציית הפרספקטיבה הראשונית. ייתכן שהנקודות קו-לינאריות.")
+
+    if fit_to_frame:
+        return WarpGeometry(M1, (original_width, original_height), cv2.BORDER_REPLICATE, 0)
+
+    transformed_img_corners = cv2.perspectiveTransform(image_corners(original_width, original_height), M1)
+    if transformed_img_corners is None:
+        raise ValueError("לא ניתן היה לבצע טרנספורמציה על פינות התמונה.")
+
+    min_x_warped = np.min(transformed_img_corners[:, 0, 0])
+    max_x_warped = np.max(transformed_img_corners[:, 0, 0])
+    min_y_warped = np.min(transformed_img_corners[:, 0, 1])
+    max_y_warped = np.max(transformed_img_corners[:, 0, 1])
+
+    warped_content_width = int(max_x_warped - min_x_warped)
+    warped_content_height = int(max_y_warped - min_y_warped)
+    if warped_content_width <= 0 or warped_content_height <= 0:
+        raise ValueError("לתמונה שעברה טרנספורמציה אין מידות חוקיות (רוחב או גובה קטן מדי).")
+
+    translation_matrix = np.float32([
+        [1, 0, -min_x_warped],
+        [0, 1, -min_y_warped],
+        [0, 0, 1]
+    ])
+    return WarpGeometry(translation_matrix @ M1, (warped_content_width, warped_content_height),
+                        cv2.BORDER_CONSTANT, (0, 0, 0))
+
+
+def calibrated_geometry(points, width_cm, height_cm, source_size,
+                        pixels_per_cm=DEFAULT_PIXELS_PER_CM, max_dim_px=DEFAULT_MAX_DIM_PX):
+    """Warp the whole image so a reference rectangle of known size gets a fixed px/cm scale.
+
+    Returns (geometry, pixels_per_cm). The reference is capped at max_dim_px on its long side.
+    """
+    if width_cm <= 0 or height_cm <= 0:
+        raise ValueError("Dimensions must be positive.")
+
+    src_ordered = normalize_quad(points)
+
+    pixels_per_cm = min(pixels_per_cm, max_dim_px / width_cm, max_dim_px / height_cm)
+
+    # The reference's corners are its edges, so it spans exactly width_cm * pixels_per_cm pixels
+    # (not one pixel less, which would bias every measurement by about 1 / pixels_per_cm cm).
+    rect_w_px = width_cm * pixels_per_cm
+    rect_h_px = height_cm * pixels_per_cm
+
+    dst_rect_pts = np.array([
+        [0, 0],
+        [rect_w_px, 0],
+        [rect_w_px, rect_h_px],
+        [0, rect_h_px]
+    ], dtype=np.float32)
+
+    M = cv2.getPerspectiveTransform(src_ordered, dst_rect_pts)
+
+    w_orig, h_orig = source_size
+    transformed_img_corners = cv2.perspectiveTransform(image_corners(w_orig, h_orig), M)
+
+    min_x_transformed = np.min(transformed_img_corners[:, 0, 0])
+    max_x_transformed = np.max(transformed_img_corners[:, 0, 0])
+    min_y_transformed = np.min(transformed_img_corners[:, 0, 1])
+    max_y_transformed = np.max(transformed_img_corners[:, 0, 1])
+
+    output_w_px = int(np.ceil(max_x_transformed - min_x_transformed))
+    output_h_px = int(np.ceil(max_y_transformed - min_y_transformed))
+
+    translation_matrix = np.array([
+        [1, 0, -min_x_transformed],
+        [0, 1, -min_y_transformed],
+        [0, 0, 1]
+    ], dtype=np.float32)
+
+    geometry = WarpGeometry(translation_matrix @ M, (output_w_px, output_h_px), cv2.BORDER_REPLICATE, 0)
+    return geometry, pixels_per_cm
+
+
+def limit_output_size(geometry, max_megapixels):
+    """Scale geometry down uniformly so its output has at most max_megapixels MP.
+
+    Returns (geometry, scale); scale is 1.0 when the output already fits. The scale is the
+    same on both axes, so a calibrated output's px/cm becomes pixels_per_cm * scale.
+    """
+    width, height = geometry.size
+    if not max_megapixels or width * height <= max_megapixels * 1e6:
+        return geometry, 1.0
+    scale = float(np.sqrt(max_megapixels * 1e6 / (width * height)))
+    new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    scaling = np.array([[scale, 0, 0], [0, scale, 0], [0, 0, 1]], dtype=np.float64)
+    return geometry._replace(matrix=scaling @ geometry.matrix, size=new_size), scale
+
+
+def geometry_for_mode(points, mode, source_size):
+    if mode == MODE_CROPPED:
+        return cropped_geometry(points)
+    if mode == MODE_FULL:
+        return full_geometry(points, source_size, fit_to_frame=False)
+    if mode == MODE_FULL_FIT:
+        return full_geometry(points, source_size, fit_to_frame=True)
+    raise ValueError(f"Unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+
+
+def apply_geometry(image, geometry, interpolation=cv2.INTER_LANCZOS4):
+    return cv2.warpPerspective(image, geometry.matrix, geometry.size, flags=interpolation,
+                               borderMode=geometry.border_mode, borderValue=geometry.border_value)
+
+
+def apply_geometry_in_strips(image, geometry, interpolation=cv2.INTER_LANCZOS4, strip_height=256,
+                             on_progress=None, is_cancelled=None):
+    """Same output as apply_geometry, computed in horizontal strips.
+
+    Between strips on_progress(fraction) is called and is_cancelled() is checked, so a
+    long warp running on a worker thread can report progress and stop early (WarpCancelled).
+    """
+    width, height = geometry.size
+    output = np.empty((height, width) + image.shape[2:], dtype=image.dtype)
+    for y0 in range(0, height, strip_height):
+        if is_cancelled is not None and is_cancelled():
+            raise WarpCancelled()
+        y1 = min(y0 + strip_height, height)
+        shift = np.array([[1, 0, 0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64)
+        cv2.warpPerspective(image, shift @ geometry.matrix, (width, y1 - y0), dst=output[y0:y1],
+                            flags=interpolation, borderMode=geometry.border_mode,
+                            borderValue=geometry.border_value)
+        if on_progress is not None:
+            on_progress(y1 / height)
+    return output
+
+
+def warp_cropped(image, points, interpolation=cv2.INTER_LANCZOS4):
+    """Returns (warped image, homography)."""
+    geometry = cropped_geometry(points)
+    return apply_geometry(image, geometry, interpolation), geometry.matrix
+
+
+def warp_full(image, points, fit_to_frame=True, interpolation=cv2.INTER_LANCZOS4):
+    """Returns (warped image, homography)."""
+    geometry = full_geometry(points, image_size(image), fit_to_frame)
+    return apply_geometry(image, geometry, interpolation), geometry.matrix
+
+
+def warp_calibrated(image, points, width_cm, height_cm, interpolation=cv2.INTER_LANCZOS4, **kwargs):
+    """Returns (warped image, homography, pixels_per_cm)."""
+    geometry, pixels_per_cm = calibrated_geometry(points, width_cm, height_cm, image_size(image), **kwargs)
+    return apply_geometry(image, geometry, interpolation), geometry.matrix, pixels_per_cm
+
+
+def warp_for_mode(image, points, mode, interpolation=cv2.INTER_LANCZOS4):
+    """Returns (warped image, homography) for one of MODES."""
+    geometry = geometry_for_mode(points, mode, image_size(image))
+    return apply_geometry(image, geometry, interpolation), geometry.matrix
+
+
+def map_points(matrix, points):
+    """Points (N, 2) through a homography, as cv2.perspectiveTransform but (N, 2) float64 in and out.
+
+    Points on or beyond the horizon (homogeneous w <= 0, where the quad's plane is not in
+    front of the camera) come out as NaN.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    mapped = points @ np.asarray(matrix, dtype=np.float64)[:, :2].T + np.asarray(matrix, dtype=np.float64)[:, 2]
+    w = mapped[:, 2:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = mapped[:, :2] / w
+    result[w[:, 0] <= 0] = np.nan
+    return result
+
+
+def display_to_image(x, y, displayed_size, source_size, integer=True):
+    """Map a point on the displayed (scaled) image back to source-pixel coordinates.
+
+    With integer=False the coordinates are not truncated, so a click keeps the sub-pixel
+    position it has at high zoom.
+    """
+    displayed_width, displayed_height = displayed_size
+    source_width, source_height = source_size
+    image_x = (x / displayed_width) * source_width if displayed_width > 0 else 0
+    image_y = (y / displayed_height) * source_height if displayed_height > 0 else 0
+    if integer:
+        return int(image_x), int(image_y)
+    return image_x, image_y
+
+
+def image_to_display(x, y, displayed_size, source_size):
+    displayed_width, displayed_height = displayed_size
+    source_width, source_height = source_size
+    display_x = (x / source_width) * displayed_width if source_width > 0 else 0
+    display_y = (y / source_height) * displayed_height if source_height > 0 else 0
+    return display_x, display_y
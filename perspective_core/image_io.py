@@ -0,0 +1,139 @@
+"""Image decode/encode helpers.
+
+np.fromfile + cv2.imdecode (and cv2.imencode + tofile) are used instead of
+cv2.imread/imwrite so that paths with non-ASCII characters work on Windows.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+SUPPORTED_EXTENSIONS = [".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".jfif"]
+
+# Previews are decoded at 1/2, 1/4 or 1/8 scale but keep at least this many pixels on the long side.
+PREVIEW_MIN_SIDE = 1600
+REDUCED_COLOR_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+# Only libjpeg decodes straight to a reduced scale; other formats decode in full and then shrink.
+_JPEG_SIGNATURE = b"\xff\xd8\xff"
+# EXIF orientations that swap width and height (cv2.imdecode applies the rotation)
+_TRANSPOSING_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def read_image(path, flags=cv2.IMREAD_COLOR):
+    img_array = np.fromfile(path, np.uint8)
+    image = cv2.imdecode(img_array, flags)
+    if image is None:
+        raise ValueError("לא ניתן לטעון את התמונה.")
+    return image
+
+
+def read_image_size(path):
+    """(width, height) as cv2.imdecode will return it, read from the header only; None if unknown."""
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            orientation = img.getexif().get(0x0112, 1)
+    except Exception:
+        return None
+    if orientation in _TRANSPOSING_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def is_jpeg(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(_JPEG_SIGNATURE)) == _JPEG_SIGNATURE
+    except OSError:
+        return False
+
+
+def preview_reduction(full_size, min_side=PREVIEW_MIN_SIDE):
+    """Largest of 1, 2, 4, 8 that keeps the long side of the preview at least min_side."""
+    if full_size is None:
+        return 1
+    factor = 1
+    while factor < 8 and max(full_size) / (factor * 2) >= min_side:
+        factor *= 2
+    return factor
+
+
+class PreviewImage:
+    """An image opened for display and point picking before its full resolution is decoded.
+
+    A JPEG's preview is decoded at reduced scale (libjpeg decodes straight to 1/2, 1/4 or 1/8)
+    and the full-resolution array is only decoded by full(), which start_full_load() can run
+    ahead of time on a background thread. Other formats have no reduced decode, so they are
+    decoded once at full resolution and the preview is shrunk from that array. Points are kept
+    in full-resolution coordinates: use to_full / to_preview to map between the two.
+    """
+
+    def __init__(self, path, min_side=PREVIEW_MIN_SIDE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._full = None
+
+        full_size = read_image_size(path)
+        factor = preview_reduction(full_size, min_side)
+        if factor == 1:
+            self._full = read_image(path)
+            self.preview = self._full
+            self.full_size = (self._full.shape[1], self._full.shape[0])
+        elif is_jpeg(path):
+            self.preview = read_image(path, REDUCED_COLOR_FLAGS[factor])
+            self.full_size = full_size
+        else:
+            self._full = read_image(path)
+            self.full_size = (self._full.shape[1], self._full.shape[0])
+            preview_size = (max(1, round(self.full_size[0] / factor)), max(1, round(self.full_size[1] / factor)))
+            self.preview = cv2.resize(self._full, preview_size, interpolation=cv2.INTER_AREA)
+        self.scale = (self.full_size[0] / self.preview.shape[1], self.full_size[1] / self.preview.shape[0])
+
+    @property
+    def full_loaded(self):
+        return self._full is not None
+
+    def full(self):
+        """The full-resolution image, decoding it now if no background load got there first."""
+        with self._lock:
+            if self._full is None:
+                image = read_image(self.path)
+                if (image.shape[1], image.shape[0]) != self.full_size:
+                    raise ValueError("גודל התמונה המלאה אינו תואם לתצוגה המקדימה.")
+                self._full = image
+            return self._full
+
+    def start_full_load(self):
+        if self._full is None:
+            threading.Thread(target=self._load_quietly, daemon=True).start()
+
+    def _load_quietly(self):
+        try:
+            self.full()
+        except Exception:
+            pass  # full() raises again when the image is actually needed
+
+    def to_full(self, x, y):
+        return x * self.scale[0], y * self.scale[1]
+
+    def to_preview(self, x, y):
+        return x / self.scale[0], y / self.scale[1]
+
+
+def encode_extension(path):
+    """Extension to encode with for path; unknown extensions fall back to PNG."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        ext = ".png"
+    return ext
+
+
+def write_image(path, image, params=(), ext=None):
+    """Encode image to path; ext overrides the format taken from the path's extension."""
+    ext = ext or encode_extension(path)
+    is_success, im_buf_arr = cv2.imencode(ext, image, list(params))
+    if not is_success:
+        raise ValueError(f"שגיאה בקידוד התמונה לסיומת {ext.upper()}.")
+    im_buf_arr.tofile(path)
@@ -0,0 +1,80 @@
+"""Run long work (warps, saves) on a background thread and poll it from the Tk main loop.
+
+Tk widgets must only be touched from the main thread, so the apps never wait on a job:
+they start it with JobRunner.submit and check Job.done from a master.after callback.
+"""
+import threading
+
+from .engine import WarpCancelled
+
+
+class Job:
+    def __init__(self):
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def set_progress(self, fraction):
+        self.progress = fraction
+
+    @property
+    def done(self):
+        return self._done_event.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job is done or timeout seconds have passed; True if done.
+
+        For other worker threads only; the Tk main thread polls done instead.
+        """
+        return self._done_event.wait(timeout)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+
+class JobRunner:
+    """Runs one job at a time; submitting a new job cancels (supersedes) the running one.
+
+    The function is called as func(*args, on_progress=..., is_cancelled=..., **kwargs), which
+    matches engine.apply_geometry_in_strips. WarpCancelled raised by it is not an error.
+    """
+
+    def __init__(self):
+        self.current = None
+
+    @property
+    def busy(self):
+        return self.current is not None and not self.current.done
+
+    def submit(self, func, *args, **kwargs):
+        self.cancel()
+        job = Job()
+        thread = threading.Thread(target=self._run, args=(job, func, args, kwargs), daemon=True)
+        self.current = job
+        thread.start()
+        return job
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+
+    @staticmethod
+    def _run(job, func, args, kwargs):
+        try:
+            job.result = func(*args, on_progress=job.set_progress, is_cancelled=job.is_cancelled, **kwargs)
+        except WarpCancelled:
+            job.cancel()
+        except Exception as e:
+            job.error = e
+        finally:
+            job._done_event.set()
@@ -0,0 +1,237 @@
+"""Many length and area measurements on a calibrated (rectified) plane, computed in one pass.
+
+Usage:
+    python -m perspective_core.measure points.json [more.json ...] [--csv out.csv] [--json out.json]
+
+A MeasurementStore holds segments (2 points), polylines (2+ points, open) and polygons
+(3+ points, closed) in rectified pixels together with the calibration's px/cm. compute()
+measures all of them at once: every edge of every measurement goes into one array, lengths
+come from a single np.hypot and are summed per measurement with np.bincount, and polygon
+areas use the shoelace formula over the same edges.
+
+A points file is JSON with the calibration and the measurements:
+
+    {"pixels_per_cm": 75.0, "homography": [[...], [...], [...]],
+     "measurements": [{"kind": "segment", "points": [[x, y], [x, y]], "label": "door"}, ...]}
+
+or with the reference the apps calibrate from, instead of pixels_per_cm and homography:
+
+    {"reference": {"points": [[x, y] x 4], "width_cm": 21.0, "height_cm": 29.7,
+                   "source_size": [w, h]}, "measurements": [...]}
+
+or with a saved calibration profile (see calibration.py; the name defaults to the last saved):
+
+    {"profile": {"file": "profiles.json", "name": "copy stand"}, "measurements": [...]}
+
+Measurement points are in source-image pixels and go through the homography; without one
+(or with "space": "rectified" on a measurement) they are taken as rectified pixels.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+from . import calibration, engine, resolution
+
+SEGMENT = "segment"
+POLYLINE = "polyline"
+POLYGON = "polygon"
+KINDS = (SEGMENT, POLYLINE, POLYGON)
+MIN_POINTS = {SEGMENT: 2, POLYLINE: 2, POLYGON: 3}
+
+CSV_FIELDS = ["source", "index", "kind", "label", "points", "length_cm", "area_cm2"]
+
+
+class MeasurementStore:
+    def __init__(self, pixels_per_cm, homography=None):
+        if not pixels_per_cm or pixels_per_cm <= 0:
+            raise ValueError("pixels_per_cm must be positive")
+        self.pixels_per_cm = float(pixels_per_cm)
+        # source pixels -> rectified pixels; only needed to add points given on the original image
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64)
+        self.kinds = []
+        self.labels = []
+        self.points = []  # (k, 2) float64 arrays in rectified pixels
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, points, label=None, source=False):
+        """Add a measurement and return its index. source=True maps points through the homography."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown measurement kind {kind!r}, expected one of {', '.join(KINDS)}")
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) < MIN_POINTS[kind] or (kind == SEGMENT and len(points) != 2):
+            raise ValueError(f"A {kind} needs {'exactly' if kind == SEGMENT else 'at least'} "
+                             f"{MIN_POINTS[kind]} points")
+        if source:
+            if self.homography is None:
+                raise ValueError("Source points need a homography")
+            points = engine.map_points(self.homography, points)
+            if np.isnan(points).any():
+                raise ValueError("A point lies beyond the horizon of the calibrated plane")
+        self.kinds.append(kind)
+        self.labels.append(label)
+        self.points.append(points)
+        return len(self.kinds) - 1
+
+    def add_segment(self, p1, p2, label=None, source=False):
+        return self.add(SEGMENT, [p1, p2], label, source)
+
+    def add_polyline(self, points, label=None, source=False):
+        return self.add(POLYLINE, points, label, source)
+
+    def add_polygon(self, points, label=None, source=False):
+        return self.add(POLYGON, points, label, source)
+
+    def remove(self, index):
+        del self.kinds[index]
+        del self.labels[index]
+        del self.points[index]
+
+    def clear(self):
+        self.kinds = []
+        self.labels = []
+        self.points = []
+
+    def compute(self):
+        """(lengths_cm, areas_cm2) arrays, one entry per measurement.
+
+        A polygon's length is its perimeter; areas are NaN for segments and polylines.
+        """
+        count = len(self.kinds)
+        if count == 0:
+            return np.zeros(0), np.zeros(0)
+
+        sizes = np.array([len(p) for p in self.points])
+        closed = np.array([kind == POLYGON for kind in self.kinds])
+        points = np.concatenate(self.points)
+        item = np.repeat(np.arange(count), sizes)
+        first = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        last = np.repeat(np.cumsum(sizes) - 1, sizes)
+
+        # Edge i -> i + 1 inside each measurement, and last -> first for polygons.
+        starts = np.arange(len(points))
+        ends = np.where(starts == last, first, starts + 1)
+        keep = (starts != last) | closed[item]
+        starts, ends, item = starts[keep], ends[keep], item[keep]
+
+        p, q = points[starts], points[ends]
+        lengths = np.bincount(item, weights=np.hypot(q[:, 0] - p[:, 0], q[:, 1] - p[:, 1]), minlength=count)
+        cross = np.bincount(item, weights=p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1], minlength=count)
+        areas = np.where(closed, np.abs(cross) / 2, np.nan)
+        return lengths / self.pixels_per_cm, areas / self.pixels_per_cm ** 2
+
+    def rows(self, source_name=None):
+        lengths, areas = self.compute()
+        rows = []
+        for i, kind in enumerate(self.kinds):
+            rows.append({
+                "source": source_name,
+                "index": i,
+                "kind": kind,
+                "label": self.labels[i],
+                "points": self.points[i].tolist(),
+                "length_cm": float(lengths[i]),
+                "area_cm2": None if np.isnan(areas[i]) else float(areas[i]),
+            })
+        return rows
+
+    @classmethod
+    def from_reference(cls, points, width_cm, height_cm, source_size, policy=resolution.DEFAULT_POLICY):
+        """Calibrate from a reference rectangle of known size, as do_perspective does."""
+        geometry, pixels_per_cm, _ = resolution.resolve(policy, points, width_cm, height_cm, source_size)
+        return cls(pixels_per_cm, geometry.matrix)
+
+    @classmethod
+    def from_profile(cls, profile):
+        """Use a calibration.CalibrationProfile, e.g. one saved from the measuring app."""
+        return cls(profile.pixels_per_cm, profile.matrix)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        reference = data.get("reference")
+        profile = data.get("profile")
+        if profile is not None:
+            # {"file": profiles.json, "name": ...}; the file is relative to the points file
+            profiles_path = os.path.join(os.path.dirname(os.path.abspath(path)), profile["file"])
+            store = cls.from_profile(calibration.load_profile(profiles_path, profile.get("name")))
+        elif reference is not None:
+            store = cls.from_reference(reference["points"], reference["width_cm"], reference["height_cm"],
+                                       reference["source_size"])
+        elif "pixels_per_cm" in data:
+            store = cls(data["pixels_per_cm"], data.get("homography"))
+        else:
+            raise ValueError(f"{path}: expected pixels_per_cm, a reference or a profile")
+        for number, entry in enumerate(data.get("measurements", []), start=1):
+            space = entry.get("space", "source" if store.homography is not None else "rectified")
+            try:
+                store.add(entry.get("kind", SEGMENT), entry["points"], entry.get("label"), source=space == "source")
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{path}: measurement {number}: {e}") from e
+        return store
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, points=json.dumps(row["points"])))
+
+
+def write_json(path, rows, pixels_per_cm=None):
+    data = {"measurements": rows}
+    if pixels_per_cm is not None:
+        data["pixels_per_cm"] = pixels_per_cm
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def export(path, store, source_name=None):
+    """Write store's measurements to CSV or JSON, chosen by path's extension."""
+    rows = store.rows(source_name)
+    if os.path.splitext(path)[1].lower() == ".csv":
+        write_csv(path, rows)
+    else:
+        write_json(path, rows, store.pixels_per_cm)
+
+
+def format_row(row):
+    area = f", area {row['area_cm2']:.3f} cm²" if row["area_cm2"] is not None else ""
+    label = f" {row['label']}" if row["label"] else ""
+    return f"{row['source'] or ''} #{row['index']} {row['kind']}{label}: length {row['length_cm']:.3f} cm{area}"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m perspective_core.measure",
+                                     description="Measure lengths and areas from files of point lists.")
+    parser.add_argument("files", nargs="+", help="JSON points files")
+    parser.add_argument("--csv", help="write all measurements to this CSV file")
+    parser.add_argument("--json", help="write all measurements to this JSON file")
+    parser.add_argument("--quiet", action="store_true", help="do not print the measurements")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    rows = []
+    for path in args.files:
+        rows.extend(MeasurementStore.from_file(path).rows(os.path.basename(path)))
+    if not args.quiet:
+        for row in rows:
+            print(format_row(row))
+    if args.csv:
+        write_csv(args.csv, rows)
+    if args.json:
+        write_json(args.json, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
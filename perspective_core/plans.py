@@ -0,0 +1,196 @@
+"""Precomputed remap grids for warps that are applied again and again with the same geometry.
+
+A fixed camera shooting the same document position produces the same four corners on every
+frame, so the homography, and the source position of every output pixel, never change.
+A WarpPlan holds those positions in OpenCV's fixed-point remap format (the CV_16SC2 +
+CV_16UC1 pair that cv2.convertMaps produces), so applying it is a plain cv2.remap, without
+solving or inverting the homography per pixel. WarpPlanCache keeps recently used plans,
+evicting the least recently used ones beyond a memory budget.
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from . import engine
+from .engine import WarpCancelled
+
+DEFAULT_PLAN_CACHE_BYTES = 512 * 2 ** 20
+# Sub-pixel resolution of OpenCV's fixed-point maps (cv2.INTER_TAB_SIZE, 1 << INTER_BITS)
+INTER_TAB_SIZE = 32
+# Source coordinates are clamped this far outside the image; any sample beyond that only sees
+# border pixels, and the clamp keeps them inside int16.
+_COORD_SLACK = 16
+_BUILD_STRIP_ROWS = 256
+
+
+def plan_bytes(size, interpolation=cv2.INTER_LANCZOS4):
+    """Memory a plan for an output of size (w, h) takes: 4 bytes per pixel, plus 2 unless nearest."""
+    width, height = size
+    per_pixel = 4 if interpolation == cv2.INTER_NEAREST else 6
+    return width * height * per_pixel
+
+
+def geometry_key(geometry, interpolation):
+    """Everything a plan depends on. A geometry is fully determined by (points, source size, mode)."""
+    border_value = geometry.border_value
+    if not np.isscalar(border_value):
+        border_value = tuple(float(v) for v in border_value)
+    return (np.asarray(geometry.matrix, dtype=np.float64).tobytes(), tuple(geometry.size), geometry.border_mode,
+            border_value, interpolation)
+
+
+class WarpPlan:
+    """Source position of every output pixel of one geometry, ready for cv2.remap.
+
+    With LANCZOS4, the apps' filter, apply(image) gives the same result as
+    engine.apply_geometry(image, geometry) for any image of the source size, since
+    warpPerspective uses the same fixed-point coordinates internally. OpenCV 5 samples the
+    other filters at float precision, so there the plan's 1/32 px grid can differ from a
+    direct warp by a grey level on smooth images (more on noise).
+    """
+
+    def __init__(self, geometry, interpolation=cv2.INTER_LANCZOS4):
+        self.geometry = geometry
+        self.interpolation = interpolation
+        width, height = geometry.size
+        nearest = interpolation == cv2.INTER_NEAREST
+        self.map1 = np.empty((height, width, 2), dtype=np.int16)
+        self.map2 = None if nearest else np.empty((height, width), dtype=np.uint16)
+
+        inverse = np.linalg.inv(np.asarray(geometry.matrix, dtype=np.float64))
+        xs = np.arange(width, dtype=np.float64)
+        scale = 1 if nearest else INTER_TAB_SIZE
+        # int16 has to hold the integer part; the slack keeps the clamp far from the image
+        limit = (32767 - _COORD_SLACK) * scale
+        for y0 in range(0, height, _BUILD_STRIP_ROWS):
+            ys = np.arange(y0, min(y0 + _BUILD_STRIP_ROWS, height), dtype=np.float64)[:, None]
+            w = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+            # Like warpPerspective: scale by 1/w in one step and round to fixed point; w == 0 maps to 0.
+            w = np.divide(scale, w, out=np.zeros_like(w), where=w != 0)
+            fx = np.clip(np.rint((inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) * w), -limit, limit)
+            fy = np.clip(np.rint((inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) * w), -limit, limit)
+            fx = fx.astype(np.int32)
+            fy = fy.astype(np.int32)
+            rows = slice(y0, y0 + fx.shape[0])
+            if nearest:
+                self.map1[rows, :, 0] = fx
+                self.map1[rows, :, 1] = fy
+            else:
+                self.map1[rows, :, 0] = fx >> 5
+                self.map1[rows, :, 1] = fy >> 5
+                self.map2[rows] = (fy & (INTER_TAB_SIZE - 1)) * INTER_TAB_SIZE + (fx & (INTER_TAB_SIZE - 1))
+
+    @property
+    def nbytes(self):
+        return self.map1.nbytes + (self.map2.nbytes if self.map2 is not None else 0)
+
+    def apply(self, image, strip_height=256, on_progress=None, is_cancelled=None):
+        """Remap image through the plan; progress and cancel as in engine.apply_geometry_in_strips."""
+        width, height = self.geometry.size
+        output = np.empty((height, width) + image.shape[2:], dtype=image.dtype)
+        for y0 in range(0, height, strip_height):
+            if is_cancelled is not None and is_cancelled():
+                raise WarpCancelled()
+            y1 = min(y0 + strip_height, height)
+            map2 = self.map2[y0:y1] if self.map2 is not None else None
+            cv2.remap(image, self.map1[y0:y1], map2, self.interpolation, dst=output[y0:y1],
+                      borderMode=self.geometry.border_mode, borderValue=self.geometry.border_value)
+            if on_progress is not None:
+                on_progress(y1 / height)
+        return output
+
+
+class WarpPlanCache:
+    """LRU of WarpPlans bounded by max_bytes of map memory.
+
+    A plan is only built the second time a geometry is warped (min_uses), so one-off warps,
+    like every new set of points picked in the apps, cost no more than a direct warp. Plans
+    larger than the whole budget are never built. Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_PLAN_CACHE_BYTES, min_uses=2, max_tracked=256):
+        self.max_bytes = max_bytes
+        self.min_uses = min_uses
+        self.max_tracked = max_tracked
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()  # geometry_key -> WarpPlan
+        self._uses = OrderedDict()  # geometry_key -> times seen without a plan
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._plans)
+
+    def plan_for(self, geometry, interpolation=cv2.INTER_LANCZOS4):
+        """The cached plan for geometry, building it if it is due; None means warp directly."""
+        key = geometry_key(geometry, interpolation)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+            if plan_bytes(geometry.size, interpolation) > self.max_bytes:
+                return None
+            uses = self._uses.pop(key, 0) + 1
+            if uses < self.min_uses:
+                self._uses[key] = uses
+                while len(self._uses) > self.max_tracked:
+                    self._uses.popitem(last=False)
+                return None
+
+        return self._build(key, geometry, interpolation)
+
+    def prepare(self, geometry, interpolation=cv2.INTER_LANCZOS4):
+        """Build geometry's plan now, for a geometry known to repeat (e.g. a saved calibration).
+
+        Returns the plan, or None if it does not fit in the budget.
+        """
+        key = geometry_key(geometry, interpolation)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+            if plan_bytes(geometry.size, interpolation) > self.max_bytes:
+                return None
+            self._uses.pop(key, None)
+        return self._build(key, geometry, interpolation)
+
+    def _build(self, key, geometry, interpolation):
+        plan = WarpPlan(geometry, interpolation)
+        with self._lock:
+            if key in self._plans:
+                return self._plans[key]
+            self._plans[key] = plan
+            self._bytes += plan.nbytes
+            while self._bytes > self.max_bytes:
+                _, old = self._plans.popitem(last=False)
+                self._bytes -= old.nbytes
+        return plan
+
+    def get(self, points, source_size, mode, interpolation=cv2.INTER_LANCZOS4):
+        """plan_for the geometry of one of engine.MODES."""
+        return self.plan_for(engine.geometry_for_mode(points, mode, source_size), interpolation)
+
+    def warp(self, image, geometry, interpolation=cv2.INTER_LANCZOS4, on_progress=None, is_cancelled=None):
+        """engine.apply_geometry_in_strips, through a cached plan once the geometry repeats."""
+        plan = self.plan_for(geometry, interpolation)
+        if plan is None:
+            return engine.apply_geometry_in_strips(image, geometry, interpolation, on_progress=on_progress,
+                                                   is_cancelled=is_cancelled)
+        return plan.apply(image, on_progress=on_progress, is_cancelled=is_cancelled)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self._uses.clear()
+            self._bytes = 0
@@ -0,0 +1,52 @@
+"""Low-resolution warps for immediate feedback, before the full-resolution result is computed.
+
+A full-resolution LANCZOS4 warp of a large photo takes seconds; the user mostly wants to see
+whether the four points were right. warp_preview warps a reduced copy of the source (the
+PreviewImage decode the apps already display) through the same homography, rescaled on both
+sides, with bilinear interpolation and an output no larger than max_side, which takes a few
+milliseconds. That is fast enough to redo on every mouse move while a corner is dragged:
+quad_preview straightens the quad being edited into a small inset (LIVE_MAX_SIDE).
+"""
+import cv2
+import numpy as np
+
+from . import engine
+
+DEFAULT_MAX_SIDE = 1600
+LIVE_MAX_SIDE = 320
+
+
+def _scaling(sx, sy):
+    return np.array([[sx, 0, 0], [0, sy, 0], [0, 0, 1]], dtype=np.float64)
+
+
+def preview_geometry(geometry, full_size, preview_source_size, max_side=DEFAULT_MAX_SIDE):
+    """geometry (on full-resolution pixels) for a source of preview_source_size and an output of
+    at most max_side on its long side. Returns (geometry, output_scale), output_scale being
+    preview output pixels per full-resolution output pixel.
+    """
+    width, height = geometry.size
+    output_scale = min(1.0, max_side / max(width, height))
+    size = (max(1, int(round(width * output_scale))), max(1, int(round(height * output_scale))))
+    # preview source px -> full source px -> full output px -> preview output px
+    to_full = _scaling(full_size[0] / preview_source_size[0], full_size[1] / preview_source_size[1])
+    matrix = _scaling(size[0] / width, size[1] / height) @ np.asarray(geometry.matrix, dtype=np.float64) @ to_full
+    return geometry._replace(matrix=matrix, size=size), output_scale
+
+
+def warp_preview(preview_source, geometry, full_size, max_side=DEFAULT_MAX_SIDE, interpolation=cv2.INTER_LINEAR):
+    """Warp preview_source (a reduced copy of a full_size image) for display. Returns (image, output_scale)."""
+    source_size = (preview_source.shape[1], preview_source.shape[0])
+    small, output_scale = preview_geometry(geometry, full_size, source_size, max_side)
+    image = cv2.warpPerspective(preview_source, small.matrix, small.size, flags=interpolation,
+                                borderMode=small.border_mode, borderValue=small.border_value)
+    return image, output_scale
+
+
+def quad_preview(preview_source, points, full_size, max_side=LIVE_MAX_SIDE):
+    """The quad straightened as engine.cropped_geometry does, at most max_side px; None for an invalid quad."""
+    try:
+        geometry = engine.cropped_geometry(points)
+    except engine.DegenerateQuadError:
+        return None
+    return warp_preview(preview_source, geometry, full_size, max_side)[0]
@@ -0,0 +1,150 @@
+"""Corner ordering, validity checks and homographies for many quads at once.
+
+engine works on one quad per call, which is what the apps need. Scoring thousands of
+candidate quads (corner search, manifests of many images) in Python loops of
+order_points + cv2.getPerspectiveTransform costs microseconds of interpreter overhead per
+quad; here every step is a numpy operation over an (N, 4, 2) array:
+
+    order_quads          TL, TR, BR, BL by angle around each centroid
+    quad_sizes           output (width, height), as engine.quad_size
+    valid_quads          finite, strictly convex, no three corners (nearly) collinear
+    solve_homographies   the DLT: eight equations per quad, solved as one batched system
+    cropped_homographies what engine.cropped_geometry computes, for every quad
+
+Each function returns a validity mask where a quad can fail, rather than raising, so one bad
+candidate does not stop the batch; matrices of invalid quads are NaN.
+"""
+import numpy as np
+
+# Corners closer than this to the line through their neighbours (relative to the quad's
+# size) count as collinear.
+COLLINEAR_TOLERANCE = 1e-3
+# Direction of the top-left corner from the centroid (up and to the left; y grows downwards)
+_TOP_LEFT_ANGLE = -3 * np.pi / 4
+
+
+def as_quads(quads):
+    """(N, 4, 2) float64 from an (N, 4, 2) array-like or a single (4, 2) quad."""
+    quads = np.asarray(quads, dtype=np.float64)
+    if quads.ndim == 2:
+        quads = quads[None]
+    if quads.ndim != 3 or quads.shape[1:] != (4, 2):
+        raise ValueError(f"Expected quads of shape (N, 4, 2), got {quads.shape}")
+    return quads
+
+
+def order_quads(quads):
+    """Corners of every quad as TL, TR, BR, BL (clockwise on screen, starting nearest the top-left).
+
+    Corners are sorted by their angle around the centroid, which keeps four distinct corners
+    for any rotation; the sequence then starts at the corner whose direction from the
+    centroid is closest to straight up-left.
+    """
+    quads = as_quads(quads)
+    centred = quads - quads.mean(axis=1, keepdims=True)
+    # y grows downwards, so increasing atan2 runs clockwise on screen
+    angles = np.arctan2(centred[..., 1], centred[..., 0])
+    order = np.argsort(angles, axis=1, kind="stable")
+    ordered = np.take_along_axis(quads, order[..., None], axis=1)
+    sorted_angles = np.take_along_axis(angles, order, axis=1)
+    start = np.argmin(np.abs(np.angle(np.exp(1j * (sorted_angles - _TOP_LEFT_ANGLE)))), axis=1)
+    rolled = (start[:, None] + np.arange(4)) % 4
+    return np.take_along_axis(ordered, rolled[..., None], axis=1)
+
+
+def _corner_cross(quads):
+    """Cross product of the two edges at every corner, (N, 4); all positive for a clockwise convex quad."""
+    incoming = quads - np.roll(quads, 1, axis=1)
+    outgoing = np.roll(quads, -1, axis=1) - quads
+    return incoming[..., 0] * outgoing[..., 1] - incoming[..., 1] * outgoing[..., 0]
+
+
+def valid_quads(quads, tolerance=COLLINEAR_TOLERANCE):
+    """Mask of quads, in TL, TR, BR, BL order, that are finite and strictly convex.
+
+    A corner within tolerance * (longest edge) of the line through its neighbours makes
+    the quad degenerate: its homography would squash a whole side.
+    """
+    quads = as_quads(quads)
+    finite = np.isfinite(quads).all(axis=(1, 2))
+    quads = np.where(finite[:, None, None], quads, 0.0)
+    edges = np.linalg.norm(np.roll(quads, -1, axis=1) - quads, axis=2)
+    longest = edges.max(axis=1)
+    cross = _corner_cross(quads)
+    # |cross| / longest^2 is the corner's distance from its neighbours' line relative to the size
+    threshold = tolerance * np.maximum(longest, 1e-12) ** 2
+    convex = (cross > threshold[:, None]).all(axis=1)
+    return finite & (longest > 0) & convex
+
+
+def _no_three_collinear(quads, tolerance=COLLINEAR_TOLERANCE):
+    # Any order: a homography between two quads exists iff no three corners of either are collinear.
+    finite = np.isfinite(quads).all(axis=(1, 2))
+    quads = np.where(finite[:, None, None], quads, 0.0)
+    spans = np.linalg.norm(quads[:, :, None] - quads[:, None], axis=3).max(axis=(1, 2))
+    result = finite & (spans > 0)
+    for i, j, k in ((0, 1, 2), (1, 2, 3), (2, 3, 0), (3, 0, 1)):
+        ab = quads[:, j] - quads[:, i]
+        ac = quads[:, k] - quads[:, i]
+        result &= np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) > tolerance * np.maximum(spans, 1e-12) ** 2
+    return result
+
+
+def quad_sizes(quads):
+    """(N, 2) int output (width, height) of TL, TR, BR, BL quads, as engine.quad_size."""
+    quads = as_quads(quads)
+    quads = np.nan_to_num(quads, nan=0.0, posinf=0.0, neginf=0.0)
+    widths = np.linalg.norm(quads[:, [0, 3]] - quads[:, [1, 2]], axis=2).astype(np.int64).max(axis=1)
+    heights = np.linalg.norm(quads[:, [0, 1]] - quads[:, [3, 2]], axis=2).astype(np.int64).max(axis=1)
+    return np.stack([widths, heights], axis=1)
+
+
+def solve_homographies(src, dst):
+    """Homographies mapping each src quad onto its dst quad: ((N, 3, 3) float64, valid mask).
+
+    The same eight-equation system cv2.getPerspectiveTransform solves, with h33 = 1,
+    built for all quads and solved in one batched np.linalg.solve. Pairs where three corners
+    of either quad are (nearly) collinear have no such homography and are not solved.
+    """
+    src = as_quads(src)
+    dst = np.broadcast_to(as_quads(dst), src.shape)
+    count = len(src)
+    x, y = src[..., 0], src[..., 1]
+    u, v = dst[..., 0], dst[..., 1]
+    zeros = np.zeros_like(x)
+    ones = np.ones_like(x)
+
+    a = np.empty((count, 8, 8))
+    a[:, :4] = np.stack([x, y, ones, zeros, zeros, zeros, -x * u, -y * u], axis=2)
+    a[:, 4:] = np.stack([zeros, zeros, zeros, x, y, ones, -x * v, -y * v], axis=2)
+    b = np.concatenate([u, v], axis=1)
+
+    # Solve only well-posed systems; np.linalg.solve would fail the whole batch on one singular matrix.
+    valid = _no_three_collinear(src) & _no_three_collinear(dst)
+    solution = np.full((count, 8), np.nan)
+    if valid.any():
+        solution[valid] = np.linalg.solve(a[valid], b[valid][..., None])[..., 0]
+    matrices = np.concatenate([solution, np.where(valid, 1.0, np.nan)[:, None]], axis=1).reshape(count, 3, 3)
+    return matrices, valid
+
+
+def cropped_homographies(quads, order=True):
+    """engine.cropped_geometry for many quads: ((N, 3, 3) matrices, (N, 2) sizes, valid mask).
+
+    With order=True the corners may be in any order. Invalid quads (non-convex, collinear,
+    zero-sized) have NaN matrices and are never solved.
+    """
+    quads = order_quads(quads) if order else as_quads(quads)
+    sizes = quad_sizes(quads)
+    valid = valid_quads(quads) & (sizes > 0).all(axis=1)
+    w = sizes[:, 0].astype(np.float64) - 1
+    h = sizes[:, 1].astype(np.float64) - 1
+    zeros = np.zeros_like(w)
+    dst = np.stack([np.stack([zeros, zeros], 1), np.stack([w, zeros], 1), np.stack([w, h], 1),
+                    np.stack([zeros, h], 1)], axis=1)
+    matrices = np.full((len(quads), 3, 3), np.nan)
+    if valid.any():
+        solved, solved_ok = solve_homographies(quads[valid], dst[valid])
+        matrices[valid] = solved
+        valid[np.flatnonzero(valid)] = solved_ok
+    return matrices, sizes, valid
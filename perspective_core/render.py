@@ -0,0 +1,155 @@
+"""Rendering images onto the Tk canvases without touching the full-resolution frame per event.
+
+A DisplayPyramid holds RGB copies of an image at 1, 1/2, 1/4, ... resolution, built once.
+Each redraw picks the smallest level that still has at least the on-screen resolution and
+resamples only the part of it that is visible on the canvas, so the cost of a redraw depends
+on the canvas size, not on the image size or the zoom factor.
+"""
+import math
+from collections import OrderedDict
+
+import cv2
+from PIL import Image
+
+MIN_LEVEL_SIDE = 256
+
+# Two-stage redraws: while the user zooms, pans or resizes, render with the cheap filter and
+# replace it with the high-quality one after input has been idle for HIGH_QUALITY_DELAY_MS.
+# The pyramid keeps any downscale from a level under 2x, so NEAREST aliasing stays mild.
+PREVIEW_RESAMPLE = Image.NEAREST
+HIGH_QUALITY_RESAMPLE = Image.LANCZOS
+HIGH_QUALITY_DELAY_MS = 150
+
+
+class DisplayPyramid:
+    def __init__(self, image_bgr):
+        rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        self.size = (rgb.shape[1], rgb.shape[0])
+        self.levels = [Image.fromarray(rgb)]
+        level = rgb
+        while min(level.shape[:2]) >= 2 * MIN_LEVEL_SIDE:
+            level = cv2.resize(level, (level.shape[1] // 2, level.shape[0] // 2), interpolation=cv2.INTER_AREA)
+            self.levels.append(Image.fromarray(level))
+
+    def level_for_scale(self, scale):
+        """Index of the smallest level whose resolution is still at least scale x the full image."""
+        index = 0
+        for i, level in enumerate(self.levels):
+            if level.width / self.size[0] < scale:
+                break
+            index = i
+        return index
+
+    def render(self, displayed_size, box, resample=Image.LANCZOS):
+        """The part box = (x0, y0, x1, y1) of the image as it looks when scaled to displayed_size.
+
+        box is in displayed-image pixels; the result is a PIL image of the box's size.
+        """
+        displayed_width, displayed_height = displayed_size
+        x0, y0, x1, y1 = box
+        level = self.levels[self.level_for_scale(displayed_width / self.size[0])]
+        rx = level.width / displayed_width
+        ry = level.height / displayed_height
+        return level.resize((x1 - x0, y1 - y0), resample, box=(x0 * rx, y0 * ry, x1 * rx, y1 * ry))
+
+
+class RenderCache:
+    """Display pyramids for the last few images plus an LRU of recently rendered outputs.
+
+    Entries are keyed by the identity of the BGR array, so assigning a new array to
+    original_image_cv / processed_image_cv / img_transformed_bgr is what invalidates them;
+    the arrays must not be modified in place while cached. Redraws that ask for the same
+    image, size, box and filter again (returning to a recent zoom level, re-drawing after a
+    click) reuse the earlier result without any conversion or resampling.
+    """
+
+    def __init__(self, max_images=2, max_render_bytes=64 * 2 ** 20):
+        self.max_images = max_images
+        self.max_render_bytes = max_render_bytes
+        self._pyramids = OrderedDict()  # id(image) -> (image, DisplayPyramid)
+        self._renders = OrderedDict()  # (id(image), displayed_size, box, resample) -> PIL image
+        self._render_bytes = 0
+
+    def pyramid(self, image_bgr):
+        key = id(image_bgr)
+        entry = self._pyramids.get(key)
+        if entry is not None and entry[0] is image_bgr:
+            self._pyramids.move_to_end(key)
+            return entry[1]
+
+        pyramid = DisplayPyramid(image_bgr)
+        # Holding the array keeps its id from being reused by another image while cached.
+        self._pyramids[key] = (image_bgr, pyramid)
+        while len(self._pyramids) > self.max_images:
+            old_key, _ = self._pyramids.popitem(last=False)
+            self._drop_renders(old_key)
+        return pyramid
+
+    def add_pyramid(self, image_bgr, pyramid):
+        """Register a pyramid built elsewhere (e.g. on a loader thread) so pyramid() does not rebuild it."""
+        self._pyramids[id(image_bgr)] = (image_bgr, pyramid)
+        while len(self._pyramids) > self.max_images:
+            old_key, _ = self._pyramids.popitem(last=False)
+            self._drop_renders(old_key)
+
+    def render(self, image_bgr, displayed_size, box, resample=Image.LANCZOS):
+        pyramid = self.pyramid(image_bgr)
+        key = (id(image_bgr), tuple(displayed_size), tuple(box), resample)
+        rendered = self._renders.get(key)
+        if rendered is not None:
+            self._renders.move_to_end(key)
+            return rendered
+
+        rendered = pyramid.render(displayed_size, box, resample)
+        size_bytes = rendered.width * rendered.height * len(rendered.getbands())
+        if size_bytes <= self.max_render_bytes:
+            self._renders[key] = rendered
+            self._render_bytes += size_bytes
+            while self._render_bytes > self.max_render_bytes:
+                _, old = self._renders.popitem(last=False)
+                self._render_bytes -= old.width * old.height * len(old.getbands())
+        return rendered
+
+    def invalidate(self, image_bgr=None):
+        """Forget one image (or everything) right away instead of waiting for LRU eviction."""
+        if image_bgr is None:
+            self._pyramids.clear()
+            self._renders.clear()
+            self._render_bytes = 0
+            return
+        self._pyramids.pop(id(image_bgr), None)
+        self._drop_renders(id(image_bgr))
+
+    def _drop_renders(self, image_key):
+        for key in [k for k in self._renders if k[0] == image_key]:
+            old = self._renders.pop(key)
+            self._render_bytes -= old.width * old.height * len(old.getbands())
+
+
+def visible_box(displayed_size, top_left, canvas_size, margin=0.0):
+    """Part of a displayed image that lies on the canvas, in displayed-image pixels.
+
+    top_left is where the image's top-left corner sits on the canvas. margin extends the
+    canvas on every side by that fraction of its size, so small pans stay inside the rendered
+    area. Returns (x0, y0, x1, y1), or None when nothing is visible.
+    """
+    displayed_width, displayed_height = displayed_size
+    left, top = top_left
+    canvas_width, canvas_height = canvas_size
+    pad_x = canvas_width * margin
+    pad_y = canvas_height * margin
+    x0 = max(0, math.floor(-pad_x - left))
+    y0 = max(0, math.floor(-pad_y - top))
+    x1 = min(displayed_width, math.ceil(canvas_width + pad_x - left))
+    y1 = min(displayed_height, math.ceil(canvas_height + pad_y - top))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+def box_contains(outer, inner):
+    if inner is None:
+        return True
+    if outer is None:
+        return False
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
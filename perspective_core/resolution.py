@@ -0,0 +1,93 @@
+"""How finely the measuring pipeline samples the rectified plane, and what that will cost.
+
+engine.calibrated_geometry turns a reference rectangle into a fixed px/cm scale (75 px/cm,
+with the reference capped at 1500 px). A ResolutionPolicy chooses that scale per job instead:
+
+    pixels_per_cm   a fixed target scale
+    match_source    the scale the reference already has in the photo, so the rectified plane
+                    is sampled as densely as the camera sampled it: no upsampling of small
+                    references, no loss of detail on large ones
+    max_dim_px      cap on the reference's long side in the output (None: no cap)
+    max_megapixels  cap on the whole output; the scale shrinks with it (engine.limit_output_size)
+
+resolve() returns the geometry together with an OutputEstimate (size, bytes, warp time), all
+computed from the points alone, so a caller can show the cost before warping anything.
+"""
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from . import engine
+
+ResolutionPolicy = namedtuple("ResolutionPolicy", ["pixels_per_cm", "match_source", "max_dim_px", "max_megapixels"],
+                              defaults=[engine.DEFAULT_PIXELS_PER_CM, False, engine.DEFAULT_MAX_DIM_PX, None])
+
+# What the measuring app did before policies existed, plus its output cap
+DEFAULT_POLICY = ResolutionPolicy(max_megapixels=150)
+SOURCE_DENSITY_POLICY = ResolutionPolicy(match_source=True, max_dim_px=None, max_megapixels=150)
+
+# Conservative warpPerspective throughput in output megapixels per second for 3-channel images;
+# measure_warp_rate gives the figure for the machine at hand.
+DEFAULT_WARP_RATES = {
+    cv2.INTER_NEAREST: 150.0,
+    cv2.INTER_LINEAR: 60.0,
+    cv2.INTER_CUBIC: 20.0,
+    cv2.INTER_LANCZOS4: 5.0,
+}
+
+# size: output (w, h); output_bytes: the rectified image; peak_bytes: with the source held as well
+OutputEstimate = namedtuple("OutputEstimate", ["size", "megapixels", "pixels_per_cm", "output_bytes", "peak_bytes",
+                                               "warp_seconds"])
+
+
+def source_pixels_per_cm(points, width_cm, height_cm):
+    """px/cm at which the reference appears in the photo: its longest edge per cm, horizontally or vertically."""
+    quad = engine.normalize_quad(points)
+    widths = np.linalg.norm(quad[[1, 2]] - quad[[0, 3]], axis=1)
+    heights = np.linalg.norm(quad[[3, 2]] - quad[[0, 1]], axis=1)
+    return float(max(widths.max() / width_cm, heights.max() / height_cm))
+
+
+def resolve(policy, points, width_cm, height_cm, source_size, channels=3, interpolation=cv2.INTER_LANCZOS4,
+            warp_rate=None):
+    """(geometry, pixels_per_cm, OutputEstimate) of the calibrated warp under policy."""
+    pixels_per_cm = policy.pixels_per_cm
+    if policy.match_source:
+        pixels_per_cm = source_pixels_per_cm(points, width_cm, height_cm)
+    max_dim_px = policy.max_dim_px if policy.max_dim_px else float("inf")
+    geometry, pixels_per_cm = engine.calibrated_geometry(points, width_cm, height_cm, source_size,
+                                                         pixels_per_cm=pixels_per_cm, max_dim_px=max_dim_px)
+    geometry, scale = engine.limit_output_size(geometry, policy.max_megapixels)
+    pixels_per_cm *= scale
+    return geometry, pixels_per_cm, estimate(geometry, pixels_per_cm, source_size, channels, interpolation,
+                                             warp_rate)
+
+
+def estimate(geometry, pixels_per_cm=None, source_size=None, channels=3, interpolation=cv2.INTER_LANCZOS4,
+             warp_rate=None):
+    """Predicted size, memory and warp time of geometry's output, without warping."""
+    width, height = geometry.size
+    megapixels = width * height / 1e6
+    output_bytes = width * height * channels
+    source_bytes = source_size[0] * source_size[1] * channels if source_size is not None else 0
+    rate = warp_rate or DEFAULT_WARP_RATES.get(interpolation, DEFAULT_WARP_RATES[cv2.INTER_LANCZOS4])
+    return OutputEstimate((width, height), megapixels, pixels_per_cm, output_bytes, output_bytes + source_bytes,
+                          megapixels / rate)
+
+
+def measure_warp_rate(interpolation=cv2.INTER_LANCZOS4, side=1024, channels=3):
+    """Output megapixels per second of a side x side warpPerspective on this machine (a few ms)."""
+    image = np.random.default_rng(0).integers(0, 256, (side, side, channels), dtype=np.uint8)
+    matrix = np.array([[1.0, 0.05, 3.0], [0.02, 1.0, 2.0], [1e-5, 2e-5, 1.0]])
+    cv2.warpPerspective(image, matrix, (side, side), flags=interpolation)  # warm-up
+    start = time.perf_counter()
+    cv2.warpPerspective(image, matrix, (side, side), flags=interpolation)
+    return side * side / 1e6 / max(time.perf_counter() - start, 1e-6)
+
+
+def format_estimate(estimate_):
+    width, height = estimate_.size
+    return (f"{width}x{height} px ({estimate_.megapixels:.1f} MP, {estimate_.output_bytes / 2 ** 20:.0f} MB, "
+            f"~{estimate_.warp_seconds:.1f} s)")
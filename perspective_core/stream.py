@@ -0,0 +1,374 @@
+"""Rectify every frame of a video or an image sequence with one set of corner points.
+
+Usage:
+    python -m perspective_core.stream SOURCE OUTPUT (--points-file points.json | --points X1 Y1 ... X4 Y4)
+                                      [--mode cropped] [--workers 2] [--queue-size 8] [--drop]
+                                      [--max-output-mp MP] [--report report.json]
+
+SOURCE is a video file, a directory of frames (sorted by name) or a camera index. OUTPUT is
+a video file (.mp4, .avi, .mkv, .mov) or a directory, which receives frame_000000.png, ...
+The points are picked once, e.g. with "ייצוא נקודות..." in the correction app, and are
+scaled if the frames are not the size they were picked on.
+
+Frames flow through a pipeline of bounded queues: one decode thread, --workers warp threads
+(OpenCV releases the GIL while warping) and the encoder on the calling thread, which writes
+frames in their original order. Since the geometry never changes, every frame is a single
+remap through one precomputed plans.WarpPlan. With --drop (the default for cameras), frames
+that arrive while the warp queue is full are dropped instead of stalling the decoder; the
+report counts them next to the sustained frames per second.
+"""
+import argparse
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+from . import engine
+from .batch import INTERPOLATIONS
+from .image_io import SUPPORTED_EXTENSIONS, read_image, write_image
+from .plans import DEFAULT_PLAN_CACHE_BYTES, WarpPlan, plan_bytes
+
+VIDEO_EXTENSIONS = [".mp4", ".avi", ".mkv", ".mov"]
+VIDEO_FOURCC = {".mp4": "mp4v", ".avi": "MJPG", ".mkv": "XVID", ".mov": "mp4v"}
+DEFAULT_FPS = 25.0
+_POLL_S = 0.1
+
+
+def write_points_file(path, points, source_size=None, mode=None):
+    """Save four corner points (full-resolution source pixels) as JSON for --points-file."""
+    data = {"points": [[float(x), float(y)] for x, y in points]}
+    if source_size is not None:
+        data["source_size"] = [int(source_size[0]), int(source_size[1])]
+    if mode is not None:
+        data["mode"] = mode
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def read_points_file(path):
+    """Returns (points, source_size or None, mode or None)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    points = data.get("points")
+    if points is None or len(points) != 4:
+        raise ValueError(f"{path}: expected 4 points")
+    source_size = data.get("source_size")
+    return [tuple(map(float, p)) for p in points], tuple(source_size) if source_size else None, data.get("mode")
+
+
+def scale_points(points, from_size, to_size):
+    """Map points picked on an image of from_size onto frames of to_size."""
+    if from_size is None or tuple(from_size) == tuple(to_size):
+        return points
+    sx = to_size[0] / from_size[0]
+    sy = to_size[1] / from_size[1]
+    return [(x * sx, y * sy) for x, y in points]
+
+
+def open_frames(source):
+    """Returns (frame iterator, fps or None, is_live) for a video file, frame directory or camera index."""
+    if isinstance(source, int) or str(source).isdigit():
+        capture = cv2.VideoCapture(int(source))
+        live = True
+    elif os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if os.path.splitext(n)[1].lower() in SUPPORTED_EXTENSIONS)
+        return (read_image(os.path.join(source, n)) for n in names), None, False
+    else:
+        capture = cv2.VideoCapture(source)
+        live = False
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video source {source!r}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or None
+
+    def frames():
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            capture.release()
+
+    return frames(), fps, live
+
+
+class StreamStats:
+    def __init__(self):
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_failed = 0
+        self.frames_written = 0
+        self.decode_s = 0.0
+        self.warp_s = 0.0
+        self.encode_s = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+
+        def mean_ms(total_s, count):
+            return total_s / count * 1000 if count else 0.0
+
+        return {
+            "frames_read": self.frames_read,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "frames_failed": self.frames_failed,
+            "elapsed_s": elapsed,
+            "fps": self.frames_written / elapsed if elapsed > 0 else 0.0,
+            "decode_ms": mean_ms(self.decode_s, self.frames_read),
+            "warp_ms": mean_ms(self.warp_s, self.frames_written + self.frames_failed),
+            "encode_ms": mean_ms(self.encode_s, self.frames_written),
+        }
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once stop is set; returns False if it gave up."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_S)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def rectify_frames(frames, warp, workers=2, queue_size=8, drop_when_full=False, stats=None, is_cancelled=None):
+    """Generator yielding (frame_index, warp(frame)) in input order, computed on worker threads.
+
+    frames is decoded on its own thread into a queue of queue_size; with drop_when_full a
+    frame that finds the queue full is dropped (counted in stats) instead of waiting. Frames
+    whose warp raises are counted as failed and skipped. Closing the generator stops the threads.
+    """
+    stats = stats if stats is not None else StreamStats()
+    in_queue = queue.Queue(queue_size)
+    out_queue = queue.Queue(queue_size)
+    stop = threading.Event()
+    decode_error = []
+
+    def decode():
+        # Every frame that is queued gets the next sequence number, so the encoder knows
+        # which frame comes next even when some were dropped.
+        sequence = 0
+        try:
+            frame_iter = iter(frames)
+            for index in itertools.count():
+                start = time.perf_counter()
+                frame = next(frame_iter, None)
+                if frame is None:
+                    break
+                stats.add(frames_read=1, decode_s=time.perf_counter() - start)
+                if stop.is_set() or (is_cancelled is not None and is_cancelled()):
+                    break
+                if drop_when_full:
+                    try:
+                        in_queue.put_nowait((sequence, index, frame))
+                    except queue.Full:
+                        stats.add(frames_dropped=1)
+                        continue
+                elif not _put(in_queue, (sequence, index, frame), stop):
+                    break
+                sequence += 1
+        except Exception as e:
+            decode_error.append(e)
+        finally:
+            for _ in range(workers):
+                _put(in_queue, None, stop)
+
+    def work():
+        while True:
+            try:
+                item = in_queue.get(timeout=_POLL_S)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is None:
+                _put(out_queue, None, stop)
+                return
+            sequence, index, frame = item
+            start = time.perf_counter()
+            try:
+                result = warp(frame)
+            except Exception:
+                result = None
+            stats.add(warp_s=time.perf_counter() - start)
+            if not _put(out_queue, (sequence, index, result), stop):
+                return
+
+    threads = [threading.Thread(target=decode, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    pending = {}
+    next_sequence = 0
+    finished_workers = 0
+    try:
+        while finished_workers < workers:
+            item = out_queue.get()
+            if item is None:
+                finished_workers += 1
+                continue
+            sequence, index, result = item
+            pending[sequence] = (index, result)
+            while next_sequence in pending:
+                index, result = pending.pop(next_sequence)
+                next_sequence += 1
+                if result is None:
+                    stats.add(frames_failed=1)
+                else:
+                    yield index, result
+        if decode_error:
+            raise decode_error[0]
+    finally:
+        stop.set()
+
+
+def frame_warp(points, mode, frame_size, interpolation=cv2.INTER_LANCZOS4, max_output_mp=None,
+               max_plan_bytes=DEFAULT_PLAN_CACHE_BYTES):
+    """(warp(frame) function, geometry) for the app's cropped / full / full-fit geometry.
+
+    The geometry is the same for every frame, so its remap plan is built once up front
+    (unless it would take more than max_plan_bytes, then frames are warped directly).
+    """
+    geometry = engine.geometry_for_mode(points, mode, frame_size)
+    geometry, _ = engine.limit_output_size(geometry, max_output_mp)
+    plan = WarpPlan(geometry, interpolation) if plan_bytes(geometry.size, interpolation) <= max_plan_bytes else None
+
+    def warp(frame):
+        if engine.image_size(frame) != tuple(frame_size):
+            raise ValueError("Frame size changed mid-stream")
+        if plan is not None:
+            return plan.apply(frame)
+        return engine.apply_geometry(frame, geometry, interpolation)
+
+    return warp, geometry
+
+
+class FrameSink:
+    """Writes rectified frames to a video file or as numbered images into a directory."""
+
+    def __init__(self, output, frame_size, fps=None, frame_ext=".png"):
+        self.output = output
+        self.frame_ext = frame_ext
+        self.writer = None
+        ext = os.path.splitext(output)[1].lower()
+        if ext in VIDEO_EXTENSIONS:
+            fourcc = cv2.VideoWriter_fourcc(*VIDEO_FOURCC[ext])
+            self.writer = cv2.VideoWriter(output, fourcc, fps or DEFAULT_FPS, tuple(frame_size))
+            if not self.writer.isOpened():
+                raise ValueError(f"Cannot open video writer for {output!r}")
+        else:
+            os.makedirs(output, exist_ok=True)
+
+    def write(self, index, frame):
+        if self.writer is not None:
+            self.writer.write(frame)
+        else:
+            write_image(os.path.join(self.output, f"frame_{index:06d}{self.frame_ext}"), frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+def run_stream(source, output, points, mode=engine.MODE_CROPPED, points_size=None,
+               interpolation=cv2.INTER_LANCZOS4, workers=2, queue_size=8, drop_when_full=None,
+               max_output_mp=None, frame_ext=".png", on_frame=None, is_cancelled=None):
+    """Rectify source into output. Returns the StreamStats report dict.
+
+    drop_when_full defaults to True for cameras and False for files, which are never dropped.
+    on_frame(index, report) is called after each written frame.
+    """
+    frames, fps, live = open_frames(source)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError(f"No frames in {source!r}")
+    frame_size = engine.image_size(first)
+    points = scale_points(points, points_size, frame_size)
+    warp, geometry = frame_warp(points, mode, frame_size, interpolation, max_output_mp)
+
+    stats = StreamStats()
+    sink = FrameSink(output, geometry.size, fps, frame_ext)
+    try:
+        drop = live if drop_when_full is None else drop_when_full
+        for index, rectified in rectify_frames(itertools.chain([first], frames), warp, workers, queue_size,
+                                               drop, stats, is_cancelled):
+            start = time.perf_counter()
+            sink.write(index, rectified)
+            stats.add(frames_written=1, encode_s=time.perf_counter() - start)
+            if on_frame is not None:
+                on_frame(index, stats)
+    finally:
+        sink.close()
+
+    report = stats.report()
+    report.update(source=str(source), output=output, mode=mode, frame_size=list(frame_size),
+                  output_size=list(geometry.size), source_fps=fps)
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m perspective_core.stream",
+                                     description="Rectify every frame of a video or image sequence.")
+    parser.add_argument("source", help="video file, directory of frames or camera index")
+    parser.add_argument("output", help="output video file (.mp4/.avi/.mkv/.mov) or directory")
+    points = parser.add_mutually_exclusive_group(required=True)
+    points.add_argument("--points-file", help="JSON with the four corner points (see write_points_file)")
+    points.add_argument("--points", type=float, nargs=8, metavar="XY",
+                        help="x1 y1 ... x4 y4: top-left, top-right, bottom-right, bottom-left")
+    parser.add_argument("--mode", choices=engine.MODES,
+                        help="geometry (default: the points file's mode, else cropped)")
+    parser.add_argument("--interpolation", choices=sorted(INTERPOLATIONS), default="lanczos4")
+    parser.add_argument("--workers", type=int, default=2, help="warp threads (default: %(default)s)")
+    parser.add_argument("--queue-size", type=int, default=8, help="frames buffered per stage (default: %(default)s)")
+    drop = parser.add_mutually_exclusive_group()
+    drop.add_argument("--drop", dest="drop", action="store_true", default=None,
+                      help="drop frames while the warp queue is full (default for cameras)")
+    drop.add_argument("--no-drop", dest="drop", action="store_false", help="never drop frames")
+    parser.add_argument("--max-output-mp", type=float, help="scale larger outputs down to this many megapixels")
+    parser.add_argument("--frame-ext", default=".png", help="image format for directory output (default: .png)")
+    parser.add_argument("--report", help="write the report to this JSON file")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.points_file:
+        points, points_size, file_mode = read_points_file(args.points_file)
+    else:
+        points = list(zip(args.points[0::2], args.points[1::2]))
+        points_size, file_mode = None, None
+    mode = args.mode or file_mode or engine.MODE_CROPPED
+
+    def on_frame(index, stats):
+        if stats.frames_written % 25 == 0:
+            print(f"{stats.frames_written} frames, {stats.frames_dropped} dropped", flush=True)
+
+    report = run_stream(args.source, args.output, points, mode, points_size, INTERPOLATIONS[args.interpolation],
+                        args.workers, args.queue_size, args.drop, args.max_output_mp, args.frame_ext,
+                        None if args.quiet else on_frame)
+    print(f"{report['frames_written']} frames in {report['elapsed_s']:.2f} s ({report['fps']:.2f} fps), "
+          f"{report['frames_dropped']} dropped, {report['frames_failed']} failed")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if report["frames_failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
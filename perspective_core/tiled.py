@@ -0,0 +1,254 @@
+"""Tiled warps for outputs too large to hold (or worth holding) in memory at once.
+
+The output is computed in tile_size x tile_size tiles. Each tile's corners are mapped back
+through the inverse homography, and only the source region they cover (plus the
+interpolation kernel's reach) is handed to cv2.warpPerspective, so every call touches a
+small, cache-friendly part of the source. Tiles are produced one horizontal band at a time:
+iter_warped_bands never holds more than one band of the output, and write_warped streams
+the bands straight into a PNG file, so peak memory is the source plus one band.
+"""
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .engine import WarpCancelled
+from .image_io import encode_extension, write_image
+
+DEFAULT_TILE_SIZE = 512
+# Farthest a kernel reaches from the sample point (LANCZOS4 uses -3..+4), plus rounding slack.
+KERNEL_MARGIN = 5
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHUNK_BYTES = 1 << 20
+# Uncompressed bytes per block when PNG compression runs on several threads
+PNG_BLOCK_BYTES = 1 << 20
+# Deflate's window: each block is primed with this much of the data before it
+_DEFLATE_WINDOW = 32 * 1024
+
+
+def _translation(tx, ty):
+    return np.array([[1, 0, tx], [0, 1, ty], [0, 0, 1]], dtype=np.float64)
+
+
+def source_roi(inverse_matrix, tile_rect, source_size, margin=KERNEL_MARGIN):
+    """Source rectangle (x0, y0, x1, y1) a tile (x0, y0, x1, y1) of the output samples from.
+
+    Always non-empty and inside the source. When the tile's preimage crosses the line at
+    infinity it is unbounded, and the whole source is returned.
+    """
+    width, height = source_size
+    x0, y0, x1, y1 = tile_rect
+    corners = np.array([[x0, y0, 1], [x1, y0, 1], [x1, y1, 1], [x0, y1, 1]], dtype=np.float64)
+    mapped = corners @ inverse_matrix.T
+    w = mapped[:, 2]
+    if not (np.all(w > 1e-12) or np.all(w < -1e-12)):
+        return 0, 0, width, height
+
+    xs = mapped[:, 0] / w
+    ys = mapped[:, 1] / w
+    # Clamp into the source but keep at least one pixel: with BORDER_REPLICATE a tile that
+    # lies entirely outside the source still samples its nearest edge.
+    rx0 = min(max(int(np.floor(xs.min())) - margin, 0), width - 1)
+    ry0 = min(max(int(np.floor(ys.min())) - margin, 0), height - 1)
+    rx1 = max(min(int(np.ceil(xs.max())) + margin + 1, width), rx0 + 1)
+    ry1 = max(min(int(np.ceil(ys.max())) + margin + 1, height), ry0 + 1)
+    return rx0, ry0, rx1, ry1
+
+
+def warp_tile(image, geometry, tile_rect, interpolation=cv2.INTER_LANCZOS4, inverse_matrix=None, dst=None):
+    """One tile of apply_geometry(image, geometry), warped from its source region only."""
+    if inverse_matrix is None:
+        inverse_matrix = np.linalg.inv(geometry.matrix)
+    x0, y0, x1, y1 = tile_rect
+    rx0, ry0, rx1, ry1 = source_roi(inverse_matrix, tile_rect, (image.shape[1], image.shape[0]))
+    matrix = _translation(-x0, -y0) @ np.asarray(geometry.matrix, dtype=np.float64) @ _translation(rx0, ry0)
+    # The region's edges are either the source's own edges or at least KERNEL_MARGIN away from
+    # any sample, so both border modes see the same pixels as in a whole-image warp.
+    return cv2.warpPerspective(image[ry0:ry1, rx0:rx1], matrix, (x1 - x0, y1 - y0), dst=dst,
+                               flags=interpolation, borderMode=geometry.border_mode,
+                               borderValue=geometry.border_value)
+
+
+def iter_warped_bands(image, geometry, interpolation=cv2.INTER_LANCZOS4, tile_size=DEFAULT_TILE_SIZE,
+                      on_progress=None, is_cancelled=None):
+    """Yield (y0, band) for consecutive tile_size-high bands of the warped output.
+
+    The band array is reused between iterations, so consume (or copy) it before advancing.
+    on_progress / is_cancelled work as in engine.apply_geometry_in_strips.
+    """
+    width, height = geometry.size
+    inverse_matrix = np.linalg.inv(np.asarray(geometry.matrix, dtype=np.float64))
+    buffer = np.empty((min(tile_size, height), width) + image.shape[2:], dtype=image.dtype)
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        band = buffer[:y1 - y0]
+        for x0 in range(0, width, tile_size):
+            if is_cancelled is not None and is_cancelled():
+                raise WarpCancelled()
+            x1 = min(x0 + tile_size, width)
+            warp_tile(image, geometry, (x0, y0, x1, y1), interpolation, inverse_matrix, dst=band[:, x0:x1])
+        yield y0, band
+        if on_progress is not None:
+            on_progress(y1 / height)
+
+
+def warp_tiled(image, geometry, interpolation=cv2.INTER_LANCZOS4, tile_size=DEFAULT_TILE_SIZE,
+               on_progress=None, is_cancelled=None):
+    """Same output as engine.apply_geometry, assembled from tiles (drop-in for apply_geometry_in_strips)."""
+    width, height = geometry.size
+    output = np.empty((height, width) + image.shape[2:], dtype=image.dtype)
+    for y0, band in iter_warped_bands(image, geometry, interpolation, tile_size, on_progress, is_cancelled):
+        output[y0:y0 + band.shape[0]] = band
+    return output
+
+
+def _deflate_block(data, level, zdict, last):
+    # A raw deflate segment that ends on a byte boundary (sync flush), so segments compressed
+    # independently concatenate into one valid stream; only the last one is final.
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class PngStreamWriter:
+    """Write an 8-bit BGR/gray PNG row band by row band, without the whole image in memory.
+
+    Rows use the PNG "Sub" filter (computed with numpy), and compressed data is flushed to
+    the file in IDAT chunks of about PNG_CHUNK_BYTES as it is produced.
+
+    With workers > 1 the zlib stream is compressed like pigz does: PNG_BLOCK_BYTES blocks are
+    deflated on a thread pool (zlib releases the GIL), each primed with the 32 KB before it so
+    the ratio barely changes, and written in order; the Adler-32 is computed on the way in.
+    """
+
+    def __init__(self, path, width, height, channels=3, compress_level=3, workers=1):
+        if channels not in (1, 3, 4):
+            raise ValueError(f"Unsupported channel count {channels}")
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.rows_written = 0
+        self._level = compress_level
+        self._compressor = zlib.compressobj(compress_level)
+        self._executor = ThreadPoolExecutor(workers) if workers > 1 else None
+        self._max_in_flight = 2 * workers
+        self._futures = deque()
+        self._block = bytearray()
+        self._window = b""
+        self._adler = 1
+        self._pending = []
+        self._pending_bytes = 0
+        self._file = open(path, "wb")
+        color_type = {1: 0, 3: 2, 4: 6}[channels]
+        self._file.write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+    def _queue(self, data, force=False):
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+        if self._pending_bytes >= PNG_CHUNK_BYTES or (force and self._pending_bytes):
+            self._write_chunk(b"IDAT", b"".join(self._pending))
+            self._pending = []
+            self._pending_bytes = 0
+
+    def write_rows(self, rows):
+        rows = np.asarray(rows)
+        if rows.dtype != np.uint8 or rows.shape[1] != self.width:
+            raise ValueError("Rows must be uint8 and as wide as the image")
+        if self.channels == 3:
+            rows = rows[:, :, ::-1]  # BGR -> RGB
+        elif self.channels == 4:
+            rows = rows[:, :, [2, 1, 0, 3]]
+        raw = rows.reshape(rows.shape[0], -1)
+
+        filtered = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1  # filter type Sub
+        filtered[:, 1:self.channels + 1] = raw[:, :self.channels]
+        np.subtract(raw[:, self.channels:], raw[:, :-self.channels], out=filtered[:, self.channels + 1:])
+        if self._executor is None:
+            self._queue(self._compressor.compress(filtered.tobytes()))
+        else:
+            data = filtered.tobytes()
+            self._adler = zlib.adler32(data, self._adler)
+            self._block += data
+            while len(self._block) >= PNG_BLOCK_BYTES:
+                self._submit_block(bytes(self._block[:PNG_BLOCK_BYTES]), last=False)
+                del self._block[:PNG_BLOCK_BYTES]
+        self.rows_written += raw.shape[0]
+
+    def _submit_block(self, data, last):
+        if not self._futures and not self._window:
+            self._queue(b"\x78\x5e")  # zlib header: deflate, 32 KB window
+        self._futures.append(self._executor.submit(_deflate_block, data, self._level, self._window, last))
+        self._window = data[-_DEFLATE_WINDOW:]
+        while len(self._futures) > (0 if last else self._max_in_flight):
+            self._queue(self._futures.popleft().result())
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG expects {self.height} rows, got {self.rows_written}")
+            if self._executor is None:
+                self._queue(self._compressor.flush(), force=True)
+            else:
+                self._submit_block(bytes(self._block), last=True)
+                self._queue(struct.pack(">I", self._adler & 0xFFFFFFFF), force=True)
+            self._write_chunk(b"IEND", b"")
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        self._file.close()
+        if self._executor is not None:
+            for future in self._futures:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._shutdown()
+
+
+def write_warped(path, image, geometry, interpolation=cv2.INTER_LANCZOS4, tile_size=DEFAULT_TILE_SIZE,
+                 compress_level=3, on_progress=None, is_cancelled=None, workers=1):
+    """Warp image and write the result to path, streaming tile bands into the file for PNG.
+
+    Other formats are encoded by OpenCV from the assembled output, so only PNG keeps the
+    one-band memory bound. Returns the output size (width, height).
+    """
+    if encode_extension(path) != ".png":
+        write_image(path, warp_tiled(image, geometry, interpolation, tile_size, on_progress, is_cancelled))
+        return geometry.size
+
+    width, height = geometry.size
+    channels = image.shape[2] if image.ndim == 3 else 1
+    try:
+        with PngStreamWriter(path, width, height, channels, compress_level, workers) as writer:
+            for _, band in iter_warped_bands(image, geometry, interpolation, tile_size, on_progress, is_cancelled):
+                writer.write_rows(band)
+    except BaseException:
+        # Do not leave a truncated PNG behind.
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return geometry.size
@@ -0,0 +1,72 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from perspective_core import batch, engine
+
+POINTS = [[10, 12], [90, 8], [95, 70], [5, 75]]
+
+
+def write_manifest(tmp_path, rows, name="manifest.json"):
+    path = tmp_path / name
+    path.write_text(json.dumps(rows), encoding="utf-8")
+    return str(path)
+
+
+def test_json_rows_resolve_against_the_manifest_directory(tmp_path):
+    manifest = write_manifest(tmp_path, {"images": [
+        {"path": "a.jpg", "points": POINTS},
+        {"path": "b.jpg", "points": POINTS, "mode": "full", "output": "out/b.png"},
+    ]})
+    first, second = batch.load_manifest(manifest)
+    assert first.path == str(tmp_path / "a.jpg")
+    assert first.output == str(tmp_path / "a_corrected.png")
+    assert first.mode == engine.MODE_CROPPED
+    assert first.points == [tuple(map(float, p)) for p in POINTS]
+    assert second.mode == engine.MODE_FULL
+    assert second.output == str(tmp_path / "out" / "b.png")
+
+
+def test_output_dir_applies_to_rows_without_an_output(tmp_path):
+    manifest = write_manifest(tmp_path, [{"path": "a.jpg", "points": POINTS}])
+    (job,) = batch.load_manifest(manifest, output_dir=str(tmp_path / "results"))
+    assert job.output == str(tmp_path / "results" / "a_corrected.png")
+
+
+def test_csv_rows_without_points_are_left_for_detection(tmp_path):
+    path = tmp_path / "manifest.csv"
+    path.write_text("path,x1,y1,x2,y2,x3,y3,x4,y4,mode\n"
+                    "a.jpg,10,12,90,8,95,70,5,75,full-fit\n"
+                    "b.jpg,,,,,,,,,\n", encoding="utf-8")
+    first, second = batch.load_manifest(str(path))
+    assert first.points == [tuple(map(float, p)) for p in POINTS]
+    assert first.mode == engine.MODE_FULL_FIT
+    assert second.points is None
+    assert second.mode == engine.MODE_CROPPED
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"path": "a.jpg", "points": POINTS, "mode": "sideways"}, "unknown mode"),
+    ({"path": "a.jpg", "points": POINTS[:3]}, "expected 4 points"),
+])
+def test_invalid_rows_name_the_row(tmp_path, row, message):
+    manifest = write_manifest(tmp_path, [{"path": "ok.jpg", "points": POINTS}, row])
+    with pytest.raises(ValueError, match=f"row 2: {message}"):
+        batch.load_manifest(manifest)
+
+
+def test_main_creates_directories_of_explicit_outputs(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, (80, 100, 3), dtype=np.uint8)
+    cv2.imwrite(str(tmp_path / "a.png"), image)
+    manifest = write_manifest(tmp_path, [{"path": "a.png", "points": POINTS, "output": "new/dir/a.png"}])
+    assert batch.main([manifest, "--quiet"]) == 0
+    assert (tmp_path / "new" / "dir" / "a.png").is_file()
+
+
+@pytest.mark.parametrize("option", ["--workers", "--max-in-flight", "--tile-size"])
+@pytest.mark.parametrize("value", ["0", "-2"])
+def test_counts_below_one_are_rejected(option, value):
+    with pytest.raises(SystemExit):
+        batch.build_parser().parse_args(["manifest.json", option, value])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from perspective_core import calibration, engine
+
+REFERENCE = [(100, 120), (1900, 200), (1850, 1500), (150, 1400)]
+SOURCE_SIZE = (2000, 1600)
+
+
+@pytest.fixture
+def profile():
+    return calibration.create_profile("copy stand", REFERENCE, 21.0, 29.7, SOURCE_SIZE)
+
+
+def test_profiles_round_trip_through_the_file(tmp_path, profile):
+    path = str(tmp_path / "profiles.json")
+    calibration.save_profile(path, profile)
+    calibration.save_profile(path, profile._replace(name="other"))
+    loaded = calibration.load_profiles(path)
+    assert list(loaded) == ["copy stand", "other"]
+    restored = loaded["copy stand"]
+    np.testing.assert_allclose(restored.matrix, profile.matrix)
+    assert restored._replace(matrix=None) == profile._replace(matrix=None)
+    assert calibration.load_profile(path).name == "other"
+
+
+def test_saving_a_name_again_replaces_it(tmp_path, profile):
+    path = str(tmp_path / "profiles.json")
+    calibration.save_profile(path, profile)
+    calibration.save_profile(path, profile._replace(width_cm=10.0))
+    assert calibration.load_profile(path, "copy stand").width_cm == 10.0
+    assert len(calibration.load_profiles(path)) == 1
+
+
+def test_missing_profiles_are_errors(tmp_path, profile):
+    path = str(tmp_path / "profiles.json")
+    assert calibration.load_profiles(path) == {}
+    with pytest.raises(ValueError, match="no calibration profiles"):
+        calibration.load_profile(path)
+    calibration.save_profile(path, profile)
+    with pytest.raises(ValueError, match="no calibration profile named"):
+        calibration.load_profile(path, "missing")
+
+
+def test_fit_profile_maps_the_same_points_at_another_resolution(profile):
+    half = calibration.fit_profile(profile, (1000, 800))
+    assert half.output_size == profile.output_size
+    assert half.pixels_per_cm == profile.pixels_per_cm
+    full_points = engine.map_points(profile.matrix, REFERENCE)
+    half_points = engine.map_points(half.matrix, [(x / 2, y / 2) for x, y in REFERENCE])
+    np.testing.assert_allclose(half_points, full_points, atol=1e-6)
+    assert calibration.fit_profile(profile, SOURCE_SIZE) is profile
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from perspective_core import detect
+
+# Larger than DETECT_MAX_SIDE, so detection runs on a downscaled copy and refines at full size
+SIZE = (1200, 900)
+CORNERS = np.float32([(300, 180), (950, 260), (880, 760), (220, 680)])
+SUPERSAMPLE = 4
+
+
+def document_photo():
+    """A bright rotated sheet on a textured background, drawn supersampled for sub-pixel corners."""
+    rng = np.random.default_rng(1)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (SIZE[1], SIZE[0]), dtype=np.uint8), (0, 0), 2)
+    texture = (texture * 0.4 + 40).astype(np.uint8)
+    large = cv2.resize(texture, (SIZE[0] * SUPERSAMPLE, SIZE[1] * SUPERSAMPLE), interpolation=cv2.INTER_NEAREST)
+    # fillPoly with 4 fractional bits; pixel centres of the small image map to centres of the large one
+    outline = np.rint(((CORNERS + 0.5) * SUPERSAMPLE - 0.5) * 16).astype(np.int32)
+    cv2.fillPoly(large, [outline], 235, cv2.LINE_8, 4)
+    small = cv2.resize(large, SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+
+
+def test_a_rotated_document_is_found_within_a_pixel():
+    detection = detect.detect_quad(document_photo())
+    assert detection is not None
+    assert detection.confidence >= detect.DEFAULT_MIN_CONFIDENCE
+    assert np.abs(detection.points - CORNERS).max() <= 1.0
+
+
+def test_refinement_improves_on_the_downscaled_corners():
+    photo = document_photo()
+    coarse = detect.detect_quad(photo, refine=False)
+    refined = detect.detect_quad(photo)
+    assert np.abs(refined.points - CORNERS).max() < np.abs(coarse.points - CORNERS).max()
+
+
+def test_a_featureless_image_has_no_candidate():
+    assert detect.detect_quad(np.full((300, 400, 3), 128, dtype=np.uint8)) is None
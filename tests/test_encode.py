@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+
+from perspective_core import encode, engine
+from perspective_core.tiled import PngStreamWriter
+
+
+@pytest.fixture
+def image():
+    # Noise plus a gradient, over 3 MB raw: several of the 1 MB parallel deflate blocks
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, 1200, dtype=np.uint8)[None, :, None]
+    return (rng.integers(0, 64, (900, 1200, 3), dtype=np.uint8) + gradient // 2).astype(np.uint8)
+
+
+@pytest.mark.parametrize("channels", [1, 3, 4])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_png_stream_writer_round_trip(tmp_path, image, channels, workers):
+    if channels == 1:
+        image = image[:, :, 0]
+    elif channels == 4:
+        image = np.dstack([image, image[:, :, :1]])
+    path = str(tmp_path / "out.png")
+    with PngStreamWriter(path, image.shape[1], image.shape[0], channels, 1, workers) as writer:
+        for y0 in range(0, image.shape[0], 100):
+            writer.write_rows(image[y0:y0 + 100])
+    np.testing.assert_array_equal(cv2.imread(path, cv2.IMREAD_UNCHANGED), image)
+
+
+@pytest.mark.parametrize("name, options", [
+    ("out.png", encode.SaveOptions(png_workers=1)),
+    ("out.png", encode.SaveOptions(png_workers=2)),
+    ("out.tiff", encode.SaveOptions(tiff_compression="deflate")),
+])
+def test_lossless_saves_decode_to_the_image(tmp_path, image, name, options):
+    path = str(tmp_path / name)
+    encode.save_image(path, image, options)
+    np.testing.assert_array_equal(cv2.imread(path), image)
+    assert not (tmp_path / f"{name}.part").exists()
+
+
+def test_jpeg_save_reports_progress(tmp_path, image):
+    progress = []
+    encode.save_image(str(tmp_path / "out.jpg"), image, encode.SaveOptions(jpeg_quality=90), progress.append)
+    assert progress[-1] == 1.0
+    assert cv2.imread(str(tmp_path / "out.jpg")).shape == image.shape
+
+
+def test_cancelled_save_leaves_no_file(tmp_path, image):
+    path = tmp_path / "out.png"
+    with pytest.raises(engine.WarpCancelled):
+        encode.save_image(str(path), image, encode.SaveOptions(png_workers=2), is_cancelled=lambda: True)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_streaming_is_chosen_by_size_or_workers(image):
+    assert not encode.streams_png(image, encode.SaveOptions(png_workers=1))
+    assert encode.streams_png(image, encode.SaveOptions(png_workers=2))
+    assert not encode.streams_png(image.astype(np.uint16), encode.SaveOptions(png_workers=2))
+
+
+def test_streaming_can_be_forced_either_way(image):
+    assert encode.streams_png(image, encode.SaveOptions(png_workers=1), stream=True)
+    assert not encode.streams_png(image, encode.SaveOptions(png_workers=2), stream=False)
+    assert not encode.streams_png(image.astype(np.uint16), stream=True)
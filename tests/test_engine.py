@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from perspective_core import engine
+
+# A document rotated by 60 degrees, clicked clockwise from a corner that sorting by angle would
+# not pick as the top-left one
+ROTATED = [(100, 223), (200, 50), (373, 150), (273, 323)]
+# A 24 x 12 cm reference at 10 px/cm, rotated the same way and clicked from the end of a long edge
+ROTATED_REFERENCE = [(100, 300), (220, 92.15), (323.92, 152.15), (203.92, 360)]
+
+
+def test_points_in_marking_order_are_kept():
+    assert tuple(engine.order_points(ROTATED)[0]) != ROTATED[0]
+    np.testing.assert_array_equal(engine.normalize_quad(ROTATED), np.float32(ROTATED))
+
+
+def test_other_orders_are_sorted_clockwise():
+    square = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    for order in ([2, 0, 3, 1], [3, 2, 1, 0], [1, 3, 0, 2]):
+        shuffled = [square[i] for i in order]
+        np.testing.assert_array_equal(engine.normalize_quad(shuffled), np.float32(square))
+
+
+@pytest.mark.parametrize("points", [
+    [(0, 0), (5, 5), (10, 10), (0, 10)],  # three on a line
+    [(0, 0), (0, 0), (10, 10), (0, 10)],  # repeated point
+    [(0, 0), (10, 0), (20, 0), (30, 0)],  # all on a line
+])
+def test_degenerate_quads_are_rejected(points):
+    with pytest.raises(engine.DegenerateQuadError):
+        engine.normalize_quad(points)
+
+
+def test_geometries_reject_degenerate_quads_before_warping():
+    points = [(0, 0), (5, 5), (10, 10), (0, 10)]
+    with pytest.raises(engine.DegenerateQuadError):
+        engine.cropped_geometry(points)
+    with pytest.raises(engine.DegenerateQuadError):
+        engine.full_geometry(points, (100, 100))
+    with pytest.raises(engine.DegenerateQuadError):
+        engine.calibrated_geometry(points, 21.0, 29.7, (100, 100))
+
+
+def test_calibrated_geometry_keeps_the_clicked_corner_order():
+    # Sorting by angle would start at the second click and swap the reference's width and height
+    assert tuple(engine.order_points(ROTATED_REFERENCE)[0]) != ROTATED_REFERENCE[0]
+    geometry, pixels_per_cm = engine.calibrated_geometry(ROTATED_REFERENCE, 24.0, 12.0, (400, 400))
+    assert pixels_per_cm == pytest.approx(engine.DEFAULT_MAX_DIM_PX / 24.0)
+    corners = engine.map_points(geometry.matrix, ROTATED_REFERENCE)
+    edges_cm = np.linalg.norm(np.roll(corners, -1, axis=0) - corners, axis=1) / pixels_per_cm
+    np.testing.assert_allclose(edges_cm, [24.0, 12.0, 24.0, 12.0], atol=1e-3)
+
+
+def test_cropped_geometry_maps_the_quad_onto_its_output_corners():
+    geometry = engine.cropped_geometry(ROTATED)
+    width, height = geometry.size
+    np.testing.assert_allclose(engine.map_points(geometry.matrix, ROTATED),
+                               [(0, 0), (width - 1, 0), (width - 1, height - 1), (0, height - 1)], atol=1e-3)
@@ -0,0 +1,90 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from perspective_core import measure, resolution
+
+REFERENCE = [(100, 120), (1900, 200), (1850, 1500), (150, 1400)]
+SOURCE_SIZE = (2000, 1600)
+
+
+def test_lengths_and_areas_in_one_pass():
+    store = measure.MeasurementStore(pixels_per_cm=10)
+    store.add_segment((0, 0), (30, 40))
+    store.add_polyline([(0, 0), (10, 0), (10, 10)])
+    store.add_polygon([(0, 0), (20, 0), (20, 10), (0, 10)])
+    lengths, areas = store.compute()
+    np.testing.assert_allclose(lengths, [5.0, 2.0, 6.0])
+    assert np.isnan(areas[:2]).all()
+    assert areas[2] == pytest.approx(2.0)
+
+
+def test_empty_store_computes_empty_arrays():
+    lengths, areas = measure.MeasurementStore(75).compute()
+    assert lengths.shape == areas.shape == (0,)
+
+
+@pytest.mark.parametrize("kind, points", [
+    (measure.SEGMENT, [(0, 0), (1, 1), (2, 2)]),
+    (measure.POLYLINE, [(0, 0)]),
+    (measure.POLYGON, [(0, 0), (1, 1)]),
+])
+def test_too_few_or_too_many_points_are_rejected(kind, points):
+    with pytest.raises(ValueError):
+        measure.MeasurementStore(75).add(kind, points)
+
+
+def test_source_points_need_a_homography():
+    with pytest.raises(ValueError, match="homography"):
+        measure.MeasurementStore(75).add_segment((0, 0), (1, 1), source=True)
+
+
+@pytest.mark.parametrize("policy", [resolution.DEFAULT_POLICY,
+                                    resolution.SOURCE_DENSITY_POLICY._replace(max_megapixels=12)])
+def test_reference_measures_its_own_size(policy):
+    store = measure.MeasurementStore.from_reference(REFERENCE, 21.0, 29.7, SOURCE_SIZE, policy)
+    store.add_segment(REFERENCE[0], REFERENCE[1], source=True)
+    store.add_segment(REFERENCE[1], REFERENCE[2], source=True)
+    store.add_polygon(REFERENCE, source=True)
+    lengths, areas = store.compute()
+    np.testing.assert_allclose(lengths, [21.0, 29.7, 2 * (21.0 + 29.7)], rtol=1e-6)
+    assert areas[2] == pytest.approx(21.0 * 29.7, rel=1e-6)
+
+
+def test_from_file_and_export_round_trip(tmp_path):
+    points_file = tmp_path / "points.json"
+    points_file.write_text(json.dumps({
+        "pixels_per_cm": 10,
+        "measurements": [{"kind": "segment", "points": [[0, 0], [0, 50]], "label": "door"},
+                         {"kind": "polygon", "points": [[0, 0], [10, 0], [10, 10], [0, 10]]}],
+    }), encoding="utf-8")
+    store = measure.MeasurementStore.from_file(str(points_file))
+
+    measure.export(str(tmp_path / "out.csv"), store, "points.json")
+    with open(tmp_path / "out.csv", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["label"] for row in rows] == ["door", ""]
+    assert float(rows[0]["length_cm"]) == pytest.approx(5.0)
+    assert float(rows[1]["area_cm2"]) == pytest.approx(1.0)
+
+    measure.export(str(tmp_path / "out.json"), store)
+    data = json.loads((tmp_path / "out.json").read_text(encoding="utf-8"))
+    assert data["pixels_per_cm"] == 10
+    assert data["measurements"][0]["area_cm2"] is None
+
+
+def test_bad_measurement_in_file_names_its_number(tmp_path):
+    points_file = tmp_path / "points.json"
+    measurements = [{"kind": "segment", "points": [[0, 0]]}]
+    points_file.write_text(json.dumps({"pixels_per_cm": 10, "measurements": measurements}), encoding="utf-8")
+    with pytest.raises(ValueError, match="measurement 1"):
+        measure.MeasurementStore.from_file(str(points_file))
+
+
+def test_file_without_a_scale_is_rejected(tmp_path):
+    points_file = tmp_path / "points.json"
+    points_file.write_text(json.dumps({"measurements": []}), encoding="utf-8")
+    with pytest.raises(ValueError, match="pixels_per_cm"):
+        measure.MeasurementStore.from_file(str(points_file))
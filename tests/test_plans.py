@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+import pytest
+
+from perspective_core import engine, plans
+
+SOURCE_SIZE = (320, 240)
+
+
+def geometry(shift=0):
+    points = [(30 + shift, 20), (290, 35 + shift), (280, 220), (20, 200 - shift)]
+    return engine.cropped_geometry(points)
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (SOURCE_SIZE[1], SOURCE_SIZE[0], 3), dtype=np.uint8)
+
+
+def test_prepared_plan_equals_a_direct_warp(image):
+    plan = plans.WarpPlanCache().prepare(geometry(), cv2.INTER_LANCZOS4)
+    expected = engine.apply_geometry(image, geometry(), cv2.INTER_LANCZOS4)
+    np.testing.assert_array_equal(plan.apply(image, strip_height=50), expected)
+    assert plan.nbytes == plans.plan_bytes(geometry().size, cv2.INTER_LANCZOS4)
+
+
+@pytest.mark.parametrize("interpolation", [cv2.INTER_NEAREST, cv2.INTER_LINEAR, cv2.INTER_CUBIC])
+def test_other_filters_stay_within_a_grey_level_on_smooth_images(interpolation):
+    # OpenCV 5 samples these at float precision, the plan on its 1/32 px grid
+    y, x = np.mgrid[0:SOURCE_SIZE[1], 0:SOURCE_SIZE[0]]
+    smooth = np.dstack([(x * 0.7) % 256, (y * 0.9) % 256, ((x + y) * 0.4) % 256]).astype(np.uint8)
+    smooth = cv2.GaussianBlur(smooth, (0, 0), 3)
+    plan = plans.WarpPlan(geometry(), interpolation)
+    difference = plan.apply(smooth).astype(int) - engine.apply_geometry(smooth, geometry(), interpolation)
+    assert np.abs(difference).max() <= 1
+    assert plan.nbytes == plans.plan_bytes(geometry().size, interpolation)
+
+
+def test_a_plan_is_built_on_the_second_use(image):
+    cache = plans.WarpPlanCache(min_uses=2)
+    assert cache.plan_for(geometry()) is None
+    assert len(cache) == 0
+    plan = cache.plan_for(geometry())
+    assert plan is not None and len(cache) == 1
+    assert cache.plan_for(geometry()) is plan
+    assert (cache.hits, cache.misses) == (1, 2)
+    np.testing.assert_array_equal(cache.warp(image, geometry()), engine.apply_geometry(image, geometry()))
+
+
+def test_least_recently_used_plans_are_evicted_beyond_the_budget():
+    first, second, third = geometry(0), geometry(5), geometry(10)
+    size = plans.plan_bytes(first.size)
+    cache = plans.WarpPlanCache(max_bytes=int(2.5 * size), min_uses=1)
+    cache.plan_for(first)
+    cache.plan_for(second)
+    cache.plan_for(first)  # second is now the least recently used
+    cache.plan_for(third)
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+    hits = cache.hits
+    cache.plan_for(first)
+    assert cache.hits == hits + 1
+    cache.plan_for(second)
+    assert cache.hits == hits + 1  # rebuilt, not found
+
+
+def test_plans_larger_than_the_budget_are_never_built():
+    cache = plans.WarpPlanCache(max_bytes=plans.plan_bytes(geometry().size) - 1, min_uses=1)
+    assert cache.plan_for(geometry()) is None
+    assert cache.prepare(geometry()) is None
+    assert len(cache) == 0
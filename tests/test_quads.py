@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+import pytest
+
+from perspective_core import engine, quads
+
+SQUARE = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=np.float64)
+
+
+def random_quads(count, seed=0):
+    """Convex quads: jittered, scaled and rotated squares, TL, TR, BR, BL on screen."""
+    rng = np.random.default_rng(seed)
+    base = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float64)
+    points = base + rng.uniform(-0.3, 0.3, (count, 4, 2))
+    angle = rng.uniform(-0.6, 0.6, count)
+    rotation = np.stack([np.stack([np.cos(angle), -np.sin(angle)], 1), np.stack([np.sin(angle), np.cos(angle)], 1)], 1)
+    scale = rng.uniform(50, 500, count)[:, None, None]
+    return points @ rotation.transpose(0, 2, 1) * scale + rng.uniform(0, 1000, (count, 1, 2))
+
+
+def test_as_quads_accepts_one_quad_and_rejects_other_shapes():
+    assert quads.as_quads(SQUARE).shape == (1, 4, 2)
+    with pytest.raises(ValueError):
+        quads.as_quads(np.zeros((2, 3, 2)))
+
+
+def test_order_quads_recovers_every_shuffled_order():
+    expected = random_quads(500)
+    rng = np.random.default_rng(1)
+    shuffled = np.stack([q[rng.permutation(4)] for q in expected])
+    np.testing.assert_array_equal(quads.order_quads(shuffled), expected)
+
+
+def test_validity():
+    collinear = SQUARE.copy()
+    collinear[1] = [5, 5]  # on the diagonal from TL to BR
+    counter_clockwise = SQUARE[::-1]
+    bow_tie = SQUARE[[0, 1, 3, 2]]
+    with_nan = SQUARE.copy()
+    with_nan[0, 0] = np.nan
+    np.testing.assert_array_equal(
+        quads.valid_quads([SQUARE, collinear, counter_clockwise, bow_tie, with_nan, np.zeros((4, 2))]),
+        [True, False, False, False, False, False])
+
+
+def test_batched_homographies_map_every_quad_onto_its_target():
+    batch = random_quads(200)
+    dst = random_quads(200, seed=2)
+    matrices, valid = quads.solve_homographies(batch, dst)
+    assert valid.all()
+    for src_quad, dst_quad, matrix in zip(batch, dst, matrices):
+        # The sign of w may be negative for an arbitrary pair, which map_points treats as beyond the horizon
+        mapped = cv2.perspectiveTransform(src_quad[None], matrix)[0]
+        np.testing.assert_allclose(mapped, dst_quad, atol=1e-6)
+
+
+def test_cropped_homographies_match_the_engine_and_flag_invalid_quads():
+    batch = random_quads(50)
+    batch[7] = [[0, 0], [5, 5], [10, 10], [0, 10]]
+    matrices, sizes, valid = quads.cropped_homographies(batch)
+    assert not valid[7] and np.isnan(matrices[7]).all()
+    assert valid.sum() == 49
+    for quad, matrix, size in zip(batch[valid], matrices[valid], sizes[valid]):
+        geometry = engine.cropped_geometry(quad)
+        assert tuple(size) == geometry.size
+        # engine solves in float32 through OpenCV: equal to a small fraction of a pixel
+        np.testing.assert_allclose(engine.map_points(matrix, quad), engine.map_points(geometry.matrix, quad),
+                                   atol=1e-3)
@@ -0,0 +1,32 @@
+import cv2
+import numpy as np
+
+from perspective_core import refine
+
+CORNERS = np.float32([(90.25, 60.5), (310.75, 85.25), (290.5, 240.75), (70.5, 215.25)])
+NEAR_MISSES = CORNERS + np.float32([(3, -2), (-2, 3), (2, 2), (-3, -1)])
+SUPERSAMPLE = 8
+
+
+def quad_image():
+    """A bright rotated quad on a dark background (400 x 300), drawn supersampled for sub-pixel corners."""
+    large = np.full((300 * SUPERSAMPLE, 400 * SUPERSAMPLE), 40, dtype=np.uint8)
+    outline = np.rint(((CORNERS + 0.5) * SUPERSAMPLE - 0.5) * 16).astype(np.int32)
+    cv2.fillPoly(large, [outline], 220, cv2.LINE_8, 4)
+    small = cv2.resize(large, (400, 300), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+
+
+def test_near_misses_move_onto_the_corners():
+    refined = refine.refine_points(quad_image(), NEAR_MISSES)
+    assert refined.dtype == np.float32
+    assert np.abs(refined - CORNERS).max() < 0.5
+
+
+def test_points_that_would_move_beyond_max_shift_keep_their_position():
+    refined = refine.refine_points(quad_image(), NEAR_MISSES, max_shift=1)
+    np.testing.assert_array_equal(refined, NEAR_MISSES)
+
+
+def test_no_points_give_an_empty_result():
+    assert refine.refine_points(quad_image(), []).shape == (0, 2)
@@ -0,0 +1,60 @@
+import cv2
+import pytest
+
+from perspective_core import resolution
+
+SOURCE_SIZE = (400, 300)
+# A 20 x 10 cm reference seen axis-aligned at 10 px/cm. The image corners are pixel centres,
+# so the source spans 399 x 299 px and the output (399 * scale) x (299 * scale), rounded up.
+REFERENCE = [(100, 100), (300, 100), (300, 200), (100, 200)]
+
+
+def test_source_density_is_the_reference_edge_per_cm():
+    assert resolution.source_pixels_per_cm(REFERENCE, 20, 10) == pytest.approx(10.0)
+    assert resolution.source_pixels_per_cm(REFERENCE, 40, 10) == pytest.approx(10.0)
+    assert resolution.source_pixels_per_cm(REFERENCE, 40, 5) == pytest.approx(20.0)
+
+
+def test_the_default_policy_keeps_its_scale_under_the_cap():
+    geometry, pixels_per_cm, _ = resolution.resolve(resolution.DEFAULT_POLICY, REFERENCE, 20, 10, SOURCE_SIZE)
+    assert pixels_per_cm == pytest.approx(75.0)
+    assert geometry.size == (2993, 2243)
+
+
+def test_max_dim_px_clamps_the_scale():
+    _, clamped, _ = resolution.resolve(resolution.ResolutionPolicy(), REFERENCE, 40, 10, SOURCE_SIZE)
+    assert clamped == pytest.approx(1500 / 40)
+    _, unclamped, _ = resolution.resolve(resolution.ResolutionPolicy(max_dim_px=None), REFERENCE, 40, 10,
+                                         SOURCE_SIZE)
+    assert unclamped == pytest.approx(75.0)
+
+
+def test_match_source_samples_the_plane_like_the_camera():
+    geometry, pixels_per_cm, _ = resolution.resolve(resolution.SOURCE_DENSITY_POLICY, REFERENCE, 20, 10,
+                                                    SOURCE_SIZE)
+    assert pixels_per_cm == pytest.approx(10.0)
+    assert geometry.size == (399, 299)
+
+
+def test_max_megapixels_scales_the_output_and_its_density_down():
+    policy = resolution.ResolutionPolicy(max_megapixels=1.0)
+    geometry, pixels_per_cm, estimate = resolution.resolve(policy, REFERENCE, 20, 10, SOURCE_SIZE)
+    scale = (1e6 / (2993 * 2243)) ** 0.5
+    assert pixels_per_cm == pytest.approx(75.0 * scale)
+    assert geometry.size == (int(2993 * scale), int(2243 * scale))
+    assert estimate.megapixels <= 1.0
+    assert estimate.pixels_per_cm == pixels_per_cm
+
+
+def test_estimate_arithmetic():
+    geometry, _, _ = resolution.resolve(resolution.SOURCE_DENSITY_POLICY, REFERENCE, 20, 10, SOURCE_SIZE)
+    estimate = resolution.estimate(geometry, 10.0, SOURCE_SIZE, channels=3, interpolation=cv2.INTER_LINEAR)
+    assert estimate.size == (399, 299)
+    assert estimate.megapixels == pytest.approx(399 * 299 / 1e6)
+    assert estimate.output_bytes == 399 * 299 * 3
+    assert estimate.peak_bytes == 399 * 299 * 3 + 400 * 300 * 3
+    assert estimate.warp_seconds == pytest.approx(399 * 299 / 1e6 / resolution.DEFAULT_WARP_RATES[cv2.INTER_LINEAR])
+
+    gray = resolution.estimate(geometry, channels=1, warp_rate=0.5)
+    assert (gray.output_bytes, gray.peak_bytes) == (399 * 299, 399 * 299)
+    assert gray.warp_seconds == pytest.approx(399 * 299 / 1e6 / 0.5)
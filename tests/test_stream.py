@@ -0,0 +1,71 @@
+import threading
+import time
+
+import numpy as np
+
+from perspective_core import stream
+
+FRAME_COUNT = 40
+
+
+def numbered_frames(count):
+    for index in range(count):
+        yield np.full((4, 4), index, dtype=np.int32)
+
+
+def slow_negate(frame):
+    # Later frames finish first, so the workers complete them out of order
+    time.sleep(0.002 * (3 - int(frame[0, 0]) % 4))
+    return -frame
+
+
+def test_frames_come_back_in_order_from_several_workers():
+    stats = stream.StreamStats()
+    results = list(stream.rectify_frames(numbered_frames(FRAME_COUNT), slow_negate, workers=4, queue_size=3,
+                                         stats=stats))
+    assert [index for index, _ in results] == list(range(FRAME_COUNT))
+    assert all((frame == -index).all() for index, frame in results)
+    assert (stats.frames_read, stats.frames_dropped, stats.frames_failed) == (FRAME_COUNT, 0, 0)
+
+
+def test_frames_that_find_the_queue_full_are_dropped():
+    warping = threading.Event()
+    release = threading.Event()
+
+    def frames():
+        yield np.zeros((4, 4), dtype=np.int32)
+        # Frame 0 is held by the only worker and frame 1 fills the queue; the rest are dropped
+        warping.wait(5)
+        yield from (np.full((4, 4), index, dtype=np.int32) for index in range(1, FRAME_COUNT))
+        release.set()
+
+    def held_warp(frame):
+        warping.set()
+        release.wait(5)
+        return frame
+
+    stats = stream.StreamStats()
+    results = list(stream.rectify_frames(frames(), held_warp, workers=1, queue_size=1, drop_when_full=True,
+                                         stats=stats))
+    assert [index for index, _ in results] == [0, 1]
+    assert stats.frames_read == FRAME_COUNT
+    assert stats.frames_dropped == FRAME_COUNT - 2
+
+
+def test_closing_the_generator_stops_the_threads():
+    def endless_frames():
+        index = 0
+        while True:
+            yield np.full((4, 4), index, dtype=np.int32)
+            index += 1
+
+    before = set(threading.enumerate())
+    results = stream.rectify_frames(endless_frames(), slow_negate, workers=3, queue_size=2)
+    assert [next(results)[0] for _ in range(5)] == list(range(5))
+    started = set(threading.enumerate()) - before
+    assert len(started) == 4
+    results.close()
+    deadline = time.monotonic() + 5
+    while any(thread.is_alive() for thread in started) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not any(thread.is_alive() for thread in started)
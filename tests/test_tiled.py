@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+import pytest
+
+from perspective_core import engine, tiled
+
+POINTS = [(40, 30), (330, 55), (300, 250), (25, 220)]
+SOURCE_SIZE = (360, 280)
+TILE_SIZE = 100  # divides none of the output sizes
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (SOURCE_SIZE[1], SOURCE_SIZE[0], 3), dtype=np.uint8)
+
+
+@pytest.fixture(params=["cropped", "full_constant", "full_replicate"])
+def geometry(request):
+    if request.param == "cropped":
+        geometry = engine.cropped_geometry(POINTS)
+    else:
+        geometry = engine.full_geometry(POINTS, SOURCE_SIZE, fit_to_frame=request.param == "full_replicate")
+    expected_border = cv2.BORDER_REPLICATE if request.param == "full_replicate" else cv2.BORDER_CONSTANT
+    assert geometry.border_mode == expected_border
+    return geometry
+
+
+
+def test_warp_tiled_equals_a_whole_image_warp(image, geometry):
+    assert geometry.size[0] % TILE_SIZE and geometry.size[1] % TILE_SIZE
+    expected = engine.apply_geometry(image, geometry, cv2.INTER_LANCZOS4)
+    np.testing.assert_array_equal(tiled.warp_tiled(image, geometry, cv2.INTER_LANCZOS4, TILE_SIZE), expected)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_write_warped_png_equals_a_whole_image_warp(tmp_path, image, geometry, workers):
+    path = str(tmp_path / "out.png")
+    tiled.write_warped(path, image, geometry, cv2.INTER_LANCZOS4, TILE_SIZE, workers=workers)
+    np.testing.assert_array_equal(cv2.imread(path), engine.apply_geometry(image, geometry, cv2.INTER_LANCZOS4))
+
+
+def test_png_of_an_exact_number_of_blocks(tmp_path):
+    # Gray rows of 1023 px filter to 1024 bytes, so 2048 rows fill exactly two parallel blocks
+    # and the final block is empty.
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 256, (2048, 1023), dtype=np.uint8)
+    assert image.shape[0] * (image.shape[1] + 1) == 2 * tiled.PNG_BLOCK_BYTES
+    for workers in (1, 2):
+        path = str(tmp_path / f"out_{workers}.png")
+        with tiled.PngStreamWriter(path, image.shape[1], image.shape[0], 1, 1, workers) as writer:
+            for y0 in range(0, image.shape[0], 300):
+                writer.write_rows(image[y0:y0 + 300])
+        np.testing.assert_array_equal(cv2.imread(path, cv2.IMREAD_UNCHANGED), image)
+
+
+def test_cancelled_write_leaves_no_file(tmp_path, image, geometry):
+    path = tmp_path / "out.png"
+    with pytest.raises(engine.WarpCancelled):
+        tiled.write_warped(str(path), image, geometry, tile_size=TILE_SIZE, workers=2, is_cancelled=lambda: True)
+    assert not path.exists()
+
+
+def test_failing_write_leaves_no_file(tmp_path, image, geometry):
+    def fail(fraction):
+        raise OSError("disk full")
+
+    path = tmp_path / "out.png"
+    with pytest.raises(OSError, match="disk full"):
+        tiled.write_warped(str(path), image, geometry, tile_size=TILE_SIZE, on_progress=fail)
+    assert not path.exists()
+
+
+def test_short_png_is_an_error(tmp_path):
+    writer = tiled.PngStreamWriter(str(tmp_path / "out.png"), 10, 4, 1)
+    writer.write_rows(np.zeros((3, 10), dtype=np.uint8))
+    with pytest.raises(ValueError, match="expects 4 rows"):
+        writer.close()
@@ -1,8 +1,37 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
 from PIL import Image, ImageTk
-import cv2
 import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from perspective_core import calibration, detect, engine, image_io, measure, preview, refine, resolution, tiled
+from perspective_core.jobs import JobRunner
+from perspective_core.plans import WarpPlanCache
+from perspective_core.render import (HIGH_QUALITY_DELAY_MS, HIGH_QUALITY_RESAMPLE, PREVIEW_RESAMPLE, DisplayPyramid,
+                                     RenderCache, box_contains, visible_box)
+
+# Output scale of the rectified plane. The calibrated output grows with the perspective; beyond
+# max_megapixels it is scaled down (px/cm with it).
+RESOLUTION_POLICIES = {
+    "75 פיקסלים/ס\"מ": resolution.DEFAULT_POLICY,
+    "צפיפות המקור": resolution.SOURCE_DENSITY_POLICY,
+    "מהיר (עד 12MP)": resolution.SOURCE_DENSITY_POLICY._replace(max_megapixels=12),
+}
+
+# Measurement types offered in the UI
+MEASURE_KIND_LABELS = {"מרחק": measure.SEGMENT, "קו שבור": measure.POLYLINE, "שטח (מצולע)": measure.POLYGON}
+# A press this close (canvas pixels) to a reference point drags it instead of adding a point;
+# while dragging, the live preview inset is re-warped at most every LIVE_PREVIEW_INTERVAL_MS
+DRAG_HIT_RADIUS = 10
+LIVE_PREVIEW_INTERVAL_MS = 40
+# Render this fraction of the canvas size beyond each edge so short pans are just scrolls
+PAN_RENDER_MARGIN = 0.25
+# The window redraws once <Configure> events have stopped arriving for this long
+RESIZE_COALESCE_MS = 40
+# Memory for cached remap grids, reused when the same reference is corrected again
+PLAN_CACHE_BYTES = 256 * 2 ** 20
 
 
 class PerspectiveApp:
@@ -19,14 +48,60 @@ class PerspectiveApp:
 
         # Images and state
         self.image_path = None
+        # img_original_bgr starts as a reduced-resolution preview of source_image and is swapped for
+        # the full-resolution decode once it has loaded in the background. self.points are always in
+        # full-resolution coordinates; _source_scale is full-resolution px per img_original_bgr px.
+        self.source_image = None
+        self._source_scale = (1.0, 1.0)
         self.img_original_bgr = None
         self.img_transformed_bgr = None
         self.photo_img = None
+        self._displayed_img = None  # the array currently rasterized on the canvas
+        # Zoomed size of the displayed image and the part of it that is rasterized, in canvas pixels
+        self._zoomed_size = (0, 0)
+        self._rendered_box = None
+        # RGB pyramids of the original and rectified images plus recently rendered zoom levels
+        self.render_cache = RenderCache()
+        # Pending after() id of the high-quality redraw that follows fast zoom redraws
+        self._high_quality_render_id = None
+        # Coalescing of <Configure> bursts (see on_root_resize)
+        self._resize_after_id = None
+        self._canvas_size = (0, 0)
 
         self.points = []
+        # Index in self.points of the reference point being dragged, and the throttled live preview
+        self._drag_index = None
+        self._live_preview_after_id = None
+        self._live_preview_photo = None
+        # Measure points are in rectified pixels (self.homography maps full-resolution source pixels
+        # there), so they stay valid whichever view is on screen. measure_points is the measurement
+        # being clicked; finished ones are kept in self.measurements (a measure.MeasurementStore).
         self.measure_points = []
+        self.measurements = None
         self.calibrated = False
         self.scale = None
+        self.homography = None
+        # Calibration only computes the homography; the rectified image is warped on request. It is
+        # first shown as a quick preview warp, swapped for the full-resolution one when that is done;
+        # _rectified_scale is rectified px per img_transformed_bgr px, like _source_scale.
+        self._rectified_geometry = None
+        self._rectified_scale = (1.0, 1.0)
+        self._show_rectified = False
+        # The calibration.CalibrationProfile in use. A profile loaded from or saved to a file stays
+        # active and is applied to every image loaded after it, until a manual calibration.
+        self.calibration_profile = None
+        self.active_profile = None
+
+        # The perspective warp runs on a background thread (see do_perspective)
+        self.warp_runner = JobRunner()
+        self.warp_job = None
+        self._plan_cache = WarpPlanCache(PLAN_CACHE_BYTES)
+        self.load_runner = JobRunner()
+        self.load_job = None
+        self.detect_runner = JobRunner()
+        self.detect_job = None
+        # Builds the warp plan of a loaded profile in the background
+        self.plan_runner = JobRunner()
 
         # Control Frame
         control_frame = tk.Frame(root)
@@ -60,6 +135,43 @@ class PerspectiveApp:
                                         state=tk.DISABLED)
         self.measure_button.grid(row=0, column=4, padx=5, pady=2, rowspan=2, ipady=5)
 
+        self.view_button = tk.Button(control_frame, text="הצג תמונה מיושרת", command=self.toggle_rectified_view,
+                                     state=tk.DISABLED)
+        self.view_button.grid(row=0, column=5, padx=5, pady=2, rowspan=2, ipady=5)
+
+        self.detect_button = tk.Button(control_frame, text="זיהוי פינות אוטומטי", command=self.auto_detect_points,
+                                       state=tk.DISABLED)
+        self.detect_button.grid(row=0, column=6, padx=5, pady=2, rowspan=2, ipady=5)
+
+        self.cancel_button = tk.Button(control_frame, text="בטל עיבוד", command=self.cancel_perspective,
+                                       state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=7, padx=5, pady=2, rowspan=2, ipady=5)
+
+        self.measure_kind_var = tk.StringVar(value=next(iter(MEASURE_KIND_LABELS)))
+        self.measure_kind_var.trace_add("write", self._on_measure_kind_change)
+        tk.OptionMenu(control_frame, self.measure_kind_var, *MEASURE_KIND_LABELS).grid(row=0, column=9, padx=5,
+                                                                                      pady=2)
+        self.export_button = tk.Button(control_frame, text="ייצוא מדידות", command=self.export_measurements,
+                                       state=tk.DISABLED)
+        self.export_button.grid(row=1, column=9, padx=5, pady=2)
+
+        self.save_profile_button = tk.Button(control_frame, text="שמור פרופיל כיול", command=self.save_profile,
+                                             state=tk.DISABLED)
+        self.save_profile_button.grid(row=0, column=10, padx=5, pady=2)
+        self.load_profile_button = tk.Button(control_frame, text="טען פרופיל כיול", command=self.load_profile,
+                                             state=tk.DISABLED)
+        self.load_profile_button.grid(row=1, column=10, padx=5, pady=2)
+
+        tk.Label(control_frame, text="רזולוציית פלט:").grid(row=0, column=11, padx=5, pady=2)
+        self.resolution_var = tk.StringVar(value=next(iter(RESOLUTION_POLICIES)))
+        tk.OptionMenu(control_frame, self.resolution_var, *RESOLUTION_POLICIES).grid(row=1, column=11, padx=5,
+                                                                                    pady=2)
+
+        # Snap the four reference clicks to the nearest corner with sub-pixel precision
+        self.subpixel_refine_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(control_frame, text="דיוק תת-פיקסלי", variable=self.subpixel_refine_var).grid(
+            row=0, column=8, padx=5, pady=2, rowspan=2)
+
         self.status_bar = tk.Label(root, text="טען תמונה כדי להתחיל", bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
@@ -72,7 +184,10 @@ class PerspectiveApp:
         self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
         self.canvas.bind("<B2-Motion>", self.on_pan_move)
         self.canvas.bind("<ButtonRelease-2>", self.on_pan_end)
-        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Button-1>", self.on_canvas_press)
+        self.canvas.bind("<B1-Motion>", self.on_point_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_point_release)
+        self.canvas.bind("<Button-3>", self.finish_measurement)
         self.root.bind("<Configure>", self.on_root_resize)
 
         # Initial call to set button states correctly if app starts with some values (not typical here)
@@ -104,6 +219,12 @@ class PerspectiveApp:
 
         self.perspective_button.config(state=tk.NORMAL if can_do_perspective else tk.DISABLED)
         self.measure_button.config(state=tk.NORMAL if self.calibrated else tk.DISABLED)
+        self.view_button.config(state=tk.NORMAL if self.calibrated else tk.DISABLED,
+                                text="הצג תמונה מקורית" if self._show_rectified else "הצג תמונה מיושרת")
+        self.detect_button.config(state=tk.NORMAL if img_loaded and not self.calibrated else tk.DISABLED)
+        self.export_button.config(state=tk.NORMAL if self.measurements else tk.DISABLED)
+        self.save_profile_button.config(state=tk.NORMAL if self.calibrated else tk.DISABLED)
+        self.load_profile_button.config(state=tk.NORMAL if img_loaded else tk.DISABLED)
 
     def load_image(self):
         file_path = filedialog.askopenfilename(
@@ -113,18 +234,38 @@ class PerspectiveApp:
         if not file_path:
             return
 
-        img = cv2.imread(file_path)
-        if img is None:
+        self.cancel_perspective(update_status=False)
+        try:
+            source_image = image_io.PreviewImage(file_path)
+        except Exception:
             messagebox.showerror("שגיאה", "לא ניתן לטעון את התמונה. בדוק שהקובץ תקין ושהנתיב נכון.")
             return
 
+        self.load_runner.cancel()
+        self.load_job = None
+        self.detect_runner.cancel()
+        self.detect_job = None
+        if not source_image.full_loaded:
+            self.load_job = self.load_runner.submit(self._load_full_resolution, source_image)
+            self.root.after(100, self._poll_full_resolution, self.load_job)
+
+        self.render_cache.invalidate()
         self.image_path = file_path
-        self.img_original_bgr = img
+        self.source_image = source_image
+        self._source_scale = source_image.scale
+        self.img_original_bgr = source_image.preview
         self.img_transformed_bgr = None
         self.calibrated = False
         self.scale = None
+        self.homography = None
+        self._rectified_geometry = None
+        self._rectified_scale = (1.0, 1.0)
+        self._show_rectified = False
         self.points = []
+        self._live_preview_photo = None
         self.measure_points = []
+        self.measurements = None
+        self.calibration_profile = None
 
         # Clear entry fields when loading a new image
         self.width_cm_var.set("")
@@ -132,17 +273,54 @@ class PerspectiveApp:
 
         self.zoom = 1.0
         self.canvas.delete("all")
+        self._displayed_img = None
 
         self._update_status(f"תמונה נטענה: {file_path}. בחר 4 נקודות על אובייקט ייחוס והזן מידותיו.")
         self.display_image(self.img_original_bgr, fit_to_canvas=True)
+        if self.active_profile is not None:
+            # Same rig, next photo: calibrate from the profile without picking points.
+            self._apply_profile(self.active_profile)
         # _update_button_states() will be called by display_image via _redraw_annotations,
         # and also by StringVars being cleared if that happens after display_image starts.
         # Explicit call here ensures it reflects cleared entries immediately if needed.
         self._update_button_states()
 
-    def display_image(self, img_bgr_to_display, fit_to_canvas=False):
+    @staticmethod
+    def _load_full_resolution(source_image, on_progress=None, is_cancelled=None):
+        # Runs on the loader thread: decode the full image and its display pyramid off the UI thread.
+        full_image = source_image.full()
+        return full_image, DisplayPyramid(full_image)
+
+    def _poll_full_resolution(self, job):
+        if job is not self.load_job:  # another image was loaded meanwhile
+            return
+        if not job.done:
+            self.root.after(100, self._poll_full_resolution, job)
+            return
+        self.load_job = None
+        if job.error is not None:
+            # do_perspective decodes again and reports the error if the image is actually needed
+            return
+
+        full_image, pyramid = job.result
+        preview = self.img_original_bgr
+        self.render_cache.add_pyramid(full_image, pyramid)
+        self.render_cache.invalidate(preview)
+        self.img_original_bgr = full_image
+        if self._displayed_img is preview:
+            # Keep the same on-screen size: zoom is relative to the displayed array.
+            self.zoom /= self._source_scale[0]
+            self._source_scale = (1.0, 1.0)
+            self.display_image(full_image)
+        else:
+            self._source_scale = (1.0, 1.0)
+
+    def display_image(self, img_bgr_to_display, fit_to_canvas=False, fast=False):
+        # fast: interactive redraw with a cheap filter; a LANCZOS redraw follows once input is idle.
+        self._cancel_high_quality_render()
         if img_bgr_to_display is None:
             self.canvas.delete("all")
+            self._displayed_img = None
             self._update_status("אין תמונה להצגה.")
             # Ensure buttons are updated if no image is displayed
             if not hasattr(self, 'called_from_load_or_perspective'):  # Avoid redundant calls
@@ -166,34 +344,71 @@ class PerspectiveApp:
             self.zoom = min(scale_w, scale_h)
             self.zoom = max(self.min_zoom, min(self.zoom, self.max_zoom))
 
-        img_rgb = cv2.cvtColor(img_bgr_to_display, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
-
-        zoomed_w = int(img_w_orig * self.zoom)
-        zoomed_h = int(img_h_orig * self.zoom)
-
-        resampling_filter = Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.LANCZOS
-        img_resized_pil = pil_img.resize((zoomed_w, zoomed_h), resampling_filter)
+        zoomed_w = max(1, int(img_w_orig * self.zoom))
+        zoomed_h = max(1, int(img_h_orig * self.zoom))
 
-        self.photo_img = ImageTk.PhotoImage(img_resized_pil)
         self.canvas.delete("all")
+        # The scrollregion spans the whole zoomed image, but only its visible part (plus a pan margin)
+        # is resampled and rasterized; setting the scrollregion first confines the view to it.
         self.canvas.config(scrollregion=(0, 0, zoomed_w, zoomed_h))
-        self.canvas.create_image(0, 0, image=self.photo_img, anchor="nw", tags="displayed_image")
+        self._zoomed_size = (zoomed_w, zoomed_h)
+        self._rendered_box = visible_box(self._zoomed_size, self._view_top_left(), self._view_size(),
+                                         PAN_RENDER_MARGIN)
+        if self._rendered_box is None:
+            self.photo_img = None
+        else:
+            resampling_filter = PREVIEW_RESAMPLE if fast else HIGH_QUALITY_RESAMPLE
+            img_resized_pil = self.render_cache.render(img_bgr_to_display, self._zoomed_size, self._rendered_box,
+                                                       resampling_filter)
+            self.photo_img = ImageTk.PhotoImage(img_resized_pil)
+            self.canvas.create_image(self._rendered_box[0], self._rendered_box[1], image=self.photo_img,
+                                     anchor="nw", tags="displayed_image")
+        self._displayed_img = img_bgr_to_display
 
         self._redraw_annotations()  # This will call _update_button_states()
+        self._draw_live_preview()  # delete("all") above removed the inset too
 
         if hasattr(self, 'called_from_load_or_perspective'):
             del self.called_from_load_or_perspective
 
+        if fast:
+            self._high_quality_render_id = self.root.after(HIGH_QUALITY_DELAY_MS, self._render_high_quality)
+
+    def _view_top_left(self):
+        # Where the image's top-left corner sits relative to the window, as visible_box expects
+        return -self.canvas.canvasx(0), -self.canvas.canvasy(0)
+
+    def _view_size(self):
+        return self.canvas.winfo_width(), self.canvas.winfo_height()
+
+    def _cancel_high_quality_render(self):
+        # Newer input supersedes a pending high-quality redraw.
+        if self._high_quality_render_id is not None:
+            self.root.after_cancel(self._high_quality_render_id)
+            self._high_quality_render_id = None
+
+    def _current_image(self):
+        return self.img_transformed_bgr if self._show_rectified else self.img_original_bgr
+
+    def _render_high_quality(self):
+        self._high_quality_render_id = None
+        current_img = self._current_image()
+        if current_img is not None:
+            self.display_image(current_img)
+
     def _redraw_annotations(self):
         self.canvas.delete("annotation")
 
         marker_radius_canvas = 5
 
-        if not self.calibrated and self.img_original_bgr is not None:
+        # points are in full-resolution pixels; the canvas shows img_original_bgr at self.zoom
+        zoom_x = self.zoom / self._source_scale[0]
+        zoom_y = self.zoom / self._source_scale[1]
+
+        if not self._show_rectified and self.img_original_bgr is not None:
             for i, (x_orig, y_orig) in enumerate(self.points):
-                x_cv = x_orig * self.zoom
-                y_cv = y_orig * self.zoom
+                x_cv = x_orig * zoom_x
+                y_cv = y_orig * zoom_y
                 self.canvas.create_oval(x_cv - marker_radius_canvas, y_cv - marker_radius_canvas,
                                         x_cv + marker_radius_canvas, y_cv + marker_radius_canvas,
                                         outline='red', width=2, tags=("annotation", "perspective_point"))
@@ -204,52 +419,101 @@ class PerspectiveApp:
             if len(self.points) == 4:
                 poly_pts_scaled = []
                 for (x_orig, y_orig) in self.points:
-                    poly_pts_scaled.extend([x_orig * self.zoom, y_orig * self.zoom])
+                    poly_pts_scaled.extend([x_orig * zoom_x, y_orig * zoom_y])
                 self.canvas.create_polygon(poly_pts_scaled, outline='blue', fill='', width=2,
                                            tags=("annotation", "perspective_polygon"))
 
-        if self.calibrated and self.img_transformed_bgr is not None:
-            for i, (x_transformed, y_transformed) in enumerate(self.measure_points):
-                x_cv = x_transformed * self.zoom
-                y_cv = y_transformed * self.zoom
-                self.canvas.create_oval(x_cv - marker_radius_canvas, y_cv - marker_radius_canvas,
-                                        x_cv + marker_radius_canvas, y_cv + marker_radius_canvas,
-                                        outline='lime green', width=2, tags=("annotation", "measure_point"))
+        if self.calibrated and self.measurements is not None:
+            self._draw_measurements(marker_radius_canvas)
 
-            if len(self.measure_points) == 2:
-                p1_trans, p2_trans = self.measure_points[0], self.measure_points[1]
-                dist_px = np.hypot(p2_trans[0] - p1_trans[0], p2_trans[1] - p1_trans[1])
-                if self.scale is not None and self.scale > 0:  # Ensure scale is valid
-                    dist_cm = dist_px / self.scale
-                    dist_text = f"{dist_cm:.3f} ס\"מ"
-                else:
-                    dist_text = "שגיאת קנה מידה"
+        # Crucial: update button states after any potential change in points, calibration, etc.
+        self._update_button_states()
 
-                x1_cv, y1_cv = p1_trans[0] * self.zoom, p1_trans[1] * self.zoom
-                x2_cv, y2_cv = p2_trans[0] * self.zoom, p2_trans[1] * self.zoom
+    def _rectified_to_canvas(self, points):
+        # Back through the homography onto the original if it is on screen; segments stay straight.
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self._show_rectified:
+            return points * (self.zoom / self._rectified_scale[0], self.zoom / self._rectified_scale[1])
+        source_points = engine.map_points(np.linalg.inv(self.homography), points)
+        return source_points * (self.zoom / self._source_scale[0], self.zoom / self._source_scale[1])
+
+    def _draw_measurements(self, marker_radius_canvas):
+        lengths_cm, areas_cm2 = self.measurements.compute()
+        shapes = list(self.measurements.points) + [np.asarray(self.measure_points).reshape(-1, 2)]
+        # One homography pass for every point on screen
+        sizes = [len(points) for points in shapes]
+        canvas_shapes = np.split(self._rectified_to_canvas(np.concatenate(shapes)), np.cumsum(sizes)[:-1])
+
+        for i, (kind, canvas_points) in enumerate(zip(self.measurements.kinds, canvas_shapes)):
+            flat = canvas_points.ravel().tolist()
+            if kind == measure.POLYGON:
+                self.canvas.create_polygon(flat, outline='lime green', fill='', width=2,
+                                           tags=("annotation", "measure_line"))
+                text = f"{areas_cm2[i]:.3f} סמ\"ר"
+                text_x, text_y = canvas_points.mean(axis=0)
+            else:
+                self.canvas.create_line(flat, fill='lime green', width=2, tags=("annotation", "measure_line"))
+                text = f"{lengths_cm[i]:.3f} ס\"מ"
+                text_x, text_y = (canvas_points[-2] + canvas_points[-1]) / 2
+            self.canvas.create_text(text_x + 10, text_y, text=text, fill='lime green', font=('Arial', 14, 'bold'),
+                                    anchor='w', tags=("annotation", "measure_text"))
+
+        # The measurement being clicked: its points and the edges so far
+        current = canvas_shapes[-1]
+        if len(current) >= 2:
+            self.canvas.create_line(current.ravel().tolist(), fill='yellow', width=2, dash=(4, 2),
+                                    tags=("annotation", "measure_line"))
+        for x_cv, y_cv in current:
+            self.canvas.create_oval(x_cv - marker_radius_canvas, y_cv - marker_radius_canvas,
+                                    x_cv + marker_radius_canvas, y_cv + marker_radius_canvas,
+                                    outline='lime green', width=2, tags=("annotation", "measure_point"))
 
-                mid_x_cv = (x1_cv + x2_cv) / 2
-                mid_y_cv = (y1_cv + y2_cv) / 2
+    def order_points(self, pts):
+        return engine.order_points(pts)
+
+    def _refine_reference_points(self, indices=None):
+        # Refine on img_original_bgr, which may still be the reduced preview; indices limits it to
+        # some of the points (a dragged one), by default all are refined.
+        indices = range(len(self.points)) if indices is None else indices
+        scale_x, scale_y = self._source_scale
+        image_points = [(self.points[i][0] / scale_x, self.points[i][1] / scale_y) for i in indices]
+        refined = refine.refine_points(self.img_original_bgr, image_points, refine.window_for_scale(1 / self.zoom))
+        for i, (x, y) in zip(indices, refined):
+            self.points[i] = (float(x) * scale_x, float(y) * scale_y)
+
+    def auto_detect_points(self):
+        if self.source_image is None or self.calibrated:
+            return
+        self.detect_job = self.detect_runner.submit(self._detect_corners, self.source_image)
+        self._update_status("מזהה את פינות אובייקט הייחוס...")
+        self.root.after(50, self._poll_detection, self.detect_job)
 
-                self.canvas.create_line(x1_cv, y1_cv, x2_cv, y2_cv, fill='lime green', width=2,
-                                        tags=("annotation", "measure_line"))
-                self.canvas.create_text(mid_x_cv + 10, mid_y_cv, text=dist_text,
-                                        fill='lime green', font=('Arial', 14, 'bold'), anchor='w',
-                                        tags=("annotation", "measure_text"))
+    @staticmethod
+    def _detect_corners(source_image, on_progress=None, is_cancelled=None):
+        # Detection runs on a downscaled copy; only the corner refinement needs the full image.
+        return detect.detect_quad(source_image.full())
 
-        # Crucial: update button states after any potential change in points, calibration, etc.
-        self._update_button_states()
+    def _poll_detection(self, job):
+        if job is not self.detect_job:  # another image was loaded meanwhile
+            return
+        if not job.done:
+            self.root.after(50, self._poll_detection, job)
+            return
 
-    def order_points(self, pts):
-        rect = np.zeros((4, 2), dtype="float32")
-        s = pts.sum(axis=1)
-        rect[0] = pts[np.argmin(s)]
-        rect[2] = pts[np.argmax(s)]
+        self.detect_job = None
+        if self.calibrated:
+            return
+        detection = job.result
+        if job.error is not None or detection is None or detection.confidence < detect.DEFAULT_MIN_CONFIDENCE:
+            # Low confidence: the user marks the four points by hand as before.
+            self._update_status("לא זוהה אובייקט ייחוס בוודאות מספקת. בחר 4 נקודות ידנית.")
+            return
 
-        diff = np.diff(pts, axis=1)
-        rect[1] = pts[np.argmin(diff)]
-        rect[3] = pts[np.argmax(diff)]
-        return rect
+        self.points = [(float(x), float(y)) for x, y in detection.points]
+        self._redraw_annotations()
+        self._update_button_states()
+        self._update_status(f"זוהו 4 פינות (ודאות {detection.confidence:.0%}). "
+                            "הזן את מידות הייחוס ולחץ 'בצע תיקון פרספקטיבה'.")
 
     def do_perspective(self):
         if len(self.points) != 4:
@@ -266,110 +530,379 @@ class PerspectiveApp:
             messagebox.showerror("קלט לא חוקי", "מידות רוחב וגובה הייחוס חייבות להיות מספרים חיוביים.")
             return
 
-        src_pts_np = np.array(self.points, dtype=np.float32)
-        src_ordered = self.order_points(src_pts_np)
-
-        ref_obj_pixels_per_cm = 75.0
-        max_dim_ref_obj_px = 1500.0
+        # calibrated_geometry orders the points itself (see order_points)
+        policy = RESOLUTION_POLICIES[self.resolution_var.get()]
+        try:
+            profile = calibration.create_profile(None, self.points, w_cm, h_cm, self.source_image.full_size, policy)
+        except engine.DegenerateQuadError as e:
+            # Rejected before any warp: the points cannot define a homography
+            messagebox.showerror("נקודות לא תקינות", f"{e} סמן את נקודות הייחוס מחדש.")
+            return
+        # A manual calibration replaces the profile that was being applied to new images
+        self.active_profile = None
+        self._set_calibration(profile)
+        self._update_status(f"כיול הושלם. קנה מידה: {self.scale:.3f} פיקסלים/ס\"מ. בחר 2 נקודות למדידת מרחק, "
+                            f"או לחץ 'הצג תמונה מיושרת' ({self._output_estimate_text()}).")
+
+    def _set_calibration(self, profile):
+        # Calibration is just the homography and the scale: measurements map clicks on the original
+        # through it, and the rectified image is only warped if the user asks to see it.
+        self.cancel_perspective(update_status=False)
+        self.calibration_profile = profile
+        self._live_preview_photo = None
+        self.canvas.delete("live_preview")
+        self._rectified_geometry = calibration.profile_geometry(profile)
+        self.img_transformed_bgr = None
+        self._rectified_scale = (1.0, 1.0)
+        self.calibrated = True
+        self.homography = profile.matrix
+        self.scale = profile.pixels_per_cm
+        self.measure_points = []
+        self.measurements = measure.MeasurementStore(self.scale, self.homography)
+        if self._show_rectified:
+            self._show_rectified = False
+            self.display_image(self.img_original_bgr, fit_to_canvas=True)
 
-        if w_cm > 0: ref_obj_pixels_per_cm = min(ref_obj_pixels_per_cm, max_dim_ref_obj_px / w_cm)
-        if h_cm > 0: ref_obj_pixels_per_cm = min(ref_obj_pixels_per_cm, max_dim_ref_obj_px / h_cm)
+        self.enable_measure_mode()
 
-        rect_w_px = int(round(w_cm * ref_obj_pixels_per_cm))
-        rect_h_px = int(round(h_cm * ref_obj_pixels_per_cm))
+    def _output_estimate_text(self):
+        estimate = resolution.estimate(self._rectified_geometry, self.scale, self.source_image.full_size)
+        width, height = estimate.size
+        return (f"פלט: {width}x{height}, {estimate.megapixels:.1f}MP, {estimate.output_bytes / 2 ** 20:.0f}MB, "
+                f"כ-{estimate.warp_seconds:.1f} שניות")
+
+    def _apply_profile(self, profile):
+        profile = calibration.fit_profile(profile, self.source_image.full_size)
+        self.points = [tuple(p) for p in profile.points]
+        self.width_cm_var.set(f"{profile.width_cm:g}")
+        self.height_cm_var.set(f"{profile.height_cm:g}")
+        self._set_calibration(profile)
+        # The plan makes "הצג תמונה מיושרת" a single remap on this and every later image of the rig
+        self.plan_runner.submit(self._prepare_plan, profile, self._plan_cache)
+        self._update_status(f"פרופיל הכיול '{profile.name}' הוחל. קנה מידה: {self.scale:.3f} פיקסלים/ס\"מ. "
+                            f"בחר 2 נקודות למדידת מרחק ({self._output_estimate_text()}).")
+
+    @staticmethod
+    def _prepare_plan(profile, plan_cache, on_progress=None, is_cancelled=None):
+        return calibration.prepare_plan(profile, plan_cache)
+
+    def save_profile(self):
+        if not self.calibrated:
+            return
+        name = simpledialog.askstring("שמירת פרופיל כיול", "שם הפרופיל:", parent=self.root,
+                                      initialvalue=self.calibration_profile.name or "")
+        if not name:
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="שמירת פרופיל כיול", initialfile="calibration_profiles.json", defaultextension=".json",
+            confirmoverwrite=False, filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        profile = self.calibration_profile._replace(name=name)
+        try:
+            calibration.save_profile(file_path, profile)
+        except Exception as e:
+            messagebox.showerror("שגיאה", f"שמירת פרופיל הכיול נכשלה: {e}")
+            return
+        self.calibration_profile = profile
+        self.active_profile = profile
+        self._update_status(f"פרופיל הכיול '{name}' נשמר ב: {file_path}. הוא יוחל על התמונות הבאות שייטענו.")
 
-        dst_rect_pts = np.array([
-            [0, 0],
-            [rect_w_px - 1, 0],
-            [rect_w_px - 1, rect_h_px - 1],
-            [0, rect_h_px - 1]
-        ], dtype=np.float32)
+    def load_profile(self):
+        file_path = filedialog.askopenfilename(
+            title="טעינת פרופיל כיול", filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            profiles = calibration.load_profiles(file_path)
+        except Exception as e:
+            messagebox.showerror("שגיאה", f"טעינת פרופילי הכיול נכשלה: {e}")
+            return
+        if not profiles:
+            messagebox.showwarning("שגיאה", "הקובץ אינו מכיל פרופילי כיול.")
+            return
 
-        M = cv2.getPerspectiveTransform(src_ordered, dst_rect_pts)
+        names = list(profiles)
+        name = names[-1]
+        if len(names) > 1:
+            name = simpledialog.askstring("טעינת פרופיל כיול", "פרופילים בקובץ: " + ", ".join(names) + "\nשם הפרופיל:",
+                                          parent=self.root, initialvalue=name)
+            if not name:
+                return
+            if name not in profiles:
+                messagebox.showwarning("שגיאה", f"אין פרופיל בשם '{name}'.")
+                return
+        self.active_profile = profiles[name]
+        self._apply_profile(self.active_profile)
 
-        h_orig, w_orig = self.img_original_bgr.shape[:2]
+    def toggle_rectified_view(self):
+        if not self.calibrated:
+            return
+        if self._show_rectified:
+            self._show_rectified = False
+            self.display_image(self.img_original_bgr, fit_to_canvas=True)
+            return
+        self._show_rectified = True
+        if self.img_transformed_bgr is None:
+            # Bilinear warp of the reduced decode: on screen in milliseconds, good enough to check the points.
+            self.img_transformed_bgr, _ = preview.warp_preview(self.source_image.preview, self._rectified_geometry,
+                                                               self.source_image.full_size)
+            full_width, full_height = self._rectified_geometry.size
+            self._rectified_scale = (full_width / self.img_transformed_bgr.shape[1],
+                                     full_height / self.img_transformed_bgr.shape[0])
+        self.display_image(self.img_transformed_bgr, fit_to_canvas=True)
+        if self._rectified_scale == (1.0, 1.0) or self.warp_job is not None:
+            return  # full resolution already, or on its way
+
+        # The full-resolution warp follows in the background and replaces the preview when done.
+        self.warp_job = self.warp_runner.submit(self._warp_full_resolution, self.source_image,
+                                                self._rectified_geometry, self._plan_cache)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.root.config(cursor="watch")
+        self._update_status("תצוגה מקדימה. מחשב רזולוציה מלאה... 0%")
+        self.root.after(50, self._poll_perspective, self.warp_job)
+
+    @staticmethod
+    def _warp_full_resolution(source_image, geometry, plan_cache, on_progress=None, is_cancelled=None):
+        # Runs on the worker thread, so waiting for the full-resolution decode does not block the UI.
+        plan = plan_cache.plan_for(geometry)
+        if plan is not None:
+            return plan.apply(source_image.full(), on_progress=on_progress, is_cancelled=is_cancelled)
+        return tiled.warp_tiled(source_image.full(), geometry, on_progress=on_progress, is_cancelled=is_cancelled)
+
+    def _poll_perspective(self, job):
+        if job is not self.warp_job:  # superseded or cancelled; its result is discarded
+            return
+        if not job.done:
+            self._update_status(f"תצוגה מקדימה. מחשב רזולוציה מלאה... {job.progress * 100:.0f}%")
+            self.root.after(50, self._poll_perspective, job)
+            return
 
-        original_img_corners = np.array([
-            [0, 0], [w_orig - 1, 0],
-            [w_orig - 1, h_orig - 1], [0, h_orig - 1]
-        ], dtype=np.float32)
+        self.warp_job = None
+        self.cancel_button.config(state=tk.DISABLED)
+        self.root.config(cursor="")
+        if job.cancelled:
+            self._update_status("תיקון הפרספקטיבה בוטל.")
+            return
+        if job.error is not None:
+            messagebox.showerror("שגיאה", f"תיקון הפרספקטיבה נכשל: {job.error}")
+            self._update_status("תיקון הפרספקטיבה נכשל.")
+            return
 
-        original_img_corners_reshaped = original_img_corners.reshape(-1, 1, 2)
-        transformed_img_corners = cv2.perspectiveTransform(original_img_corners_reshaped, M)
+        preview_image = self.img_transformed_bgr
+        self.render_cache.invalidate(preview_image)
+        self.img_transformed_bgr = job.result
+        if self._show_rectified and self._displayed_img is preview_image:
+            # Keep the same on-screen size: zoom is relative to the displayed array.
+            self.zoom /= self._rectified_scale[0]
+            self._rectified_scale = (1.0, 1.0)
+            self.display_image(self.img_transformed_bgr)
+        else:
+            self._rectified_scale = (1.0, 1.0)
+        self._update_status(f"תצוגה מיושרת. קנה מידה: {self.scale:.3f} פיקסלים/ס\"מ. "
+                            "בחר 2 נקודות למדידת מרחק.")
 
-        min_x_transformed = np.min(transformed_img_corners[:, 0, 0])
-        max_x_transformed = np.max(transformed_img_corners[:, 0, 0])
-        min_y_transformed = np.min(transformed_img_corners[:, 0, 1])
-        max_y_transformed = np.max(transformed_img_corners[:, 0, 1])
+    def cancel_perspective(self, update_status=True):
+        if self.warp_job is None:
+            return
+        self.warp_runner.cancel()
+        self.warp_job = None
+        self.cancel_button.config(state=tk.DISABLED)
+        self.root.config(cursor="")
+        if update_status:
+            self._update_status("תיקון הפרספקטיבה בוטל.")
 
-        output_w_px = int(np.ceil(max_x_transformed - min_x_transformed))
-        output_h_px = int(np.ceil(max_y_transformed - min_y_transformed))
+    def enable_measure_mode(self):
+        if not self.calibrated:
+            messagebox.showwarning("נדרש כיול", "יש לבצע תיקון פרספקטיבה תחילה.")
+            return
+        self.measure_points = []
+        self.measurements.clear()
+        current_img = self._current_image()
+        if current_img is not None and current_img is not self._displayed_img:
+            self.display_image(current_img)
+        else:
+            # The image is already on the canvas; only the overlay changes.
+            self._redraw_annotations()
+        self._update_status(self._measure_prompt())
+        self._update_button_states()  # Ensure button states are correct
 
-        translation_matrix = np.array([
-            [1, 0, -min_x_transformed],
-            [0, 1, -min_y_transformed],
-            [0, 0, 1]
-        ], dtype=np.float32)
+    def _measure_kind(self):
+        return MEASURE_KIND_LABELS[self.measure_kind_var.get()]
 
-        M_final = translation_matrix @ M
+    def _measure_prompt(self):
+        if self._measure_kind() == measure.SEGMENT:
+            return "מצב מדידה פעיל. בחר 2 נקודות למדוד מרחק."
+        return "מצב מדידה פעיל. לחץ על נקודות הצורה וסיים בלחיצה ימנית."
 
-        self.img_transformed_bgr = cv2.warpPerspective(self.img_original_bgr, M_final, (output_w_px, output_h_px),
-                                                       flags=cv2.INTER_LANCZOS4, borderMode=cv2.BORDER_REPLICATE)
+    def _on_measure_kind_change(self, *args):
+        # A half-clicked measurement of the previous type is dropped.
+        self.measure_points = []
+        if self.calibrated:
+            self._redraw_annotations()
+            self._update_status(self._measure_prompt())
 
-        self.calibrated = True
-        self.scale = ref_obj_pixels_per_cm
+    def finish_measurement(self, event=None):
+        # Right click: close the polyline / polygon being clicked.
+        if not self.calibrated or not self.measure_points:
+            return
+        kind = self._measure_kind()
+        try:
+            index = self.measurements.add(kind, self.measure_points)
+        except ValueError:
+            self._update_status("אין מספיק נקודות: קו שבור דורש 2 נקודות לפחות ומצולע 3.")
+            return
         self.measure_points = []
+        self._redraw_annotations()
+        lengths_cm, areas_cm2 = self.measurements.compute()
+        if kind == measure.POLYGON:
+            self._update_status(f"שטח: {areas_cm2[index]:.3f} סמ\"ר, היקף: {lengths_cm[index]:.3f} ס\"מ. "
+                                f"({len(self.measurements)} מדידות)")
+        else:
+            self._update_status(f"אורך: {lengths_cm[index]:.3f} ס\"מ. ({len(self.measurements)} מדידות)")
 
-        self._update_status(f"פרספקטיבה תוקנה. קנה מידה: {self.scale:.3f} פיקסלים/ס\"מ. לחץ 'אפשר/אפס מדידה'.")
-        self.display_image(self.img_transformed_bgr, fit_to_canvas=True)
-        self.enable_measure_mode()
+    def export_measurements(self):
+        if not self.measurements:
+            return
+        base_name = os.path.splitext(os.path.basename(self.image_path))[0] if self.image_path else "image"
+        file_path = filedialog.asksaveasfilename(
+            title="ייצוא מדידות", initialfile=f"{base_name}_measurements.csv", defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            measure.export(file_path, self.measurements, os.path.basename(self.image_path or ""))
+        except Exception as e:
+            messagebox.showerror("שגיאה", f"ייצוא המדידות נכשל: {e}")
+            return
+        self._update_status(f"{len(self.measurements)} מדידות יוצאו ל: {file_path}")
 
-    def enable_measure_mode(self):
-        if not self.calibrated:
-            messagebox.showwarning("נדרש כיול", "יש לבצע תיקון פרספקטיבה תחילה.")
+    def on_canvas_press(self, event):
+        # Before calibration a press on a reference point grabs it; anything else is a click.
+        index = self._find_point_near(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if index is None:
+            self.on_canvas_click(event)
             return
-        self.measure_points = []
-        current_img = self.img_transformed_bgr if self.calibrated else self.img_original_bgr
-        if current_img is not None:
-            self.display_image(current_img)
-        self._update_status("מצב מדידה פעיל. בחר 2 נקודות למדוד מרחק.")
-        self._update_button_states()  # Ensure button states are correct
+        self._drag_index = index
+        self.canvas.config(cursor="fleur")
+
+    def _find_point_near(self, canvas_x, canvas_y):
+        if self.calibrated or self._show_rectified or not self.points:
+            return None
+        zoom = np.array([self.zoom / self._source_scale[0], self.zoom / self._source_scale[1]])
+        distances = np.hypot(*(np.asarray(self.points) * zoom - (canvas_x, canvas_y)).T)
+        index = int(np.argmin(distances))
+        return index if distances[index] <= DRAG_HIT_RADIUS else None
+
+    def on_point_drag(self, event):
+        if self._drag_index is None or self._drag_index >= len(self.points):
+            return
+        # Keep the point on the image
+        h_disp, w_disp = self.img_original_bgr.shape[:2]
+        disp_x = min(max(self.canvas.canvasx(event.x) / self.zoom, 0), w_disp - 1)
+        disp_y = min(max(self.canvas.canvasy(event.y) / self.zoom, 0), h_disp - 1)
+        self.points[self._drag_index] = (disp_x * self._source_scale[0], disp_y * self._source_scale[1])
+        self._redraw_annotations()  # only the markers and the polygon; the image is not redrawn
+        if len(self.points) == 4 and self._live_preview_after_id is None:
+            self._live_preview_after_id = self.root.after(LIVE_PREVIEW_INTERVAL_MS, self._render_live_preview)
+
+    def on_point_release(self, event):
+        if self._drag_index is None:
+            return
+        index, self._drag_index = self._drag_index, None
+        self.canvas.config(cursor="cross")
+        if len(self.points) != 4:
+            return
+        if self.subpixel_refine_var.get():
+            # Only the dragged point moved; refining the others again would shift them once more
+            self._refine_reference_points([index])
+            self._redraw_annotations()
+        if self._live_preview_after_id is not None:
+            self.root.after_cancel(self._live_preview_after_id)
+        self._render_live_preview()
+        try:
+            engine.normalize_quad(self.points)
+        except engine.DegenerateQuadError as e:
+            self._update_status(f"{e} גרור את נקודות הייחוס למקומן.")
+            return
+        self._update_status("נקודת הייחוס הוזזה. הזן מידות ולחץ 'בצע תיקון פרספקטיבה'.")
+
+    def _render_live_preview(self):
+        # The reference straightened from the reduced decode at inset size: a few ms per update.
+        self._live_preview_after_id = None
+        self._live_preview_photo = None
+        if len(self.points) == 4 and not self.calibrated and self.source_image is not None:
+            image = preview.quad_preview(self.source_image.preview, self.points, self.source_image.full_size)
+            if image is not None:  # None for a degenerate quad mid-drag; the inset returns once it is valid
+                self._live_preview_photo = ImageTk.PhotoImage(Image.fromarray(image[:, :, ::-1]))
+        self._draw_live_preview()
+
+    def _draw_live_preview(self):
+        # Also called after every display_image, which clears the whole canvas.
+        self.canvas.delete("live_preview")
+        if self._live_preview_photo is None or self._show_rectified:
+            return
+        width, height = self._live_preview_photo.width(), self._live_preview_photo.height()
+        # In the top-left corner of the visible part of the scrolled canvas
+        x0, y0 = self.canvas.canvasx(10), self.canvas.canvasy(10)
+        self.canvas.create_rectangle(x0 - 2, y0 - 2, x0 + 2 + width, y0 + 2 + height, fill="white", outline="blue",
+                                     width=2, tags="live_preview")
+        self.canvas.create_image(x0, y0, image=self._live_preview_photo, anchor="nw", tags="live_preview")
 
     def on_canvas_click(self, event):
-        current_img_displaying = self.img_transformed_bgr if self.calibrated else self.img_original_bgr
+        current_img_displaying = self._current_image()
         if current_img_displaying is None:
             return
 
-        img_x_coord = int(self.canvas.canvasx(event.x) / self.zoom)
-        img_y_coord = int(self.canvas.canvasy(event.y) / self.zoom)
+        disp_x = self.canvas.canvasx(event.x) / self.zoom
+        disp_y = self.canvas.canvasy(event.y) / self.zoom
 
         h_disp, w_disp = current_img_displaying.shape[:2]
-        if not (0 <= img_x_coord < w_disp and 0 <= img_y_coord < h_disp):
+        if not (0 <= disp_x < w_disp and 0 <= disp_y < h_disp):
             return
 
+        # The original may still be shown as a reduced preview; points are stored at full resolution.
+        scale_x, scale_y = self._source_scale
+
         if not self.calibrated:
             if len(self.points) >= 4:
                 messagebox.showinfo("מידע", "נבחרו 4 נקודות. לחץ 'בצע תיקון פרספקטיבה' או טען תמונה מחדש לאיפוס.")
                 # No change to points, button state will remain based on current entries
                 self._update_button_states()  # Re-check in case entries changed without focus out
                 return
-            self.points.append((img_x_coord, img_y_coord))
+            # Reference points stay unrounded: they set the px/cm scale of every measurement.
+            self.points.append((disp_x * scale_x, disp_y * scale_y))
             if len(self.points) == 4:
+                if self.subpixel_refine_var.get():
+                    self._refine_reference_points()
                 self._update_status("נבחרו 4 נקודות. הזן מידות ולחץ 'בצע תיקון פרספקטיבה'.")
             else:
                 self._update_status(f"נבחרה נקודה {len(self.points)}/4. בחר נקודות נוספות.")
         else:
-            if len(self.measure_points) >= 2:
-                self.measure_points = []
-
-            self.measure_points.append((img_x_coord, img_y_coord))
-            if len(self.measure_points) == 1:
+            if self._show_rectified:
+                measure_point = (disp_x * self._rectified_scale[0], disp_y * self._rectified_scale[1])
+            else:
+                measure_point = engine.map_points(self.homography, [(disp_x * scale_x, disp_y * scale_y)])[0]
+                if np.isnan(measure_point).any():
+                    self._update_status("הנקודה נמצאת מעבר לקו האופק של מישור הייחוס ואינה ניתנת למדידה.")
+                    return
+                measure_point = (float(measure_point[0]), float(measure_point[1]))
+            self.measure_points.append(measure_point)
+            if self._measure_kind() == measure.SEGMENT and len(self.measure_points) == 2:
+                # A distance is complete after two points; earlier ones stay on screen.
+                self.finish_measurement()
+                return
+            if len(self.measure_points) == 1 and self._measure_kind() == measure.SEGMENT:
                 self._update_status("נקודה ראשונה למדידה נבחרה. בחר נקודה שנייה.")
-            elif len(self.measure_points) == 2:
-                self._update_status("מדידה הושלמה. לחץ שוב להתחלת מדידה חדשה.")
+            else:
+                self._update_status(f"נבחרו {len(self.measure_points)} נקודות. לחיצה ימנית מסיימת את הצורה.")
 
-        # display_image will call _redraw_annotations, which calls _update_button_states
-        self.display_image(current_img_displaying)
+        # Only the overlay changed: redraw the "annotation" items, not the image.
+        # _redraw_annotations also calls _update_button_states.
+        self._redraw_annotations()
 
     def on_mousewheel(self, event):
         if self.img_original_bgr is None and self.img_transformed_bgr is None: return  # Check if any image is loaded
@@ -384,9 +917,9 @@ class PerspectiveApp:
         new_zoom = self.zoom * factor
         self.zoom = max(self.min_zoom, min(new_zoom, self.max_zoom))
 
-        current_img = self.img_transformed_bgr if self.calibrated else self.img_original_bgr
+        current_img = self._current_image()
         if current_img is not None:
-            self.display_image(current_img)
+            self.display_image(current_img, fast=True)
 
     def on_pan_start(self, event):
         self.canvas.scan_mark(event.x, event.y)
@@ -394,14 +927,37 @@ class PerspectiveApp:
 
     def on_pan_move(self, event):
         self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.canvas.moveto("live_preview", self.canvas.canvasx(8), self.canvas.canvasy(8))
+        # Scrolling only moves the view; re-render once it leaves the pre-rendered margin.
+        needed_box = visible_box(self._zoomed_size, self._view_top_left(), self._view_size())
+        if self._displayed_img is not None and not box_contains(self._rendered_box, needed_box):
+            self.display_image(self._displayed_img, fast=True)
 
     def on_pan_end(self, event):
         self.canvas.config(cursor="cross")
 
     def on_root_resize(self, event=None):
-        current_img = self.img_transformed_bgr if self.calibrated else self.img_original_bgr
+        # Bound on the root, so Tk also delivers <Configure> for every child widget; ignore those.
+        if event is not None and event.widget is not self.root:
+            return
+        # A drag-resize fires an event per pixel: every event pushes the redraw back, so only one
+        # happens, after the size has settled.
+        if self._resize_after_id is not None:
+            self.root.after_cancel(self._resize_after_id)
+        self._resize_after_id = self.root.after(RESIZE_COALESCE_MS, self._apply_root_resize)
+
+    def _apply_root_resize(self):
+        self._resize_after_id = None
+        canvas_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        if canvas_size == self._canvas_size:
+            return  # moved, or a child changed, but the canvas kept its size
+        self._canvas_size = canvas_size
+
+        # The visible box changed with the canvas size: fast redraw now, the LANCZOS pass once
+        # the window has been still for HIGH_QUALITY_DELAY_MS.
+        current_img = self._current_image()
         if current_img is not None:
-            self.display_image(current_img, fit_to_canvas=False)
+            self.display_image(current_img, fit_to_canvas=False, fast=True)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,31 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, Menu, ttk
 from PIL import Image, ImageTk
-import cv2
-import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from perspective_core import detect, encode, engine, image_io, preview, refine, stream, tiled
+from perspective_core.jobs import JobRunner
+from perspective_core.plans import WarpPlanCache
+from perspective_core.render import (HIGH_QUALITY_DELAY_MS, HIGH_QUALITY_RESAMPLE, PREVIEW_RESAMPLE, DisplayPyramid,
+                                     RenderCache, box_contains, visible_box)
+
+
+# Render this fraction of the canvas size beyond each edge so short pans are just canvas moves
+PAN_RENDER_MARGIN = 0.25
+# The window redraws once <Configure> events have stopped arriving for this long
+RESIZE_COALESCE_MS = 40
+# Larger warp outputs (e.g. a full transform with strong perspective) are scaled down to this size
+MAX_OUTPUT_MEGAPIXELS = 150
+# Memory for cached remap grids, reused when the same points are processed again
+PLAN_CACHE_BYTES = 256 * 2 ** 20
+# A press this close (canvas pixels) to a marked point drags it instead of marking a new one
+DRAG_HIT_RADIUS = 10
+# While dragging, the live preview inset is re-warped at most this often
+LIVE_PREVIEW_INTERVAL_MS = 40
+# Encoder settings for "שמור תמונה"; large PNGs are streamed and compressed on all cores
+SAVE_OPTIONS = encode.SaveOptions(png_compression=3, jpeg_quality=95, jpeg_optimize=True)
 
 
 class PerspectiveCorrectionApp:
@@ -24,6 +46,11 @@ class PerspectiveCorrectionApp:
         self.master.option_add('*TCombobox*Listbox.font', ('Arial', 10))
 
         self.image_path = None
+        # original_image_cv starts as a reduced-resolution preview of source_image and is swapped
+        # for the full-resolution decode once it has loaded in the background. points are always
+        # in full-resolution (source_size) coordinates.
+        self.source_image = None
+        self.source_size = None
         self.original_image_cv = None
         self.processed_image_cv = None
         self.points = []
@@ -31,6 +58,10 @@ class PerspectiveCorrectionApp:
         self.display_image_pil = None
         self.canvas_dots = []
         self.dot_numbers = []
+        # Index in points of the marker being dragged, and the throttled live preview of the quad
+        self.drag_index = None
+        self.live_preview_after_id = None
+        self.live_preview_photo = None
 
         # New: Define prompts for point marking order
         self.point_prompts = ["שמאל למעלה", "ימין למעלה", "ימין למטה", "שמאל למטה"]
@@ -44,6 +75,24 @@ class PerspectiveCorrectionApp:
         self.marking_mode_active = False
 
         self.full_transform_fit_to_frame_var = tk.BooleanVar(value=True)
+        # Snap the four clicks to the nearest corner with sub-pixel precision once all are marked
+        self.subpixel_refine_var = tk.BooleanVar(value=False)
+
+        # Warps run on a background thread; a new request supersedes the running one.
+        self.warp_runner = JobRunner()
+        self.warp_job = None
+        self.plan_cache = WarpPlanCache(PLAN_CACHE_BYTES)
+        self.load_runner = JobRunner()
+        self.load_job = None
+        self.detect_runner = JobRunner()
+        self.detect_job = None
+        # Saves are encoded in the background too, so the window stays usable while a large PNG is written.
+        # Each save runs on its own JobRunner: a second save must not cancel one that is still encoding.
+        self.save_jobs = []
+        # While processed_image_cv is only a preview warp: the full-resolution geometry it shows, and
+        # the (done status, error title, error status) texts for when it is computed.
+        self.pending_geometry = None
+        self.pending_texts = None
 
         main_frame = ttk.Frame(master)
         main_frame.pack(expand=tk.YES, fill=tk.BOTH, padx=10, pady=5)
@@ -52,6 +101,7 @@ class PerspectiveCorrectionApp:
         filemenu = Menu(menubar, tearoff=0)
         filemenu.add_command(label="טען תמונה", command=self.open_image)
         filemenu.add_command(label="שמור תמונה מעובדת", command=self.save_image)
+        filemenu.add_command(label="ייצוא נקודות...", command=self.export_points)
         filemenu.add_command(label="אפס נקודות ותצוגה", command=lambda: self.reset_points(update_status=True,
                                                                                           reset_view_and_mode=True))
         filemenu.add_separator()
@@ -74,6 +124,9 @@ class PerspectiveCorrectionApp:
         )
         self.chk_full_transform_mode.pack(side=tk.RIGHT, padx=(5, 15), pady=5)
 
+        self.chk_subpixel_refine = ttk.Checkbutton(toolbar, text="דיוק תת-פיקסלי", variable=self.subpixel_refine_var)
+        self.chk_subpixel_refine.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
+
         self.btn_process_full = ttk.Button(toolbar, text="עוות תמונה מלאה", command=self.process_image_full_transform,
                                            state=tk.DISABLED)
         self.btn_process_full.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
@@ -82,9 +135,16 @@ class PerspectiveCorrectionApp:
                                            state=tk.DISABLED)
         self.btn_process_crop.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
 
+        self.btn_confirm_full = ttk.Button(toolbar, text="אשר ברזולוציה מלאה", command=self.confirm_full_resolution,
+                                           state=tk.DISABLED)
+        self.btn_confirm_full.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
+
         self.btn_toggle_marking_mode = ttk.Button(toolbar, text="התחל סימון", command=self.toggle_marking_mode)
         self.btn_toggle_marking_mode.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
 
+        self.btn_auto_detect = ttk.Button(toolbar, text="זיהוי פינות אוטומטי", command=self.auto_detect_points)
+        self.btn_auto_detect.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
+
         self.reset_btn = ttk.Button(toolbar, text="אפס נקודות", command=lambda: self.reset_points(update_status=True,
                                                                                                   reset_view_and_mode=True))
         self.reset_btn.pack(side=tk.RIGHT, padx=(5, 0), pady=5)
@@ -112,7 +172,9 @@ class PerspectiveCorrectionApp:
 
         self.canvas = tk.Canvas(canvas_frame, background="#f0f0f0", highlightthickness=0)
         self.canvas.pack(expand=tk.YES, fill=tk.BOTH)
-        self.canvas.bind("<Button-1>", self.add_point_on_canvas)
+        self.canvas.bind("<Button-1>", self.on_canvas_press)
+        self.canvas.bind("<B1-Motion>", self.drag_point)
+        self.canvas.bind("<ButtonRelease-1>", self.end_point_drag)
         self.canvas.bind("<MouseWheel>", self.zoom_image)
         self.canvas.bind("<Button-4>", self.zoom_image)
         self.canvas.bind("<Button-5>", self.zoom_image)
@@ -124,12 +186,24 @@ class PerspectiveCorrectionApp:
         status_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
         self.status_label = ttk.Label(status_frame, text="טען תמונה כדי להתחיל.", anchor=tk.E)
         self.status_label.pack(side=tk.RIGHT, fill=tk.X, padx=5, pady=2)
+        # Shown only while a warp is running
+        self.progress_bar = ttk.Progressbar(status_frame, mode="determinate", maximum=100, length=160)
+        self.btn_cancel_processing = ttk.Button(status_frame, text="בטל עיבוד", command=self.cancel_processing)
 
         self.canvas_width = 0
         self.canvas_height = 0
         self.displayed_image_width = 0
         self.displayed_image_height = 0
 
+        # RGB pyramids of the original and processed images plus recently rendered views
+        self.render_cache = RenderCache()
+        # Part of the displayed image currently rasterized on the canvas (displayed-image pixels)
+        self.rendered_box = None
+        # Pending after() id of the high-quality redraw that follows fast interactive redraws
+        self.high_quality_render_id = None
+        # Pending after() id of the coalesced redraw for a burst of <Configure> events
+        self.resize_after_id = None
+
         self.update_marking_mode_ui()
         self.master.bind("<Configure>", self.on_window_resize)
         self.master.after(200, self.show_welcome_message_if_first_time)
@@ -251,17 +325,31 @@ class PerspectiveCorrectionApp:
         self.pan_start_y = event.y
 
     def pan_image_motion(self, event):
-        if self.image_on_canvas:
-            dx = event.x - self.pan_start_x
-            dy = event.y - self.pan_start_y
-            self.canvas_image_x_offset += dx
-            self.canvas_image_y_offset += dy
-            current_image = self.get_current_image_to_display()
-            if current_image is not None:
-                redraw_dots = self.get_current_image_to_display() is self.original_image_cv or self.marking_mode_active
-                self.display_cv_image(current_image, clear_dots=False, redraw_existing_dots=redraw_dots)
-            self.pan_start_x = event.x
-            self.pan_start_y = event.y
+        current_image = self.get_current_image_to_display()
+        if current_image is None:
+            return
+        dx = event.x - self.pan_start_x
+        dy = event.y - self.pan_start_y
+        self.canvas_image_x_offset += dx
+        self.canvas_image_y_offset += dy
+        self.pan_start_x = event.x
+        self.pan_start_y = event.y
+
+        # Panning only moves canvas items; re-render once the view leaves the pre-rendered margin.
+        needed_box = visible_box((self.displayed_image_width, self.displayed_image_height),
+                                 self.get_image_top_left_on_canvas(), (self.canvas_width, self.canvas_height))
+        if box_contains(self.rendered_box, needed_box):
+            self.canvas.move("all", dx, dy)
+            self.canvas.move("live_preview", -dx, -dy)  # the inset stays in the canvas corner
+            if self.high_quality_render_id is not None:  # still moving: keep deferring the LANCZOS pass
+                self.schedule_high_quality_render()
+        else:
+            redraw_dots = current_image is self.original_image_cv or self.marking_mode_active
+            self.display_cv_image(current_image, clear_dots=False, redraw_existing_dots=redraw_dots, fast=True)
+
+    def get_image_top_left_on_canvas(self):
+        return ((self.canvas_width / 2 + self.canvas_image_x_offset) - self.displayed_image_width / 2,
+                (self.canvas_height / 2 + self.canvas_image_y_offset) - self.displayed_image_height / 2)
 
     def pan_image_end(self, event):
         self.canvas.config(cursor="")
@@ -310,7 +398,7 @@ class PerspectiveCorrectionApp:
                 new_displayed_height / 2) - new_y_on_displayed_img
 
         redraw_dots = self.get_current_image_to_display() is self.original_image_cv or self.marking_mode_active
-        self.display_cv_image(current_img_for_zoom, clear_dots=False, redraw_existing_dots=redraw_dots)
+        self.display_cv_image(current_img_for_zoom, clear_dots=False, redraw_existing_dots=redraw_dots, fast=True)
 
     def get_current_image_to_display(self):
         if self.processed_image_cv is not None and not self.points:
@@ -320,15 +408,33 @@ class PerspectiveCorrectionApp:
         return None
 
     def on_window_resize(self, event=None):
-        if self.canvas.winfo_width() <= 1 or self.canvas.winfo_height() <= 1:
-            self.master.after(50, self.on_window_resize)
+        # Bound on the root, so Tk also delivers <Configure> for every child widget; ignore those.
+        if event is not None and event.widget is not self.master:
             return
-        self.canvas_width = self.canvas.winfo_width()
-        self.canvas_height = self.canvas.winfo_height()
+        # A drag-resize fires an event per pixel: every event pushes the redraw back, so only one
+        # happens, after the size has settled.
+        if self.resize_after_id is not None:
+            self.master.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.master.after(RESIZE_COALESCE_MS, self.apply_window_resize)
+
+    def apply_window_resize(self):
+        self.resize_after_id = None
+        new_width = self.canvas.winfo_width()
+        new_height = self.canvas.winfo_height()
+        if new_width <= 1 or new_height <= 1:
+            self.resize_after_id = self.master.after(50, self.apply_window_resize)
+            return
+        if (new_width, new_height) == (self.canvas_width, self.canvas_height):
+            return  # moved, or a child changed, but the canvas kept its size
+
+        self.canvas_width = new_width
+        self.canvas_height = new_height
+        # Fast redraw now; display_cv_image schedules the LANCZOS pass once resizing stops.
         current_image_to_resize = self.get_current_image_to_display()
         if current_image_to_resize is not None:
             redraw_dots = self.get_current_image_to_display() is self.original_image_cv or self.marking_mode_active
-            self.display_cv_image(current_image_to_resize, clear_dots=False, redraw_existing_dots=redraw_dots)
+            self.display_cv_image(current_image_to_resize, clear_dots=False, redraw_existing_dots=redraw_dots,
+                                  fast=True)
 
     def open_image(self):
         path = filedialog.askopenfilename(
@@ -336,12 +442,18 @@ class PerspectiveCorrectionApp:
             filetypes=(("קבצי תמונה", "*.png;*.jpg;*.jpeg;*.bmp;*.gif;*.tiff;*.JFIF"), ("כל הקבצים", "*.*"))
         )
         if path:
+            self.cancel_processing(update_status=False)
+            self.load_runner.cancel()
+            self.load_job = None
             self.image_path = path
             try:
-                img_array = np.fromfile(path, np.uint8)
-                self.original_image_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                if self.original_image_cv is None:
-                    raise ValueError("לא ניתן לטעון את התמונה.")
+                self.render_cache.invalidate()
+                self.source_image = image_io.PreviewImage(path)
+                self.source_size = self.source_image.full_size
+                self.original_image_cv = self.source_image.preview
+                if not self.source_image.full_loaded:
+                    self.load_job = self.load_runner.submit(self.load_full_resolution, self.source_image)
+                    self.master.after(100, self.poll_full_resolution, self.load_job)
 
                 self.processed_image_cv = None
                 self.zoom_factor = 1.0
@@ -366,16 +478,46 @@ class PerspectiveCorrectionApp:
             except Exception as e:
                 messagebox.showerror("שגיאה בפתיחת תמונה", f"אירעה שגיאה: {e}", parent=self.master)
                 self.status_label.config(text="שגיאה בטעינת התמונה. נסה שוב.")
+                self.source_image = None
+                self.source_size = None
                 self.original_image_cv = None
                 self.disable_processing_buttons()
                 self.marking_mode_active = False
                 self.update_marking_mode_ui()
 
-    def display_cv_image(self, cv_image, clear_dots=True, redraw_existing_dots=False):
+    @staticmethod
+    def load_full_resolution(source_image, on_progress=None, is_cancelled=None):
+        # Runs on the loader thread: decode the full image and its display pyramid off the UI thread.
+        full_image = source_image.full()
+        return full_image, DisplayPyramid(full_image)
+
+    def poll_full_resolution(self, job):
+        if job is not self.load_job:  # another image was opened meanwhile
+            return
+        if not job.done:
+            self.master.after(100, self.poll_full_resolution, job)
+            return
+        self.load_job = None
+        if job.error is not None:
+            # process_image_* decodes again and reports the error if the image is actually needed
+            return
+
+        full_image, pyramid = job.result
+        preview = self.original_image_cv
+        self.render_cache.add_pyramid(full_image, pyramid)
+        self.render_cache.invalidate(preview)
+        self.original_image_cv = full_image
+        if self.get_current_image_to_display() is full_image:
+            self.display_cv_image(full_image, clear_dots=False, redraw_existing_dots=True)
+
+    def display_cv_image(self, cv_image, clear_dots=True, redraw_existing_dots=False, fast=False):
+        # fast: interactive redraw with a cheap filter; a LANCZOS redraw follows once input is idle.
+        self.cancel_high_quality_render()
         if cv_image is None:
             self.canvas.delete("all")
             self.image_on_canvas = None
             self.display_image_pil = None
+            self.rendered_box = None
             self.displayed_image_width = 0
             self.displayed_image_height = 0
             if clear_dots:
@@ -389,16 +531,14 @@ class PerspectiveCorrectionApp:
             self.canvas_dots = []
             self.dot_numbers = []
 
-        image_rgb = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-        pil_image_original_size = Image.fromarray(image_rgb)
-        img_original_width, img_original_height = pil_image_original_size.size
+        img_original_width, img_original_height = engine.image_size(cv_image)
 
         if self.canvas.winfo_width() <= 1 or self.canvas.winfo_height() <= 1:
             self.master.update_idletasks()
             self.canvas_width = self.canvas.winfo_width()
             self.canvas_height = self.canvas.winfo_height()
             if self.canvas_width <= 1 or self.canvas_height <= 1:
-                self.master.after(50, lambda: self.display_cv_image(cv_image, clear_dots, redraw_existing_dots))
+                self.master.after(50, lambda: self.display_cv_image(cv_image, clear_dots, redraw_existing_dots, fast))
                 return
 
         canvas_aspect_ratio = self.canvas_width / self.canvas_height if self.canvas_height > 0 else 1
@@ -416,25 +556,135 @@ class PerspectiveCorrectionApp:
         if self.displayed_image_width <= 0: self.displayed_image_width = 1
         if self.displayed_image_height <= 0: self.displayed_image_height = 1
 
-        try:
-            resized_pil_image = pil_image_original_size.resize(
-                (self.displayed_image_width, self.displayed_image_height),
-                Image.LANCZOS)
-        except ValueError:
-            resized_pil_image = pil_image_original_size.resize(
-                (self.displayed_image_width, self.displayed_image_height),
-                Image.NEAREST)
-
-        self.display_image_pil = ImageTk.PhotoImage(resized_pil_image)
+        # Only the visible part of the image (plus a pan margin) is resampled and rasterized.
+        displayed_size = (self.displayed_image_width, self.displayed_image_height)
+        top_left_x, top_left_y = self.get_image_top_left_on_canvas()
+        self.rendered_box = visible_box(displayed_size, (top_left_x, top_left_y),
+                                        (self.canvas_width, self.canvas_height), PAN_RENDER_MARGIN)
+
         self.canvas.delete("all")
-        center_x = self.canvas_width / 2 + self.canvas_image_x_offset
-        center_y = self.canvas_height / 2 + self.canvas_image_y_offset
-        self.image_on_canvas = self.canvas.create_image(center_x, center_y, anchor=tk.CENTER,
-                                                        image=self.display_image_pil)
+        if self.rendered_box is None:
+            self.display_image_pil = None
+            self.image_on_canvas = None
+        else:
+            resample = PREVIEW_RESAMPLE if fast else HIGH_QUALITY_RESAMPLE
+            try:
+                resized_pil_image = self.render_cache.render(cv_image, displayed_size, self.rendered_box, resample)
+            except ValueError:
+                resized_pil_image = self.render_cache.render(cv_image, displayed_size, self.rendered_box,
+                                                             Image.NEAREST)
+
+            self.display_image_pil = ImageTk.PhotoImage(resized_pil_image)
+            self.image_on_canvas = self.canvas.create_image(top_left_x + self.rendered_box[0],
+                                                            top_left_y + self.rendered_box[1], anchor=tk.NW,
+                                                            image=self.display_image_pil)
 
         if redraw_existing_dots or (
                 not clear_dots and self.points and self.get_current_image_to_display() is self.original_image_cv):
             self.redraw_dots_on_canvas()
+        self.draw_live_preview()  # delete("all") above removed the inset too
+
+        if fast:
+            self.schedule_high_quality_render()
+
+    def schedule_high_quality_render(self):
+        self.cancel_high_quality_render()
+        self.high_quality_render_id = self.master.after(HIGH_QUALITY_DELAY_MS, self.render_high_quality)
+
+    def cancel_high_quality_render(self):
+        # Newer input supersedes a pending high-quality redraw.
+        if self.high_quality_render_id is not None:
+            self.master.after_cancel(self.high_quality_render_id)
+            self.high_quality_render_id = None
+
+    def render_high_quality(self):
+        self.high_quality_render_id = None
+        current_image = self.get_current_image_to_display()
+        if current_image is None:
+            return
+        redraw_dots = current_image is self.original_image_cv or self.marking_mode_active
+        self.display_cv_image(current_image, clear_dots=False, redraw_existing_dots=redraw_dots)
+
+    def on_canvas_press(self, event):
+        # A press on a marker grabs it; anywhere else marks the next point.
+        index = self.find_point_near(event.x, event.y)
+        if index is None:
+            self.add_point_on_canvas(event)
+            return
+        self.drag_index = index
+        self.canvas.config(cursor="fleur")
+
+    def find_point_near(self, canvas_x, canvas_y):
+        if self.original_image_cv is None or self.get_current_image_to_display() is not self.original_image_cv:
+            return None
+        best, best_distance = None, DRAG_HIT_RADIUS ** 2
+        for i, dot_id in enumerate(self.canvas_dots):
+            x0, y0, x1, y1 = self.canvas.coords(dot_id)
+            distance = ((x0 + x1) / 2 - canvas_x) ** 2 + ((y0 + y1) / 2 - canvas_y) ** 2
+            if distance <= best_distance:
+                best, best_distance = i, distance
+        return best
+
+    def drag_point(self, event):
+        if self.drag_index is None or self.drag_index >= len(self.points):
+            return
+        top_left_x, top_left_y = self.get_image_top_left_on_canvas()
+        # Keep the point on the image
+        canvas_x = min(max(event.x, top_left_x), top_left_x + self.displayed_image_width - 1)
+        canvas_y = min(max(event.y, top_left_y), top_left_y + self.displayed_image_height - 1)
+        self.points[self.drag_index] = engine.display_to_image(
+            canvas_x - top_left_x, canvas_y - top_left_y,
+            (self.displayed_image_width, self.displayed_image_height), self.source_size, integer=False)
+
+        # Move the marker's two canvas items; the image itself is not redrawn
+        dot_radius = 6
+        self.canvas.coords(self.canvas_dots[self.drag_index], canvas_x - dot_radius, canvas_y - dot_radius,
+                           canvas_x + dot_radius, canvas_y + dot_radius)
+        self.canvas.coords(self.dot_numbers[self.drag_index], canvas_x, canvas_y)
+        if len(self.points) == 4 and self.live_preview_after_id is None:
+            self.live_preview_after_id = self.master.after(LIVE_PREVIEW_INTERVAL_MS, self.render_live_preview)
+
+    def end_point_drag(self, event):
+        if self.drag_index is None:
+            return
+        index, self.drag_index = self.drag_index, None
+        self.canvas.config(cursor="")
+        if len(self.points) != 4:
+            return
+        if self.subpixel_refine_var.get():
+            # Only the dragged point moved; refining the others again would shift them once more
+            self.refine_marked_points([index])
+        if self.live_preview_after_id is not None:
+            self.master.after_cancel(self.live_preview_after_id)
+        self.render_live_preview()
+        try:
+            engine.normalize_quad(self.points)
+        except engine.DegenerateQuadError as e:
+            self.disable_processing_buttons()
+            self.status_label.config(text=f"{e} גרור את הנקודות למקומן.")
+            return
+        self.enable_processing_buttons()
+        self.status_label.config(text="הנקודה הוזזה. בחר סוג עיבוד או המשך לגרור נקודות.")
+
+    def render_live_preview(self):
+        # The quad straightened from the reduced decode at inset size: a few ms per update.
+        self.live_preview_after_id = None
+        self.live_preview_photo = None
+        if len(self.points) == 4 and self.source_image is not None:
+            image = preview.quad_preview(self.source_image.preview, self.points, self.source_size)
+            if image is not None:  # None for a degenerate quad mid-drag; the inset returns once it is valid
+                self.live_preview_photo = ImageTk.PhotoImage(Image.fromarray(image[:, :, ::-1]))
+        self.draw_live_preview()
+
+    def draw_live_preview(self):
+        # Also called after every display_cv_image, which clears the whole canvas.
+        self.canvas.delete("live_preview")
+        if self.live_preview_photo is None:
+            return
+        width, height = self.live_preview_photo.width(), self.live_preview_photo.height()
+        self.canvas.create_rectangle(8, 8, 12 + width, 12 + height, fill="white", outline="#FF4500", width=2,
+                                     tags="live_preview")
+        self.canvas.create_image(10, 10, image=self.live_preview_photo, anchor=tk.NW, tags="live_preview")
 
     def add_point_on_canvas(self, event):
         if not self.marking_mode_active:
@@ -472,14 +722,12 @@ class PerspectiveCorrectionApp:
         x_on_displayed_img = canvas_click_x - img_actual_display_top_left_x
         y_on_displayed_img = canvas_click_y - img_actual_display_top_left_y
 
-        current_img_for_coords = self.original_image_cv
-        if current_img_for_coords is None: return
+        if self.original_image_cv is None: return
 
-        original_height_cv, original_width_cv = current_img_for_coords.shape[:2]
-        original_x = int((
-                                 x_on_displayed_img / self.displayed_image_width) * original_width_cv) if self.displayed_image_width > 0 else 0
-        original_y = int((
-                                 y_on_displayed_img / self.displayed_image_height) * original_height_cv) if self.displayed_image_height > 0 else 0
+        # Full-resolution coordinates, even while only the preview is decoded; kept unrounded
+        original_x, original_y = engine.display_to_image(
+            x_on_displayed_img, y_on_displayed_img,
+            (self.displayed_image_width, self.displayed_image_height), self.source_size, integer=False)
 
         self.points.append((original_x, original_y))
         # point_number is the count of points *after* adding the current one (1, 2, 3, or 4)
@@ -512,11 +760,33 @@ class PerspectiveCorrectionApp:
                      f"כעת סמן: {self.point_prompts[next_point_to_mark_idx]}.")
         else:  # point_number == 4
             point_just_marked_description = self.point_prompts[point_number - 1]  # Last point marked (index 3)
+            if self.subpixel_refine_var.get():
+                self.refine_marked_points()
+            self.marking_mode_active = False
+            self.update_marking_mode_ui()
+            try:
+                engine.normalize_quad(self.points)
+            except engine.DegenerateQuadError as e:
+                # Caught at the click, so no warp is ever started on these points
+                self.status_label.config(text=f"{e} אפס נקודות וסמן מחדש.")
+                return
             self.status_label.config(
                 text=f"נבחרה: {point_just_marked_description} (4/4). כל 4 הנקודות נבחרו. בחר סוג עיבוד.")
             self.enable_processing_buttons()
-            self.marking_mode_active = False
-            self.update_marking_mode_ui()
+
+    def refine_marked_points(self, indices=None):
+        # Refine on the full image if it has loaded, else on the preview (still sub-pixel there).
+        # indices limits it to some of the points (a dragged one); by default all are refined.
+        indices = range(len(self.points)) if indices is None else indices
+        image = self.source_image.full() if self.source_image.full_loaded else self.original_image_cv
+        sx = image.shape[1] / self.source_size[0]
+        sy = image.shape[0] / self.source_size[1]
+        window = refine.window_for_scale(image.shape[1] / self.displayed_image_width)
+        refined = refine.refine_points(image, [(self.points[i][0] * sx, self.points[i][1] * sy) for i in indices],
+                                       window)
+        for i, (x, y) in zip(indices, refined):
+            self.points[i] = (float(x) / sx, float(y) / sy)
+        self.redraw_dots_on_canvas()
 
     def redraw_dots_on_canvas(self):
         self.canvas.delete("point_marker")
@@ -528,7 +798,7 @@ class PerspectiveCorrectionApp:
         if self.get_current_image_to_display() is not self.original_image_cv:
             return
 
-        original_height_cv, original_width_cv = self.original_image_cv.shape[:2]
+        original_width_cv, original_height_cv = self.source_size
         img_top_left_on_canvas_x = (self.canvas_width / 2 + self.canvas_image_x_offset) - self.displayed_image_width / 2
         img_top_left_on_canvas_y = (
                                            self.canvas_height / 2 + self.canvas_image_y_offset) - self.displayed_image_height / 2
@@ -539,10 +809,9 @@ class PerspectiveCorrectionApp:
         text_color = "white"
 
         for i, (p_orig_x, p_orig_y) in enumerate(self.points):
-            x_on_displayed_img = (
-                                         p_orig_x / original_width_cv) * self.displayed_image_width if original_width_cv > 0 else 0
-            y_on_displayed_img = (
-                                         p_orig_y / original_height_cv) * self.displayed_image_height if original_height_cv > 0 else 0
+            x_on_displayed_img, y_on_displayed_img = engine.image_to_display(
+                p_orig_x, p_orig_y, (self.displayed_image_width, self.displayed_image_height),
+                (original_width_cv, original_height_cv))
             canvas_x = img_top_left_on_canvas_x + x_on_displayed_img
             canvas_y = img_top_left_on_canvas_y + y_on_displayed_img
 
@@ -559,6 +828,8 @@ class PerspectiveCorrectionApp:
 
     def clear_all_dots_from_canvas(self, clear_logical_points=True):
         self.canvas.delete("point_marker")
+        self.canvas.delete("live_preview")
+        self.live_preview_photo = None
         self.canvas_dots = []
         self.dot_numbers = []
         if clear_logical_points:
@@ -568,6 +839,10 @@ class PerspectiveCorrectionApp:
         if reset_view_and_mode:
             reset_view = True
 
+        self.cancel_processing(update_status=False)
+        self.detect_runner.cancel()
+        self.detect_job = None
+        self.clear_pending_preview()
         self.clear_all_dots_from_canvas(clear_logical_points=True)
         self.disable_processing_buttons()
 
@@ -596,6 +871,49 @@ class PerspectiveCorrectionApp:
             self.marking_mode_active = False
             self.update_marking_mode_ui()
 
+    def auto_detect_points(self):
+        if self.source_image is None:
+            messagebox.showwarning("זיהוי פינות", "יש לטעון תמונה תחילה.", parent=self.master)
+            return
+        if self.processed_image_cv is not None:
+            messagebox.showinfo("זיהוי פינות", "אפס נקודות כדי לחזור לתמונה המקורית לפני הזיהוי.",
+                                parent=self.master)
+            return
+
+        self.detect_job = self.detect_runner.submit(self.detect_corners, self.source_image)
+        self.status_label.config(text="מזהה את פינות המסמך...")
+        self.master.after(50, self.poll_detection, self.detect_job)
+
+    @staticmethod
+    def detect_corners(source_image, on_progress=None, is_cancelled=None):
+        # Detection runs on a downscaled copy; only the corner refinement needs the full image.
+        return detect.detect_quad(source_image.full())
+
+    def poll_detection(self, job):
+        if job is not self.detect_job:  # superseded, or the points were reset meanwhile
+            return
+        if not job.done:
+            self.master.after(50, self.poll_detection, job)
+            return
+
+        self.detect_job = None
+        detection = job.result
+        if job.error is not None or detection is None or detection.confidence < detect.DEFAULT_MIN_CONFIDENCE:
+            # Low confidence: fall back to the four manual clicks.
+            self.status_label.config(text="לא זוהה מסמך בוודאות מספקת. סמן את 4 הנקודות ידנית.")
+            if len(self.points) < 4 and not self.marking_mode_active:
+                self.marking_mode_active = True
+                self.update_marking_mode_ui()
+            return
+
+        self.points = [(float(x), float(y)) for x, y in detection.points]
+        self.marking_mode_active = False
+        self.update_marking_mode_ui()
+        self.redraw_dots_on_canvas()
+        self.enable_processing_buttons()
+        self.status_label.config(
+            text=f"זוהו 4 פינות (ודאות {detection.confidence:.0%}). בחר סוג עיבוד, או אפס נקודות וסמן ידנית.")
+
     def process_image_cropped(self):
         if len(self.points) != 4 or self.original_image_cv is None:
             messagebox.showwarning("יישור קטע", "יש לסמן 4 נקודות על תמונה מקורית בסדר המבוקש.",
@@ -604,47 +922,23 @@ class PerspectiveCorrectionApp:
                 text="סמן 4 נקודות (שמאל למעלה, ימין למעלה, ימין למטה, שמאל למטה).")  # Updated message
             return
         try:
-            src_points_np = np.float32(self.points)
-            width_top = np.linalg.norm(src_points_np[0] - src_points_np[1])
-            width_bottom = np.linalg.norm(src_points_np[3] - src_points_np[2])
-            max_width = max(int(width_top), int(width_bottom))
-
-            height_left = np.linalg.norm(src_points_np[0] - src_points_np[3])
-            height_right = np.linalg.norm(src_points_np[1] - src_points_np[2])
-            max_height = max(int(height_left), int(height_right))
-
-            if max_width <= 0 or max_height <= 0:
-                messagebox.showerror("שגיאה בחישוב מידות", "לא ניתן לחשב מידות חוקיות.", parent=self.master)
-                self.status_label.config(text="שגיאה בחישוב מידות יעד. אפס ונסה שוב.")
-                self.clear_all_dots_from_canvas(clear_logical_points=True)
-                self.disable_processing_buttons()
-                self.marking_mode_active = False
-                self.update_marking_mode_ui()
-                return
-
-            dst_points_np = np.float32(
-                [[0, 0], [max_width - 1, 0], [max_width - 1, max_height - 1], [0, max_height - 1]])
-            perspective_matrix = cv2.getPerspectiveTransform(src_points_np, dst_points_np)
-            self.processed_image_cv = cv2.warpPerspective(self.original_image_cv, perspective_matrix,
-                                                          (max_width, max_height), flags=cv2.INTER_LANCZOS4)
-
+            # normalize_quad inside orders points clicked out of order and rejects non-convex ones
+            geometry = engine.cropped_geometry(self.points)
+        except engine.DegenerateQuadError as e:
+            messagebox.showerror("שגיאה בחישוב מידות", str(e), parent=self.master)
+            self.status_label.config(text="שגיאה בחישוב מידות יעד. אפס ונסה שוב.")
             self.clear_all_dots_from_canvas(clear_logical_points=True)
             self.disable_processing_buttons()
             self.marking_mode_active = False
             self.update_marking_mode_ui()
-
-            self.zoom_factor = 1.0
-            self.canvas_image_x_offset = 0
-            self.canvas_image_y_offset = 0
-            self.display_cv_image(self.processed_image_cv, clear_dots=True)
-            self.status_label.config(text="יישור קטע הושלם. ניתן לשמור או לאפס נקודות.")
-
+            return
         except Exception as e:
-            messagebox.showerror("שגיאה ביישור קטע", f"אירעה שגיאה: {e}", parent=self.master)
-            self.status_label.config(text="שגיאה ביישור קטע. נסה לאפס נקודות.")
-            self.disable_processing_buttons()
-            self.marking_mode_active = False
-            self.update_marking_mode_ui()
+            self.show_processing_error("שגיאה ביישור קטע", f"אירעה שגיאה: {e}",
+                                       "שגיאה ביישור קטע. נסה לאפס נקודות.")
+            return
+
+        self.show_warp_preview(geometry, "יישור קטע הושלם. ניתן לשמור או לאפס נקודות.",
+                               "שגיאה ביישור קטע", "שגיאה ביישור קטע. נסה לאפס נקודות.")
 
     def process_image_full_transform(self):
         if len(self.points) != 4 or self.original_image_cv is None:
@@ -655,144 +949,150 @@ class PerspectiveCorrectionApp:
                 text="סמן 4 נקודות (שמאל למעלה, ימין למעלה, ימין למטה, שמאל למטה).")  # Updated message
             return
 
+        fit_to_frame = self.full_transform_fit_to_frame_var.get()
         try:
-            src_points_np = np.float32(self.points)
-            original_height, original_width = self.original_image_cv.shape[:2]
+            geometry = engine.full_geometry(self.points, self.source_size, fit_to_frame)
+        except engine.DegenerateQuadError as e:
+            messagebox.showerror("שגיאה בחישוב מידות", str(e), parent=self.master)
+            self.status_label.config(text="שגיאה בחישוב מידות מרובע. אפס ונסה שוב.")
+            self.disable_processing_buttons()
+            self.marking_mode_active = False
+            self.update_marking_mode_ui()
+            return
+        except ValueError as ve:
+            error_message = f"אירעה שגיאה בחישוב הטרנספורמציה: {ve}\nייתכן שהנקודות שנבחרו אינן תקינות או קו-לינאריות."
+            self.show_processing_error("שגיאה בעיבוד", error_message, "שגיאה בעיבוד. נסה נקודות אחרות או אפס.")
+            return
+        except Exception as e:
+            self.show_processing_error("שגיאה בשינוי פרספקטיבה מלאה", f"אירעה שגיאה בלתי צפויה: {e}",
+                                       "שגיאה בשינוי פרספקטיבה מלאה. נסה לאפס נקודות.")
+            return
 
-            width_top = np.linalg.norm(src_points_np[0] - src_points_np[1])
-            width_bottom = np.linalg.norm(src_points_np[3] - src_points_np[2])
-            rect_width = max(int(width_top), int(width_bottom))
+        if fit_to_frame:
+            status_text = "הפרספקטיבה של כל התמונה שונתה והותאמה למסגרת המקורית. ניתן לשמור."
+        else:
+            status_text = "הפרספקטיבה של כל התמונה שונתה (גודל הפלט בהתאם לתוכן). ניתן לשמור."
+        self.show_warp_preview(geometry, status_text, "שגיאה בשינוי פרספקטיבה מלאה",
+                               "שגיאה בשינוי פרספקטיבה מלאה. נסה לאפס נקודות.")
 
-            height_left = np.linalg.norm(src_points_np[0] - src_points_np[3])
-            height_right = np.linalg.norm(src_points_np[1] - src_points_np[2])
-            rect_height = max(int(height_left), int(height_right))
+    def show_processing_error(self, title, message, status_text):
+        messagebox.showerror(title, message, parent=self.master)
+        self.status_label.config(text=status_text)
+        self.disable_processing_buttons()
+        self.marking_mode_active = False
+        self.update_marking_mode_ui()
 
-            if rect_width <= 0 or rect_height <= 0:
-                messagebox.showerror("שגיאה בחישוב מידות", "לא ניתן לחשב מידות חוקיות עבור המרובע הנבחר.",
-                                     parent=self.master)
-                self.status_label.config(text="שגיאה בחישוב מידות מרובע. אפס ונסה שוב.")
-                self.disable_processing_buttons()
-                self.marking_mode_active = False
-                self.update_marking_mode_ui()
-                return
+    @staticmethod
+    def warp_full_resolution(source_image, geometry, plan_cache, on_progress=None, is_cancelled=None):
+        # Runs on the worker thread, so waiting for the full-resolution decode does not block the UI.
+        plan = plan_cache.plan_for(geometry)
+        if plan is not None:
+            return plan.apply(source_image.full(), on_progress=on_progress, is_cancelled=is_cancelled)
+        return tiled.warp_tiled(source_image.full(), geometry, on_progress=on_progress, is_cancelled=is_cancelled)
+
+    def show_warp_preview(self, geometry, done_status_text, error_title, error_status_text):
+        # A bilinear warp of the reduced decode, shown at once; the full-resolution LANCZOS warp only
+        # runs on "אשר ברזולוציה מלאה" or when saving, so wrong points cost milliseconds, not seconds.
+        self.cancel_processing(update_status=False)
+        geometry, output_scale = engine.limit_output_size(geometry, MAX_OUTPUT_MEGAPIXELS)
+        if output_scale < 1.0:
+            done_status_text += f" (הפלט הוקטן ל-{geometry.size[0]}x{geometry.size[1]} פיקסלים.)"
+        preview_image, _ = preview.warp_preview(self.source_image.preview, geometry, self.source_size)
+        self.on_processing_done(preview_image, f"תצוגה מקדימה של {geometry.size[0]}x{geometry.size[1]} פיקסלים. "
+                                               "לחץ 'אשר ברזולוציה מלאה' או שמור כדי לחשב את התמונה המלאה.")
+        self.pending_geometry = geometry
+        self.pending_texts = (done_status_text, error_title, error_status_text)
+        self.btn_confirm_full.config(state=tk.NORMAL)
+
+    def clear_pending_preview(self):
+        self.pending_geometry = None
+        self.pending_texts = None
+        self.btn_confirm_full.config(state=tk.DISABLED)
+
+    def confirm_full_resolution(self):
+        if self.pending_geometry is None:
+            return
+        self.start_processing(self.pending_geometry, *self.pending_texts)
+
+    def start_processing(self, geometry, done_status_text, error_title, error_status_text):
+        # A second click while a warp is running supersedes it (JobRunner cancels the old job).
+        self.warp_job = self.warp_runner.submit(self.warp_full_resolution, self.source_image, geometry,
+                                                self.plan_cache)
+        self.set_processing_busy(True)
+        self.status_label.config(text="מעבד את התמונה...")
+        self.master.after(50, self.poll_processing, self.warp_job, done_status_text, error_title,
+                          error_status_text)
+
+    def poll_processing(self, job, done_status_text, error_title, error_status_text):
+        if job is not self.warp_job:  # superseded or cancelled; its result is discarded
+            return
+        if not job.done:
+            self.progress_bar["value"] = job.progress * 100
+            self.master.after(50, self.poll_processing, job, done_status_text, error_title, error_status_text)
+            return
 
-            center_src_x = np.mean(src_points_np[:, 0])
-            center_src_y = np.mean(src_points_np[:, 1])
-
-            dst_ideal_tl_x = center_src_x - rect_width / 2
-            dst_ideal_tl_y = center_src_y - rect_height / 2
-            dst_ideal_tr_x = center_src_x + rect_width / 2
-            dst_ideal_tr_y = center_src_y - rect_height / 2
-            dst_ideal_br_x = center_src_x + rect_width / 2
-            dst_ideal_br_y = center_src_y + rect_height / 2
-            dst_ideal_bl_x = center_src_x - rect_width / 2
-            dst_ideal_bl_y = center_src_y + rect_height / 2
-
-            dst_points_ideal_shape = np.float32([
-                [dst_ideal_tl_x, dst_ideal_tl_y],
-                [dst_ideal_tr_x, dst_ideal_tr_y],
-                [dst_ideal_br_x, dst_ideal_br_y],
-                [dst_ideal_bl_x, dst_ideal_bl_y]
-            ])
-
-            M1 = cv2.getPerspectiveTransform(src_points_np, dst_points_ideal_shape)
-            if M1 is None:
-                raise ValueError("לא ניתן לחשב את טרנספורמציית הפרספקטיבה הראשונית. ייתכן שהנקודות קו-לינאריות.")
-
-            status_text = ""  # Initialize status_text
-            if self.full_transform_fit_to_frame_var.get():
-                dst_tl_x = center_src_x - rect_width / 2
-                dst_tl_y = center_src_y - rect_height / 2
-                dst_tr_x = center_src_x + rect_width / 2
-                dst_tr_y = center_src_y - rect_height / 2
-                dst_br_x = center_src_x + rect_width / 2
-                dst_br_y = center_src_y + rect_height / 2
-                dst_bl_x = center_src_x - rect_width / 2
-                dst_bl_y = center_src_y + rect_height / 2
-
-                dst_points_rect_in_place = np.float32([
-                    [dst_tl_x, dst_tl_y],
-                    [dst_tr_x, dst_tr_y],
-                    [dst_br_x, dst_br_y],
-                    [dst_bl_x, dst_bl_y]
-                ])
-
-                perspective_matrix_fit = cv2.getPerspectiveTransform(src_points_np, dst_points_rect_in_place)
-                if perspective_matrix_fit is None:
-                    raise ValueError("לא ניתן לחשב את טרנספורמציית ההתאמה למסגרת.")
-
-                self.processed_image_cv = cv2.warpPerspective(
-                    self.original_image_cv,
-                    perspective_matrix_fit,
-                    (original_width, original_height),
-                    flags=cv2.INTER_LANCZOS4,
-                    borderMode=cv2.BORDER_REPLICATE
-                )
-                status_text = "הפרספקטיבה של כל התמונה שונתה והותאמה למסגרת המקורית. ניתן לשמור."
-            else:
-                original_img_corners = np.float32([
-                    [0, 0],
-                    [original_width - 1, 0],
-                    [original_width - 1, original_height - 1],
-                    [0, original_height - 1]
-                ]).reshape(-1, 1, 2)
-
-                transformed_img_corners = cv2.perspectiveTransform(original_img_corners, M1)
-                if transformed_img_corners is None:
-                    raise ValueError("לא ניתן היה לבצע טרנספורמציה על פינות התמונה.")
-
-                min_x_warped = np.min(transformed_img_corners[:, 0, 0])
-                max_x_warped = np.max(transformed_img_corners[:, 0, 0])
-                min_y_warped = np.min(transformed_img_corners[:, 0, 1])
-                max_y_warped = np.max(transformed_img_corners[:, 0, 1])
-
-                warped_content_width = int(max_x_warped - min_x_warped)
-                warped_content_height = int(max_y_warped - min_y_warped)
-
-                if warped_content_width <= 0 or warped_content_height <= 0:
-                    raise ValueError("לתמונה שעברה טרנספורמציה אין מידות חוקיות (רוחב או גובה קטן מדי).")
-
-                translation_matrix = np.float32([
-                    [1, 0, -min_x_warped],
-                    [0, 1, -min_y_warped],
-                    [0, 0, 1]
-                ])
-                M_final = translation_matrix @ M1
-
-                self.processed_image_cv = cv2.warpPerspective(
-                    self.original_image_cv,
-                    M_final,
-                    (warped_content_width, warped_content_height),
-                    flags=cv2.INTER_LANCZOS4,
-                    borderMode=cv2.BORDER_CONSTANT,
-                    borderValue=(0, 0, 0)
-                )
-                status_text = "הפרספקטיבה של כל התמונה שונתה (גודל הפלט בהתאם לתוכן). ניתן לשמור."
+        self.warp_job = None
+        self.set_processing_busy(False)
+        if job.cancelled:
+            self.status_label.config(text="העיבוד בוטל.")
+        elif job.error is not None:
+            self.show_processing_error(error_title, f"אירעה שגיאה: {job.error}", error_status_text)
+        else:
+            self.clear_pending_preview()
+            self.on_processing_done(job.result, done_status_text)
 
-            self.clear_all_dots_from_canvas(clear_logical_points=True)
-            self.disable_processing_buttons()
-            self.marking_mode_active = False
-            self.update_marking_mode_ui()
+    def on_processing_done(self, processed_image, status_text):
+        self.processed_image_cv = processed_image
 
-            self.zoom_factor = 1.0
-            self.canvas_image_x_offset = 0
-            self.canvas_image_y_offset = 0
-            self.display_cv_image(self.processed_image_cv, clear_dots=True)
-            self.status_label.config(text=status_text)
+        self.clear_all_dots_from_canvas(clear_logical_points=True)
+        self.disable_processing_buttons()
+        self.marking_mode_active = False
+        self.update_marking_mode_ui()
 
-        except ValueError as ve:
-            error_message = f"אירעה שגיאה בחישוב הטרנספורמציה: {ve}\nייתכן שהנקודות שנבחרו אינן תקינות או קו-לינאריות."
-            messagebox.showerror("שגיאה בעיבוד", error_message, parent=self.master)
-            self.status_label.config(text="שגיאה בעיבוד. נסה נקודות אחרות או אפס.")
-            self.disable_processing_buttons()
-            self.marking_mode_active = False
-            self.update_marking_mode_ui()
-        except Exception as e:
-            messagebox.showerror("שגיאה בשינוי פרספקטיבה מלאה", f"אירעה שגיאה בלתי צפויה: {e}", parent=self.master)
-            self.status_label.config(text="שגיאה בשינוי פרספקטיבה מלאה. נסה לאפס נקודות.")
-            self.disable_processing_buttons()
-            self.marking_mode_active = False
-            self.update_marking_mode_ui()
+        self.zoom_factor = 1.0
+        self.canvas_image_x_offset = 0
+        self.canvas_image_y_offset = 0
+        self.display_cv_image(self.processed_image_cv, clear_dots=True)
+        self.status_label.config(text=status_text)
+
+    def cancel_processing(self, update_status=True):
+        if self.warp_job is None:
+            return
+        self.warp_runner.cancel()
+        self.warp_job = None
+        self.set_processing_busy(False)
+        if update_status:
+            self.status_label.config(text="העיבוד בוטל.")
+
+    def set_processing_busy(self, busy):
+        if busy:
+            self.progress_bar["value"] = 0
+            self.btn_cancel_processing.pack(side=tk.LEFT, padx=5, pady=2)
+            self.progress_bar.pack(side=tk.LEFT, padx=5, pady=2)
+            self.master.config(cursor="watch")
+        else:
+            self.progress_bar.pack_forget()
+            self.btn_cancel_processing.pack_forget()
+            self.master.config(cursor="")
+
+    def export_points(self):
+        # The four marked points, for rectifying a video or frame sequence with perspective_core.stream
+        if len(self.points) != 4 or self.source_image is None:
+            messagebox.showwarning("ייצוא נקודות", "יש לסמן 4 נקודות לפני הייצוא.", parent=self.master)
+            return
+
+        base_name = os.path.splitext(os.path.basename(self.image_path))[0] if self.image_path else "image"
+        file_path = filedialog.asksaveasfilename(
+            parent=self.master, initialfile=f"{base_name}_points.json", defaultextension=".json",
+            filetypes=(("JSON files", "*.json"), ("All files", "*.*")),
+            title="ייצוא נקודות כ..."
+        )
+        if file_path:
+            try:
+                stream.write_points_file(file_path, self.points, self.source_size)
+                self.status_label.config(text=f"הנקודות יוצאו ל: {file_path}")
+            except Exception as e:
+                messagebox.showerror("שגיאה בייצוא נקודות", f"אירעה שגיאה: {e}", parent=self.master)
 
     def save_image(self):
         if self.processed_image_cv is None:
@@ -811,21 +1111,56 @@ class PerspectiveCorrectionApp:
             title="שמור תמונה מעובדת כ..."
         )
         if file_path:
-            try:
-                file_ext_for_encode = os.path.splitext(file_path)[1].lower()
-                if file_ext_for_encode not in [".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".jfif"]:
-                    file_ext_for_encode = ".png"
-
-                is_success, im_buf_arr = cv2.imencode(file_ext_for_encode, self.processed_image_cv)
-                if is_success:
-                    im_buf_arr.tofile(file_path)
-                    self.status_label.config(text=f"התמונה נשמרה ב: {file_path}")
-                    messagebox.showinfo("שמירה הושלמה", f"התמונה נשמרה בהצלחה:\n{file_path}", parent=self.master)
-                else:
-                    raise Exception(f"שגיאה בקידוד התמונה לסיומת {file_ext_for_encode.upper()}.")
-            except Exception as e:
-                messagebox.showerror("שגיאה בשמירת תמונה", f"אירעה שגיאה: {e}", parent=self.master)
-                self.status_label.config(text="שגיאה בשמירת התמונה.")
+            geometry = self.pending_geometry
+            if geometry is not None:
+                # Only a preview is on screen: warp at full resolution and save, both in the background.
+                # A confirmed warp of the same geometry that is still running is waited for, not repeated.
+                job = JobRunner().submit(self.warp_and_save, self.source_image, geometry, self.plan_cache,
+                                         file_path, self.warp_job)
+            else:
+                # The job keeps a reference to the array, so processing another image meanwhile is safe.
+                job = JobRunner().submit(encode.save_image, file_path, self.processed_image_cv, SAVE_OPTIONS)
+            self.save_jobs.append(job)
+            self.status_label.config(text="שומר את התמונה...")
+            self.master.after(100, self.poll_save, job, file_path, geometry)
+
+    @classmethod
+    def warp_and_save(cls, source_image, geometry, plan_cache, file_path, warp_job=None, on_progress=None,
+                      is_cancelled=None):
+        # Progress: the warp is the first 70%, encoding the rest.
+        image = None
+        if warp_job is not None:
+            # The confirmed warp of this geometry is already running: save its result.
+            while not warp_job.wait(0.1):
+                if is_cancelled():
+                    raise engine.WarpCancelled()
+                on_progress(0.7 * warp_job.progress)
+            image = warp_job.result  # None if it was cancelled or failed; then warp here
+        if image is None:
+            image = cls.warp_full_resolution(source_image, geometry, plan_cache,
+                                             on_progress=lambda f: on_progress(0.7 * f), is_cancelled=is_cancelled)
+        encode.save_image(file_path, image, SAVE_OPTIONS, on_progress=lambda f: on_progress(0.7 + 0.3 * f),
+                          is_cancelled=is_cancelled)
+        return image
+
+    def poll_save(self, job, file_path, geometry=None):
+        if not job.done:
+            self.status_label.config(text=f"שומר את התמונה... {job.progress * 100:.0f}%")
+            self.master.after(100, self.poll_save, job, file_path, geometry)
+            return
+
+        self.save_jobs.remove(job)
+        if job.error is not None:
+            messagebox.showerror("שגיאה בשמירת תמונה", f"אירעה שגיאה: {job.error}", parent=self.master)
+            self.status_label.config(text="שגיאה בשמירת התמונה.")
+        elif not job.cancelled:
+            if geometry is not None and self.pending_geometry is geometry and self.warp_job is None:
+                # (A running confirm warp shows the same image itself when poll_processing sees it.)
+                # The full-resolution image was computed for the save; show it instead of the preview.
+                self.clear_pending_preview()
+                self.on_processing_done(job.result, "")
+            self.status_label.config(text=f"התמונה נשמרה ב: {file_path}")
+            messagebox.showinfo("שמירה הושלמה", f"התמונה נשמרה בהצלחה:\n{file_path}", parent=self.master)
 
 
 if __name__ == '__main__':